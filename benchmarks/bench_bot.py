@@ -0,0 +1,208 @@
+"""End-to-end throughput and latency of a SignalBot against a mock API
+
+Every case starts benchmarks.mock_server, runs a real SignalBot against it
+for --duration seconds and reports:
+- messages_per_second: replies the mock API received per second
+- latency_p50/p99: seconds from pushing a message to receiving its reply
+- loop_lag_p99/max: how late the bot's event loop woke up from a short sleep
+- queue_bytes_per_message: memory of a parsed message waiting in the queue
+- messages_pushed/handled: after the measurement, pushing stops and the bot
+  gets --drain seconds to reply to the rest; without --error-rate, a
+  message without a reply fails the benchmark
+
+Usage (from the repository root):
+    python -m benchmarks.bench_bot [--commands 1,10] [--consumers 1,3,10]
+        [--rate 500] [--duration 5] [--drain 5] [--latency 0.01] [--error-rate 0]
+        [--output results.json]
+
+The results are written as JSON (to stdout without --output), so that they
+can be compared between commits.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from signalbot import Command, Context, Message, SignalBot
+from signalbot.message import Envelope
+
+from .mock_server import MockSignalServer
+
+PHONE_NUMBER = "+49123456789"
+
+
+class EchoCommand(Command):
+    async def handle(self, c: Context):
+        await c.send(c.message.text)
+
+
+class NoopCommand(Command):
+    async def handle(self, c: Context):
+        pass
+
+
+def percentile(values: list[float], p: float) -> float | None:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def monitor_loop_lag(lags: list[float], interval: float = 0.01):
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(max(0, time.perf_counter() - start - interval))
+
+
+def create_bot(server: MockSignalServer, commands: int, consumers: int) -> SignalBot:
+    config = {
+        "signal_service": server.signal_service,
+        "phone_number": PHONE_NUMBER,
+        "workers": {"consumers": consumers},
+    }
+    bot = SignalBot(config)
+    for user in server.users:
+        bot.listenUser(user)
+    bot.register(EchoCommand())
+    for _ in range(commands - 1):
+        bot.register(NoopCommand())
+    return bot
+
+
+async def run_case(server: MockSignalServer, args, commands: int, consumers: int):
+    bot = create_bot(server, commands, consumers)
+    lags = []
+    await bot._signal.open()
+    asyncio.create_task(monitor_loop_lag(lags))  # cancelled with the bot below
+    await bot._produce_consume_messages()
+
+    await asyncio.sleep(args.warmup)
+    server.reset()
+    lags.clear()
+    await asyncio.sleep(args.duration)
+    messages_per_second = server.replies / args.duration
+    queue_depth = bot._q.qsize()
+    server.paused = True
+    deadline = time.perf_counter() + args.drain
+    while len(server.latencies) < server.pushed_count:
+        if time.perf_counter() > deadline:
+            break
+        await asyncio.sleep(0.05)
+
+    result = {
+        "commands": commands,
+        "consumers": consumers,
+        "messages_per_second": messages_per_second,
+        "messages_pushed": server.pushed_count,
+        "messages_handled": len(server.latencies),
+        "latency_p50": percentile(server.latencies, 0.5),
+        "latency_p99": percentile(server.latencies, 0.99),
+        "send_errors": server.errors,
+        "queue_depth": queue_depth,
+        "loop_lag_p99": percentile(lags, 0.99),
+        "loop_lag_max": max(lags, default=None),
+    }
+    # stop producers and consumers before their session is closed
+    tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await bot._signal.close()
+    bot.executors.shutdown()
+    return result
+
+
+def queue_bytes_per_message(commands: int, number: int = 10_000) -> float:
+    """Memory of parsed messages in the dispatch queue, without consumers"""
+    server = MockSignalServer(chats=100)
+    raw_messages = [json.dumps(server.message(i)) for i in range(number)]
+
+    async def fill() -> float:
+        bot = SignalBot({"signal_service": "127.0.0.1:0", "phone_number": PHONE_NUMBER})
+        command_list = [EchoCommand()] + [NoopCommand() for _ in range(commands - 1)]
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        for raw_message in raw_messages:
+            message = Message.from_envelope(Envelope.parse(raw_message))
+            for command in command_list:
+                bot._q.put_nowait(
+                    (command, message, time.perf_counter()), chat=message.recipient()
+                )
+        used = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        return used / number
+
+    return asyncio.run(fill())
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--commands", default="1,10")
+    parser.add_argument("--consumers", default="1,3,10")
+    parser.add_argument("--rate", type=float, default=500, help="messages/second")
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--warmup", type=float, default=1)
+    parser.add_argument("--drain", type=float, default=5)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--chats", type=int, default=100)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    results = []
+    for commands in [int(n) for n in args.commands.split(",")]:
+        for consumers in [int(n) for n in args.consumers.split(",")]:
+            server = MockSignalServer(
+                message_rate=args.rate,
+                latency=args.latency,
+                error_rate=args.error_rate,
+                chats=args.chats,
+            )
+            server.start()
+            try:
+                result = asyncio.run(run_case(server, args, commands, consumers))
+            finally:
+                server.stop()
+            if not args.error_rate and (
+                result["messages_handled"] != result["messages_pushed"]
+            ):
+                sys.exit(
+                    f"{result['messages_pushed'] - result['messages_handled']} of "
+                    f"{result['messages_pushed']} messages were not handled"
+                )
+            result["queue_bytes_per_message"] = queue_bytes_per_message(commands)
+            results.append(result)
+            print(
+                f"commands={commands:<3} consumers={consumers:<3} "
+                f"{result['messages_per_second']:8.1f} msg/s  "
+                f"p50={_ms(result['latency_p50'])}  p99={_ms(result['latency_p99'])}  "
+                f"lag p99={_ms(result['loop_lag_p99'])}",
+                file=sys.stderr,
+            )
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": vars(args),
+        "results": results,
+    }
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+def _ms(seconds: float | None) -> str:
+    return "   -   " if seconds is None else f"{seconds * 1000:6.1f}ms"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Compare the eager json.loads based parser with the lazy Message parsing
+
+The eager parser is not the old code itself but a simplified copy of it in
+legacy_parse() below, so the comparison is only an approximation.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_message_parse [--number N]
+"""
+import argparse
+import json
+import timeit
+
+from signalbot.attachment import ReceiveAttachment
+from signalbot.message import Envelope, Message, UnknownMessageFormatError, _loads
+
+RAW_MESSAGE = json.dumps(
+    {
+        "envelope": {
+            "source": "+490123456789",
+            "sourceNumber": "+490123456789",
+            "sourceUuid": "<uuid>",
+            "sourceName": "<name>",
+            "sourceDevice": 1,
+            "timestamp": 1632576001632,
+            "dataMessage": {
+                "timestamp": 1632576001632,
+                "message": "Hello " * 20,
+                "expiresInSeconds": 0,
+                "viewOnce": False,
+                "mentions": [
+                    {"name": "+49987654321", "number": "+49987654321", "start": 0}
+                ],
+                "attachments": [
+                    {
+                        "contentType": "image/jpeg",
+                        "filename": f"image{i}.jpg",
+                        "id": f"attachment-{i}",
+                        "size": 123456,
+                        "width": 800,
+                        "height": 600,
+                        "uploadTimestamp": 1632576001632,
+                    }
+                    for i in range(3)
+                ],
+                "groupInfo": {"groupId": "group_id1=", "type": "DELIVER"},
+            },
+        },
+        "account": "+49987654321",
+    }
+)
+
+LISTENED_GROUPS = {"group_id1="}
+IGNORED_GROUPS = {"other_group="}
+
+
+def legacy_parse(raw_message: str) -> dict:
+    """Copy of the parser before lazy parsing: everything is built eagerly
+
+    Written by hand after the old Message.parse, which no longer exists.
+    """
+    try:
+        raw_message = json.loads(raw_message)
+        envelope = raw_message["envelope"]
+        data_message = envelope["dataMessage"]
+        return {
+            "source": envelope["source"],
+            "timestamp": envelope["timestamp"],
+            "text": data_message["message"],
+            "group": data_message.get("groupInfo", {}).get("groupId"),
+            "mentions": data_message.get("mentions", []),
+            "attachments": [
+                ReceiveAttachment.parse(attachment)
+                for attachment in data_message.get("attachments", [])
+            ],
+        }
+    except Exception:
+        raise UnknownMessageFormatError
+
+
+def legacy_receive(groups: set):
+    message = legacy_parse(RAW_MESSAGE)
+    if message["group"] in groups:
+        return message
+    return None
+
+
+def lazy_receive(groups: set):
+    envelope = Envelope.parse(RAW_MESSAGE)
+    if envelope.group in groups:
+        return Message.from_envelope(envelope)
+    return None
+
+
+def lazy_receive_with_attachments(groups: set):
+    message = lazy_receive(groups)
+    if message is not None:
+        message.base64_attachments
+    return message
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=100_000)
+    args = parser.parse_args()
+
+    print(f"JSON decoder: {_loads.__module__}.{_loads.__name__}")
+    cases = [
+        ("legacy, accepted", legacy_receive, LISTENED_GROUPS),
+        ("lazy, accepted", lazy_receive, LISTENED_GROUPS),
+        (
+            "lazy, accepted + attachments",
+            lazy_receive_with_attachments,
+            LISTENED_GROUPS,
+        ),
+        ("legacy, dropped", legacy_receive, IGNORED_GROUPS),
+        ("lazy, dropped", lazy_receive, IGNORED_GROUPS),
+    ]
+    for name, function, groups in cases:
+        seconds = timeit.timeit(lambda: function(groups), number=args.number)
+        print(f"{name:32} {seconds / args.number * 1e6:8.2f} us/message")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""Local stand-in for signal-cli-rest-api (json-rpc mode) for benchmarks
+
+The websocket /v1/receive/{number} pushes generated messages at a fixed rate,
+/v2/send answers after a configurable latency and fails with a 503 at a
+configurable rate. The server runs in its own thread and event loop, so that
+it does not compete with the bot for its loop.
+
+Usage (from the repository root), to point a bot at it by hand:
+    python -m benchmarks.mock_server [--port 8080] [--rate 100] [--latency 0.01]
+"""
+import argparse
+import asyncio
+import random
+import threading
+import time
+
+from aiohttp import web
+
+BASE_TIMESTAMP = 1633169000000
+
+
+class MockSignalServer:
+    def __init__(
+        self,
+        message_rate: float = 100,
+        latency: float = 0,
+        error_rate: float = 0,
+        chats: int = 10,
+        max_messages: int | None = None,
+        seed: int | None = 0,
+    ):
+        self.message_rate = message_rate  # per second and websocket
+        self.latency = latency  # seconds, of every REST response
+        self.error_rate = error_rate  # share of sends answered with a 503
+        self.users = [f"+4915{i:09d}" for i in range(chats)]
+        self.max_messages = max_messages
+        self._random = random.Random(seed)
+
+        self.host = "127.0.0.1"
+        self.port = None
+        self._loop = None
+        self._thread = None
+        self._runner = None
+        self._started = threading.Event()
+        self._sequence = 0  # never reset, the bot drops repeated messages
+        self.paused = False
+        self.reset()
+
+    @property
+    def signal_service(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    def reset(self):
+        self.pushed = {}  # sequence number -> time.perf_counter() when pushed
+        self.pushed_count = 0
+        self.latencies = []  # seconds from push to the first reply
+        self.replies = 0
+        self.errors = 0
+
+    def start(self, port: int = 0):
+        self._thread = threading.Thread(
+            target=self._run, args=(port,), name="mock-signal-server", daemon=True
+        )
+        self._thread.start()
+        self._started.wait()
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+
+    def message(self, sequence: int) -> dict:
+        source = self.users[sequence % len(self.users)]
+        timestamp = BASE_TIMESTAMP + sequence
+        return {
+            "envelope": {
+                "source": source,
+                "sourceNumber": source,
+                "sourceName": "bench",
+                "sourceDevice": 1,
+                "timestamp": timestamp,
+                "dataMessage": {
+                    "timestamp": timestamp,
+                    "message": f"bench {sequence}",
+                    "expiresInSeconds": 0,
+                    "viewOnce": False,
+                },
+            }
+        }
+
+    def _run(self, port: int):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._serve(port))
+        self._started.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.run_until_complete(self._runner.cleanup())
+            self._loop.close()
+
+    async def _serve(self, port: int):
+        app = web.Application()
+        app.router.add_get("/v1/receive/{number}", self._receive)
+        app.router.add_post("/v2/send", self._send)
+        app.router.add_post("/v1/reactions/{number}", self._ok)
+        app.router.add_put("/v1/typing-indicator/{number}", self._ok)
+        app.router.add_delete("/v1/typing-indicator/{number}", self._ok)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+
+    async def _receive(self, request: web.Request) -> web.WebSocketResponse:
+        websocket = web.WebSocketResponse()
+        await websocket.prepare(request)
+
+        # push in ticks, a sleep per message would cap the rate
+        tick = 0.01
+        start = time.perf_counter()
+        sent = 0
+        while not websocket.closed and _connected(request):
+            due = int((time.perf_counter() - start) * self.message_rate) - sent
+            for _ in range(due):
+                if self.paused or self._exhausted():
+                    break
+                sequence = self._sequence
+                self._sequence += 1
+                self.pushed[sequence] = time.perf_counter()
+                self.pushed_count += 1
+                try:
+                    await websocket.send_json(self.message(sequence))
+                except ConnectionResetError:  # the bot went away
+                    return websocket
+            sent += due
+            await asyncio.sleep(tick)
+        return websocket
+
+    async def _send(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self._random.random() < self.error_rate:
+            self.errors += 1
+            raise web.HTTPServiceUnavailable()
+
+        self.replies += 1
+        pushed = self.pushed.pop(_sequence(payload.get("message")), None)
+        if pushed is not None:  # only the first reply to a message counts
+            self.latencies.append(time.perf_counter() - pushed)
+        return web.json_response({"timestamp": str(int(time.time() * 1000))})
+
+    async def _ok(self, request: web.Request) -> web.Response:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return web.Response(status=204)
+
+    def _exhausted(self) -> bool:
+        return self.max_messages is not None and self._sequence >= self.max_messages
+
+
+def _connected(request: web.Request) -> bool:
+    # a paused websocket sends nothing that would notice the bot going away
+    return request.transport is not None and not request.transport.is_closing()
+
+
+def _sequence(text: str | None) -> int | None:
+    try:
+        return int(text.rsplit(" ", 1)[-1])
+    except (AttributeError, ValueError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--rate", type=float, default=100)
+    parser.add_argument("--latency", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--chats", type=int, default=10)
+    args = parser.parse_args()
+
+    server = MockSignalServer(
+        message_rate=args.rate,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        chats=args.chats,
+    )
+    server.start(args.port)
+    print(f"Serving on {server.signal_service}, senders: {', '.join(server.users)}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
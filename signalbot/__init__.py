@@ -1,7 +1,18 @@
 from .bot import SignalBot
 from .command import Command, CommandError, triggered
+from .trigger import Trigger
 from .message import Message, MessageType, UnknownMessageFormatError
-from .api import SignalAPI, ReceiveMessagesError, SendMessageError, FetchAttachmentError
+from .api import (
+    SignalAPI,
+    SignalAPIError,
+    ReceiveMessagesError,
+    SendMessageError,
+    FetchAttachmentError,
+    AttachmentTooLargeError,
+    ReactionError,
+    TypingError,
+)
+from .retry import RetryPolicy, CircuitBreaker, CircuitOpenError
 from .context import Context
 from .attachment import SendAttachment, ReceiveAttachment
 
@@ -10,11 +21,20 @@ __all__ = [
     "Command",
     "CommandError",
     "triggered",
+    "Trigger",
     "Message",
     "MessageType",
     "UnknownMessageFormatError",
     "SignalAPI",
+    "SignalAPIError",
     "ReceiveMessagesError",
     "SendMessageError",
+    "FetchAttachmentError",
+    "AttachmentTooLargeError",
+    "ReactionError",
+    "TypingError",
+    "RetryPolicy",
+    "CircuitBreaker",
+    "CircuitOpenError",
     "Context",
 ]
@@ -1,57 +1,212 @@
 import aiohttp
+import asyncio
 import base64
+import copy
+import hashlib
+import json
+import logging
+import os
+import secrets
+import time
 import websockets
+from typing import IO, AsyncIterator, Callable
 
 from .attachment import ReceiveAttachment
+from .message import _loads
+from .metrics import MetricsRegistry
+from .retry import CircuitBreaker, CircuitOpenError, RetryPolicy
+
+logger = logging.getLogger(__name__)
 
 
 class SignalAPI:
+    DEFAULT_RETRY_POLICIES = {
+        # a send that timed out might have been delivered, don't send it twice
+        "send": RetryPolicy(retry_statuses=(502, 503), idempotent=False),
+        "react": RetryPolicy(),
+        "typing": RetryPolicy(max_attempts=2),
+        "attachment": RetryPolicy(),
+        # websocket reconnects, see WebSocketReceiver
+        "receive": RetryPolicy(max_attempts=None, backoff=0.5, max_backoff=30),
+    }
+
     def __init__(
         self,
         signal_service: str,
         phone_number: str,
+        connection_limit: int = 100,
+        connection_limit_per_host: int = 10,
+        keepalive_timeout: float = 30,
+        dns_cache_ttl: int = 300,
+        retry_policies: dict[str, RetryPolicy] | None = None,
+        circuit_breaker: CircuitBreaker | None = None,
+        ping_interval: float | None = 20,
+        ping_timeout: float | None = 20,
+        metrics: MetricsRegistry | None = None,
     ):
         self.signal_service = signal_service
         self.phone_number = phone_number
 
-        # self.session = aiohttp.ClientSession()
+        # Connection pool settings of the shared session, see aiohttp.TCPConnector
+        self.connection_limit = connection_limit
+        self.connection_limit_per_host = connection_limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+
+        # per operation, see DEFAULT_RETRY_POLICIES for the operation names
+        self.retry_policies = {**self.DEFAULT_RETRY_POLICIES, **(retry_policies or {})}
+        self.circuit_breaker = circuit_breaker
+
+        # websocket keepalive, a connection without pong for ping_timeout is dead
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+
+        self._latency = None
+        if metrics is not None:
+            self._latency = metrics.histogram(
+                "signalbot_api_request_seconds",
+                "Duration of REST calls to the API, per operation and status",
+                labelnames=("operation", "status"),
+            )
+
+        # created lazily inside the running event loop, see .open()
+        self.session = None
+        self._owner = None  # API whose session is used, see .for_account()
+
+    def for_account(self, phone_number: str) -> "SignalAPI":
+        """API for another account of the same service
+
+        It shares the connection pool, retry policies and circuit breaker of
+        this API. The pool is closed by closing the API it was created from.
+        """
+        api = copy.copy(self)
+        api.phone_number = phone_number
+        api.session = None
+        api._owner = self._owner or self
+        return api
+
+    async def open(self) -> aiohttp.ClientSession:
+        """Open the shared HTTP session if it is not open yet"""
+        if self._owner is not None:
+            return await self._owner.open()
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.connection_limit,
+                limit_per_host=self.connection_limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl,
+            )
+            self.session = aiohttp.ClientSession(connector=connector)
+        return self.session
 
-    async def receive(self):
+    async def close(self):
+        """Close the shared HTTP session and all pooled connections"""
+        if self._owner is not None:
+            return
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    async def receive(self, on_connect: Callable[[], None] | None = None):
+        """Yield raw messages of one websocket connection until it closes"""
         try:
             uri = self._receive_ws_uri()
-            self.connection = websockets.connect(uri, ping_interval=None)
+            self.connection = websockets.connect(
+                uri, ping_interval=self.ping_interval, ping_timeout=self.ping_timeout
+            )
             async with self.connection as websocket:
+                if on_connect is not None:
+                    on_connect()
                 async for raw_message in websocket:
                     yield raw_message
 
         except Exception as e:
             raise ReceiveMessagesError(e)
 
+    async def receive_batch(
+        self, timeout: float = 1, max_messages: int | None = None
+    ) -> list[dict]:
+        """Fetch the pending messages over REST (signal-cli in normal mode)
+
+        The API waits up to timeout seconds for new messages. The whole batch
+        is decoded at once, the messages are returned as dicts.
+        """
+        params = {"timeout": str(timeout)}
+        if max_messages is not None:
+            params["max_messages"] = str(max_messages)
+        resp = await self._request(
+            "receive",
+            "get",
+            self._receive_rest_uri(),
+            ReceiveMessagesError,
+            retry=False,  # see PollingReceiver
+            params=params,
+        )
+        try:
+            batch = _loads(await resp.read())
+        except Exception as e:
+            raise ReceiveMessagesError(f"Cannot decode received messages: {e}")
+        if not isinstance(batch, list):
+            raise ReceiveMessagesError("Received messages are not a list")
+        return batch
+
     async def send(
-        self, receiver: str, message: str, base64_attachments: list = None
+        self,
+        receiver: str | list[str],
+        message: str,
+        base64_attachments: list = None,
     ) -> aiohttp.ClientResponse:
+        """Send a message to one receiver or to a list of receivers at once"""
         uri = self._send_rest_uri()
         if base64_attachments is None:
             base64_attachments = []
-        base64_attachments = [self._cvt_attachment_to_base64(attachment) for attachment in base64_attachments]
+        recipients = [receiver] if isinstance(receiver, str) else list(receiver)
         payload = {
-            "base64_attachments": base64_attachments,
             "message": message,
             "number": self.phone_number,
-            "recipients": [receiver],
+            "recipients": recipients,
         }
         try:
-            async with aiohttp.ClientSession() as session:
-                resp = await session.post(uri, json=payload)
-                resp.raise_for_status()
-                return resp
-        except (
-            aiohttp.ClientError,
-            aiohttp.http_exceptions.HttpProcessingError,
-            KeyError,
-        ):
+            if all(isinstance(a, str) for a in base64_attachments):
+                payload = {"base64_attachments": base64_attachments, **payload}
+                return await self._request(
+                    "send", "post", uri, SendMessageError, json=payload
+                )
+
+            # an async source can be read only once, so it can't be resent
+            retryable = all(
+                isinstance(a, str) or a.replayable for a in base64_attachments
+            )
+            return await self._request(
+                "send",
+                "post",
+                uri,
+                SendMessageError,
+                body=lambda: self._stream_send_payload(payload, base64_attachments),
+                headers={"Content-Type": "application/json"},
+                retry=retryable,
+            )
+        except (KeyError, OSError):
             raise SendMessageError
 
+    @staticmethod
+    async def _stream_send_payload(
+        payload: dict, attachments: list
+    ) -> AsyncIterator[bytes]:
+        """JSON body of /v2/send with the attachments encoded while sending"""
+        yield b'{"base64_attachments": ['
+        for i, attachment in enumerate(attachments):
+            if i > 0:
+                yield b", "
+            if isinstance(attachment, str):
+                yield json.dumps(attachment).encode()
+                continue
+            yield b'"' + json.dumps(attachment.header())[1:-1].encode()
+            async for chunk in attachment.iter_base64():
+                yield chunk
+            yield b'"'
+        yield b"], " + json.dumps(payload)[1:].encode()
+
     async def react(
         self, recipient: str, reaction: str, target_author: str, timestamp: int
     ) -> aiohttp.ClientResponse:
@@ -62,64 +217,198 @@ class SignalAPI:
             "target_author": target_author,
             "timestamp": timestamp,
         }
-        try:
-            async with aiohttp.ClientSession() as session:
-                resp = await session.post(uri, json=payload)
-                resp.raise_for_status()
-                return resp
-        except (
-            aiohttp.ClientError,
-            aiohttp.http_exceptions.HttpProcessingError,
-        ):
-            raise ReactionError
+        return await self._request("react", "post", uri, ReactionError, json=payload)
 
     async def start_typing(self, receiver: str):
         uri = self._typing_indicator_uri()
         payload = {
             "recipient": receiver,
         }
-        try:
-            async with aiohttp.ClientSession() as session:
-                resp = await session.put(uri, json=payload)
-                resp.raise_for_status()
-                return resp
-        except (
-            aiohttp.ClientError,
-            aiohttp.http_exceptions.HttpProcessingError,
-        ):
-            raise StartTypingError
+        return await self._request("typing", "put", uri, StartTypingError, json=payload)
 
     async def stop_typing(self, receiver: str):
         uri = self._typing_indicator_uri()
         payload = {
             "recipient": receiver,
         }
-        try:
-            async with aiohttp.ClientSession() as session:
-                resp = await session.delete(uri, json=payload)
-                resp.raise_for_status()
-                return resp
-        except (
-            aiohttp.ClientError,
-            aiohttp.http_exceptions.HttpProcessingError,
-        ):
-            raise StopTypingError
-        
+        return await self._request(
+            "typing", "delete", uri, StopTypingError, json=payload
+        )
+
     async def fetch_attachment_data(self, attachment: ReceiveAttachment):
+        uri = self._fetch_attachment_uri(attachment.id_)
+        resp = await self._request("attachment", "get", uri, FetchAttachmentError)
+        attachment.data = await resp.read()
+
+    async def iter_attachment(
+        self,
+        attachment: ReceiveAttachment,
+        chunk_size: int = 64 * 1024,
+        max_bytes: int | None = None,
+    ) -> AsyncIterator[bytes]:
+        """Download an attachment chunk by chunk without buffering all of it
+
+        Only the request is retried, a download that breaks off midway raises.
+        """
+        uri = self._fetch_attachment_uri(attachment.id_)
+        resp = await self._request(
+            "attachment", "get", uri, FetchAttachmentError, read=False
+        )
         try:
-            async with aiohttp.ClientSession() as session:
-                resp = await session.get(self._fetch_attachment_uri(attachment.id_))
-                resp.raise_for_status()
-                attachment.data = await resp.read()
+            if max_bytes is not None and (resp.content_length or 0) > max_bytes:
+                raise AttachmentTooLargeError(
+                    f"Attachment has {resp.content_length} bytes, limit is {max_bytes}"
+                )
+
+            received = 0
+            async for chunk in resp.content.iter_chunked(chunk_size):
+                received += len(chunk)
+                if max_bytes is not None and received > max_bytes:
+                    raise AttachmentTooLargeError(
+                        f"Attachment exceeds the limit of {max_bytes} bytes"
+                    )
+                yield chunk
         except (
             aiohttp.ClientError,
             aiohttp.http_exceptions.HttpProcessingError,
         ):
             raise FetchAttachmentError
+        finally:
+            resp.release()
+
+    async def _request(
+        self,
+        operation: str,
+        method: str,
+        uri: str,
+        error: type[Exception],
+        body: Callable[[], AsyncIterator[bytes]] | None = None,
+        read: bool = True,
+        retry: bool = True,
+        **kwargs,
+    ) -> aiohttp.ClientResponse:
+        """Make a request with the retry policy of the operation
+
+        body creates a fresh streamed request body for every attempt. Unless
+        read is False, the response body is read, which releases the connection
+        back to the pool. Errors are raised as the given error class.
+        """
+        policy = self.retry_policies[operation]
+        attempt = 0
+        while True:
+            breaker = self.circuit_breaker
+            if breaker is not None and not breaker.allow():
+                raise error("Signal API is unavailable") from CircuitOpenError()
+
+            start = time.perf_counter()
+            try:
+                session = await self.open()
+                if body is not None:
+                    kwargs["data"] = body()
+                resp = await getattr(session, method)(uri, **kwargs)
+                try:
+                    resp.raise_for_status()
+                    if read:
+                        await resp.read()
+                except BaseException:
+                    resp.release()
+                    raise
+            except (
+                aiohttp.ClientError,
+                aiohttp.http_exceptions.HttpProcessingError,
+                asyncio.TimeoutError,
+            ) as e:
+                self._observe(operation, getattr(e, "status", None) or "error", start)
+                if breaker is not None and CircuitBreaker.is_failure(e):
+                    breaker.record_failure()
+                elif breaker is not None:
+                    breaker.record_success()  # the service answered
+                if not retry or not policy.should_retry(e, attempt):
+                    raise self._error(error, e) from e
+
+                delay = policy.delay(attempt)
+                attempt += 1
+                reason = getattr(e, "status", None) or type(e).__name__
+                logger.warning(
+                    "[API] %s failed (%s), retry %s in %.1fs",
+                    operation,
+                    reason,
+                    attempt,
+                    delay,
+                )
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # cancelled or failed unexpectedly, another call may try again
+                if breaker is not None:
+                    breaker.release()
+                raise
+
+            self._observe(operation, resp.status, start)
+            if breaker is not None:
+                breaker.record_success()
+            return resp
+
+    def _observe(self, operation: str, status: int | str, start: float):
+        if self._latency is not None:
+            self._latency.labels(operation=operation, status=status).observe(
+                time.perf_counter() - start
+            )
+
+    async def download_attachment(
+        self,
+        attachment: ReceiveAttachment,
+        destination: str | os.PathLike | IO[bytes],
+        chunk_size: int = 64 * 1024,
+        max_bytes: int | None = None,
+        hash_algorithm: str | None = None,
+    ) -> tuple[int, str | None]:
+        """Stream an attachment into a file
+
+        destination is either a path or a binary file-like object. Returns the
+        number of bytes written and the hex digest of the data if a
+        hash_algorithm (see hashlib) is given. A path is written to a temporary
+        file next to it that replaces the path once the download is complete,
+        so a failed download leaves a file already at the path as it was.
+        """
+        digest = hashlib.new(hash_algorithm) if hash_algorithm else None
+        is_path = isinstance(destination, (str, os.PathLike))
+        if is_path:
+            directory, name = os.path.split(os.path.abspath(destination))
+            temp_path = os.path.join(directory, f".{name}.{secrets.token_hex(4)}.part")
+            file = open(temp_path, "xb")
+        else:
+            file = destination
+
+        size = 0
+        chunks = self.iter_attachment(attachment, chunk_size, max_bytes)
+        try:
+            async for chunk in chunks:
+                if digest is not None:
+                    digest.update(chunk)
+                if is_path:
+                    # keep disk writes off the event loop
+                    await asyncio.to_thread(file.write, chunk)
+                else:
+                    file.write(chunk)
+                size += len(chunk)
+            if is_path:
+                file.close()
+                os.replace(temp_path, destination)
+        except BaseException:
+            await chunks.aclose()  # releases the response if a write failed
+            if is_path:
+                file.close()
+                os.remove(temp_path)
+            raise
+        return size, digest.hexdigest() if digest is not None else None
 
     def _receive_ws_uri(self):
         return f"ws://{self.signal_service}/v1/receive/{self.phone_number}"
 
+    def _receive_rest_uri(self):
+        return f"http://{self.signal_service}/v1/receive/{self.phone_number}"
+
     def _send_rest_uri(self):
         return f"http://{self.signal_service}/v2/send"
 
@@ -128,37 +417,51 @@ class SignalAPI:
 
     def _typing_indicator_uri(self):
         return f"http://{self.signal_service}/v1/typing-indicator/{self.phone_number}"
-    
+
     def _fetch_attachment_uri(self, attachment_id: str):
         return f"http://{self.signal_service}/v1/attachments/{attachment_id}"
-    
+
+    @classmethod
+    def _error(cls, error: type["SignalAPIError"], e: Exception) -> "SignalAPIError":
+        if isinstance(e, aiohttp.ClientResponseError):
+            retry_after = cls._retry_after(e.headers)
+            return error(e.message, status=e.status, retry_after=retry_after)
+        return error(repr(e))
+
+    @staticmethod
+    def _retry_after(headers) -> float | None:
+        try:
+            return float(headers["Retry-After"])
+        except (KeyError, TypeError, ValueError):
+            return None
+
     @staticmethod
     def _cvt_attachment_to_base64(attachment):
         # attachment is already base64 string
         if isinstance(attachment, str):
             return attachment
-        
+
         # attachment is SendAttachment object
-        result = ''
-        if attachment.content_type:
-            result += f'data:{attachment.content_type};'
-        if attachment.filename:
-            result += f'filename={attachment.filename};'
-        if attachment.content_type or attachment.filename:
-            result += 'base64,'
-        result += base64.b64encode(attachment.data).decode('utf-8')
-        return result
-
-
-class ReceiveMessagesError(Exception):
+        encoded = attachment._encoded or base64.b64encode(attachment.data)
+        return attachment.header() + encoded.decode("utf-8")
+
+
+class SignalAPIError(Exception):
+    def __init__(self, *args, status: int = None, retry_after: float = None):
+        super().__init__(*args)
+        self.status = status  # HTTP status, if the API answered at all
+        self.retry_after = retry_after  # seconds, from the Retry-After header
+
+
+class ReceiveMessagesError(SignalAPIError):
     pass
 
 
-class SendMessageError(Exception):
+class SendMessageError(SignalAPIError):
     pass
 
 
-class TypingError(Exception):
+class TypingError(SignalAPIError):
     pass
 
 
@@ -170,9 +473,13 @@ class StopTypingError(TypingError):
     pass
 
 
-class ReactionError(Exception):
+class ReactionError(SignalAPIError):
+    pass
+
+
+class FetchAttachmentError(SignalAPIError):
     pass
 
 
-class FetchAttachmentError(Exception):
+class AttachmentTooLargeError(FetchAttachmentError):
     pass
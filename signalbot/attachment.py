@@ -1,24 +1,125 @@
 from abc import ABC
+import asyncio
+import base64
 import tempfile
 import mimetypes
 from pathlib import Path
+from typing import AsyncIterable, AsyncIterator
 
 
 class SendAttachment:
-    
+    """Attachment to send, either from memory, from a file or from a stream
+
+    Data from a path or an async byte source is base64 encoded chunk by chunk
+    while the request is sent, so the file never has to be held in memory.
+    In-memory data is encoded once in a worker thread and the result is reused
+    for every following send. Call .encode() to do the same for a file that is
+    sent many times. An async byte source can only be sent once.
+    """
+
+    # multiple of 3, so that the base64 encoded chunks can be concatenated
+    CHUNK_SIZE = 3 * 64 * 1024
+
     def __init__(
         self,
-        data: bytes,
+        data: bytes | None = None,
         content_type: str | None = None,
         filename: str | None = None,
+        path: str | Path | None = None,
+        source: AsyncIterable[bytes] | None = None,
     ):
+        if data is None and path is None and source is None:
+            raise ValueError("One of data, path or source is required")
+
         self.content_type = content_type
         self.filename = filename
         self.data = data
+        self.path = path
+        self.source = source
+        self._encoded = None  # cached base64 encoding
+
+    @property
+    def replayable(self) -> bool:
+        """Whether the attachment can be sent again, an async source can't"""
+        return self.source is None or self._encoded is not None
+
+    @classmethod
+    def from_path(
+        cls,
+        path: str | Path,
+        content_type: str | None = None,
+        filename: str | None = None,
+    ):
+        if content_type is None:
+            content_type, _ = mimetypes.guess_type(str(path))
+        if filename is None:
+            filename = Path(path).name
+        return cls(content_type=content_type, filename=filename, path=path)
+
+    def header(self) -> str:
+        """data URI prefix understood by signal-cli-rest-api"""
+        result = ""
+        if self.content_type:
+            result += f"data:{self.content_type};"
+        if self.filename:
+            result += f"filename={self.filename};"
+        if self.content_type or self.filename:
+            result += "base64,"
+        return result
+
+    async def encode(self) -> bytes:
+        """Base64 encode the whole attachment once and keep the result"""
+        if self._encoded is None:
+            chunks = [chunk async for chunk in self.iter_base64()]
+            self._encoded = b"".join(chunks)
+        return self._encoded
+
+    async def iter_base64(self) -> AsyncIterator[bytes]:
+        if self._encoded is not None:
+            yield self._encoded
+
+        elif self.data is not None:
+            self._encoded = await asyncio.to_thread(base64.b64encode, self.data)
+            yield self._encoded
+
+        elif self.path is not None:
+            with open(self.path, "rb") as f:
+                while True:
+                    chunk = await asyncio.to_thread(self._read_base64, f)
+                    if not chunk:
+                        break
+                    yield chunk
+
+        else:
+            rest = b""
+            async for data in self.source:
+                data = rest + data
+                usable = len(data) - len(data) % 3
+                rest = data[usable:]
+                if usable:
+                    yield base64.b64encode(data[:usable])
+            if rest:
+                yield base64.b64encode(rest)
+
+    @classmethod
+    def _read_base64(cls, f) -> bytes:
+        return base64.b64encode(f.read(cls.CHUNK_SIZE))
 
 
 class ReceiveAttachment:
-    
+    __slots__ = (
+        "content_type",
+        "filename",
+        "id_",
+        "size",
+        "width",
+        "height",
+        "caption",
+        "upload_timestamp",
+        "raw_attachment",
+        "data",
+    )
+
     def __init__(
         self,
         content_type: str,
@@ -40,6 +141,7 @@ class ReceiveAttachment:
         self.caption = caption
         self.upload_timestamp = upload_timestamp
         self.raw_attachment = raw_attachment
+        self.data = None  # see Context.fetch_attachment_data()
         
     @classmethod
     def parse(cls, raw_attachment: str):
@@ -1,18 +1,47 @@
 import asyncio
+import functools
+import signal
 import time
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, EVENT_JOB_SUBMITTED
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 import logging
-import traceback
+from typing import Callable
 
 
-from .api import SignalAPI, ReceiveMessagesError
+from .api import SignalAPI, ReceiveMessagesError, SendMessageError
 from .command import Command
-from .message import Message, UnknownMessageFormatError, MessageType
-from .storage import RedisStorage, InMemoryStorage
+from .message import Envelope, Message, UnknownMessageFormatError, MessageType
+from .storage import (
+    RedisStorage,
+    InMemoryStorage,
+    AsyncStorage,
+    AsyncRedisStorage,
+    AsyncInMemoryStorage,
+    CachedStorage,
+)
 from .context import Context
+from .attachment import ReceiveAttachment, SendAttachment
+from .dispatch import DispatchQueue, OverflowPolicy
+from .trigger import TriggerIndex
+from .metrics import MetricsRegistry, MetricsServer, NullMetricsRegistry
+from .workers import ConsumerPool
+from .ratelimit import SendScheduler
+from .retry import CircuitBreaker, RetryPolicy
+from .receiver import SeenSet, WebSocketReceiver, PollingReceiver
+from .distributed import StreamQueue
+from .executor import CommandExecutors
+from .journal import MessageJournal
+from . import log
+
+logger = logging.getLogger(__name__)
 
 
 class SignalBot:
+    # restarts of crashed producers and consumers
+    RERUN_POLICY = RetryPolicy(
+        max_attempts=None, backoff=1, max_backoff=5 * 60, jitter=False
+    )
+
     def __init__(self, config: dict):
         """SignalBot
 
@@ -20,56 +49,472 @@ class SignalBot:
         ===============
         signal_service: "127.0.0.1:8080"
         phone_number: "+49123456789"
+        event_loop: "asyncio"  # or "uvloop", the loop .start() runs the bot in
+        accounts:  # optional, more phone numbers served by this bot
+            - "+49123456780"
+        logging:  # optional
+            level: "INFO"  # of all signalbot loggers
+            levels:  # per module, e.g. bot, api, receiver, dispatch, storage
+                receiver: "WARNING"
+            queue: false  # true writes log records in a background thread
+            sample_every: 100  # log only every n-th per-message debug record
+        metrics:  # optional
+            enabled: true  # false turns all metrics into no-ops
+            port: 9090  # serves /metrics in the Prometheus text format
+            host: "127.0.0.1"
+        connection_pool:
+            limit: 100
+            limit_per_host: 10
+            keepalive_timeout: 30
+            dns_cache_ttl: 300
+        retry:  # optional, per operation: send, react, typing, attachment, receive
+            send:
+                max_attempts: 3
+                backoff: 0.5  # seconds, doubled on every attempt
+                max_backoff: 10
+                jitter: true
+                retry_statuses: [502, 503]
+        receive:
+            mode: "websocket"  # or "poll" for signal-cli in normal/native mode
+            ping_interval: 20  # seconds, websocket keepalive
+            ping_timeout: 20
+            poll_interval: 1.0  # seconds between polls, poll mode only
+            batch_size: 100  # messages per poll
+            poll_timeout: 1  # seconds the API waits for new messages
+            dedupe_size: 4096  # recent messages remembered to drop duplicates
+        circuit_breaker:  # optional, fail fast while the API is down
+            failure_threshold: 5
+            reset_timeout: 30
+        workers:
+            producers: 1
+            consumers: 3
+            autoscale:  # optional, adjusts the consumers between min and max
+                min_consumers: 1
+                max_consumers: 20
+                target_wait: 1.0  # seconds a queued message should wait at most
+                interval: 1.0
+        executor:  # pools for commands with executor = "thread" / "process"
+            threads: 8  # default depends on the number of CPUs
+            processes: 4
+            max_pending: 100  # calls per pool at once, more wait in the queue
+            start_method: "spawn"  # optional, see multiprocessing.get_context
+        rate_limit:  # optional, throttles outgoing messages
+            rate: 1.0  # messages per second in total
+            burst: 10
+            recipient_rate: 0.5  # messages per second per chat
+            recipient_burst: 3
+            coalesce: true  # merge queued text messages to a flooded chat
+            max_retries: 5  # on rate limit responses (413, 429)
+        dispatch:
+            max_size: 1000  # 0 means unbounded
+            overflow: "block"  # or "drop_oldest", "drop_newest"
+            user_priority: 1
+            group_priority: 0
+            ordered: false  # true handles messages of one chat one at a time
         storage:
             redis_host: "redis"
             redis_port: 6379
+            async: false  # true uses AsyncRedisStorage / AsyncInMemoryStorage
+            max_connections: 10  # async only
+            cache:  # optional write-behind cache, async only
+                max_size: 1024
+                ttl: 60  # seconds, omit to cache until evicted
+                flush_interval: 1.0
+        distributed:  # optional, share the work between several bot processes
+            role: "both"  # "receiver" publishes, "worker" handles, "both" does both
+            redis_host: "redis"  # defaults to the storage redis
+            redis_port: 6379
+            stream: "signalbot:messages"
+            group: "signalbot"
+            claim_idle: 60  # seconds until unacknowledged messages are redelivered
+            max_in_flight: 100  # messages a worker handles at the same time
+        shutdown:
+            drain_timeout: 30  # seconds to finish queued and running commands
+        journal:  # optional, keeps received messages on disk until handled
+            path: "signalbot-journal"  # directory of the segment files
+            segment_size: 67108864  # bytes
+            fsync: false  # true also survives a crash of the machine, slower
         """
         self.config = config
 
         self.commands = []  # populated by .register()
+        self._trigger_index = None  # built from self.commands on demand
 
         self.user_chats = set()  # populated by .listenUser()
         self.group_chats = {}  # populated by .listenGroup()
 
         # Required
+        self._init_logging()
+        self._init_metrics()
         self._init_api()
         self._init_event_loop()
+        self._init_dispatch()
+        self._init_workers()
+        self._init_receive()
+        self._init_rate_limit()
+        self._init_executors()
         self._init_scheduler()
+        self._init_shutdown()
 
         # Optional
         self._init_storage()
+        self._init_distributed()
+        self._init_journal()
 
     def _init_api(self):
         try:
             self._phone_number = self.config["phone_number"]
             self._signal_service = self.config["signal_service"]
-            self._signal = SignalAPI(self._signal_service, self._phone_number)
+            self._signal = SignalAPI(
+                self._signal_service,
+                self._phone_number,
+                **self._connection_pool_options(),
+                **self._keepalive_options(),
+                retry_policies=self._retry_policies(),
+                circuit_breaker=self._circuit_breaker(),
+                metrics=self.metrics,
+            )
         except KeyError:
             raise SignalBotError("Could not initialize SignalAPI with given config")
 
+        # all accounts share the connection pool of the first one
+        self._accounts = {self._phone_number: self._signal}
+        for phone_number in self.config.get("accounts", []):
+            if phone_number not in self._accounts:
+                self._accounts[phone_number] = self._signal.for_account(phone_number)
+
+    def _retry_policies(self) -> dict:
+        policies = {}
+        for operation, options in self.config.get("retry", {}).items():
+            if operation not in SignalAPI.DEFAULT_RETRY_POLICIES:
+                raise SignalBotError(f"Unknown operation {operation} in retry config")
+            default = SignalAPI.DEFAULT_RETRY_POLICIES[operation]
+            policies[operation] = default.replace(**options)
+        return policies
+
+    def _circuit_breaker(self) -> CircuitBreaker | None:
+        config_breaker = self.config.get("circuit_breaker")
+        if config_breaker is None:
+            return None
+
+        breaker = CircuitBreaker(**config_breaker)
+        self.metrics.gauge(
+            "signalbot_api_circuit_open",
+            "1 while requests to the API fail fast",
+            lambda: int(breaker.state == CircuitBreaker.OPEN),
+        )
+        return breaker
+
+    def _connection_pool_options(self) -> dict:
+        config_pool = self.config.get("connection_pool", {})
+        options = {}
+        if "limit" in config_pool:
+            options["connection_limit"] = config_pool["limit"]
+        if "limit_per_host" in config_pool:
+            options["connection_limit_per_host"] = config_pool["limit_per_host"]
+        if "keepalive_timeout" in config_pool:
+            options["keepalive_timeout"] = config_pool["keepalive_timeout"]
+        if "dns_cache_ttl" in config_pool:
+            options["dns_cache_ttl"] = config_pool["dns_cache_ttl"]
+        return options
+
+    def _keepalive_options(self) -> dict:
+        config_receive = self.config.get("receive", {})
+        options = {}
+        if "ping_interval" in config_receive:
+            options["ping_interval"] = config_receive["ping_interval"]
+        if "ping_timeout" in config_receive:
+            options["ping_timeout"] = config_receive["ping_timeout"]
+        return options
+
     def _init_event_loop(self):
-        self._event_loop = asyncio.get_event_loop()
-        self._q = asyncio.Queue()
+        # the loop is the one running .run(), nothing binds to a loop before
+        self._event_loop = None
+        self._run_loop = asyncio.run  # runs .start() in a new loop
+        loop_type = self.config.get("event_loop", "asyncio")
+        if loop_type == "asyncio":
+            return
+        if loop_type != "uvloop":
+            raise SignalBotError(f"Unknown event loop {loop_type}")
+        try:
+            import uvloop
+        except ImportError:
+            raise SignalBotError("uvloop is not installed, see signalbot[uvloop]")
+        self._run_loop = uvloop.run  # leaves the event loop policy alone
+
+    def _init_dispatch(self):
+        config_dispatch = self.config.get("dispatch", {})
+        self._user_priority = config_dispatch.get("user_priority", 1)
+        self._group_priority = config_dispatch.get("group_priority", 0)
+        try:
+            self._q = DispatchQueue(
+                maxsize=config_dispatch.get("max_size", 0),
+                overflow=OverflowPolicy(config_dispatch.get("overflow", "block")),
+                on_drop=self._on_dropped,
+                ordered=config_dispatch.get("ordered", False),
+            )
+        except ValueError as e:
+            raise SignalBotError(f"Could not initialize dispatch queue: {e}")
+
+    def _init_logging(self):
+        config_logging = self.config.get("logging", {})
+        try:
+            log.configure(
+                level=config_logging.get("level"),
+                levels=config_logging.get("levels"),
+                use_queue=config_logging.get("queue", False),
+                sample_every=config_logging.get("sample_every"),
+            )
+        except ValueError as e:
+            raise SignalBotError(f"Could not configure logging: {e}")
+
+        # per-message debug logs, see log.Sampler
+        self._sample_raw = log.Sampler()
+        self._sample_jobs = log.Sampler()
+
+    def _init_metrics(self):
+        config_metrics = self.config.get("metrics", {})
+        self._metrics_enabled = config_metrics.get("enabled", True)
+        if self._metrics_enabled:
+            self.metrics = MetricsRegistry()
+        else:
+            self.metrics = NullMetricsRegistry()
+
+        self._metrics_server = None
+        if self._metrics_enabled and "port" in config_metrics:
+            self._metrics_server = MetricsServer(
+                self.metrics,
+                host=config_metrics.get("host", "127.0.0.1"),
+                port=config_metrics["port"],
+            )
+
+    def _init_workers(self):
+        config_workers = self.config.get("workers", {})
+        self._producers = config_workers.get("producers", 1)
+        consumers = config_workers.get("consumers", 3)
+
+        # Without autoscaling, the pool has a fixed size
+        config_autoscale = config_workers.get("autoscale")
+        if config_autoscale is None:
+            config_autoscale = {"min_consumers": consumers, "max_consumers": consumers}
+            self._autoscale_interval = None
+        else:
+            self._autoscale_interval = config_autoscale.get("interval", 1.0)
+
+        try:
+            self._consumers = ConsumerPool(
+                self._run_consumer,
+                min_consumers=config_autoscale.get("min_consumers", 1),
+                max_consumers=config_autoscale.get("max_consumers", 20),
+                target_wait=config_autoscale.get("target_wait", 1.0),
+            )
+        except ValueError as e:
+            raise SignalBotError(f"Could not initialize workers: {e}")
+
+        # start within the bounds of the pool
+        self._consumer_count = min(
+            max(consumers, self._consumers.min_consumers),
+            self._consumers.max_consumers,
+        )
+
+        self.metrics.gauge(
+            "signalbot_queue_depth",
+            "Items waiting in the dispatch queue",
+            function=self._q.qsize,
+        )
+        self.metrics.gauge(
+            "signalbot_consumers",
+            "Running consumer tasks",
+            function=self._consumers.size,
+        )
+        self.metrics.gauge(
+            "signalbot_consumers_busy",
+            "Consumer tasks currently handling a message",
+            function=self._consumers.busy,
+        )
+        self.metrics.gauge(
+            "signalbot_handler_latency_seconds",
+            "Moving average of the time a consumer needs per item",
+            function=lambda: self._consumers.latency or 0,
+        )
+        self._queue_wait = self.metrics.histogram(
+            "signalbot_queue_wait_seconds",
+            "Time items waited in the dispatch queue",
+        )
+        self._command_duration = self.metrics.histogram(
+            "signalbot_command_duration_seconds",
+            "Time a command needed to handle a message",
+            labelnames=("command",),
+        )
+        self._command_errors = self.metrics.counter(
+            "signalbot_command_errors",
+            "Messages whose handling raised an exception",
+            labelnames=("command",),
+        )
+
+    def _init_receive(self):
+        config_receive = self.config.get("receive", {})
+        self._receive_mode = config_receive.get("mode", "websocket")
+        if self._receive_mode not in ("websocket", "poll"):
+            raise SignalBotError(f"Unknown receive mode {self._receive_mode}")
+        self._poll_options = {}
+        if "poll_interval" in config_receive:
+            self._poll_options["interval"] = config_receive["poll_interval"]
+        if "batch_size" in config_receive:
+            self._poll_options["batch_size"] = config_receive["batch_size"]
+        if "poll_timeout" in config_receive:
+            self._poll_options["timeout"] = config_receive["poll_timeout"]
+
+        # shared by all producers, a reconnect may deliver messages again
+        self._seen = SeenSet(config_receive.get("dedupe_size", 4096))
+        self._duplicates = self.metrics.counter(
+            "signalbot_receive_duplicates", "Dropped duplicates of received messages"
+        )
+        self._parse_failures = self.metrics.counter(
+            "signalbot_receive_parse_failures", "Received messages in unknown formats"
+        )
+
+    def _init_rate_limit(self):
+        config_rate_limit = self.config.get("rate_limit")
+        self._send_schedulers = {}  # per account, Signal limits each account
+        if config_rate_limit is None:
+            return
+
+        try:
+            for account in self._accounts:
+                self._send_schedulers[account] = SendScheduler(
+                    **config_rate_limit, metrics=self.metrics
+                )
+        except TypeError as e:
+            raise SignalBotError(f"Could not initialize rate limit: {e}")
 
     def _init_storage(self):
+        config_storage = self.config.get("storage", {})
+        use_async = config_storage.get("async", False)
         try:
-            config_storage = self.config["storage"]
             self._redis_host = config_storage["redis_host"]
             self._redis_port = config_storage["redis_port"]
-            self.storage = RedisStorage(self._redis_host, self._redis_port)
+            if use_async:
+                self.storage = AsyncRedisStorage(
+                    self._redis_host,
+                    self._redis_port,
+                    max_connections=config_storage.get("max_connections"),
+                )
+            else:
+                self.storage = RedisStorage(self._redis_host, self._redis_port)
         except Exception:
-            self.storage = InMemoryStorage()
-            logging.warning(
+            self.storage = AsyncInMemoryStorage() if use_async else InMemoryStorage()
+            logger.warning(
                 "[Bot] Could not initialize Redis. In-memory storage will be used. "
                 "Restarting will delete the storage!"
             )
 
+        config_cache = config_storage.get("cache")
+        if config_cache is None:
+            return
+        if not use_async:
+            logger.warning("[Bot] The storage cache requires async storage")
+            return
+
+        self.storage = CachedStorage(
+            self.storage,
+            max_size=config_cache.get("max_size", 1024),
+            cache_ttl=config_cache.get("ttl"),
+            flush_interval=config_cache.get("flush_interval", 1.0),
+        )
+        for stat in ["hits", "misses", "evictions", "flushes"]:
+            self.metrics.gauge(
+                f"signalbot_storage_cache_{stat}",
+                f"Storage cache {stat}",
+                function=lambda stat=stat: self.storage.stats()[stat],
+            )
+
+    def _init_distributed(self):
+        # received messages of a distributed bot, until all commands handled them
+        self._completions = {}  # Message -> [commands left, callback]
+        self._ack_tasks = set()
+
+        config_distributed = self.config.get("distributed")
+        self._stream = None
+        self._role = "both"
+        if config_distributed is None:
+            return
+
+        config_distributed = dict(config_distributed)
+        self._role = config_distributed.pop("role", "both")
+        if self._role not in ("receiver", "worker", "both"):
+            raise SignalBotError(f"Unknown distributed role {self._role}")
+        self._max_in_flight = config_distributed.pop("max_in_flight", 100)
+
+        config_storage = self.config.get("storage", {})
+        host = config_distributed.pop("redis_host", config_storage.get("redis_host"))
+        port = config_distributed.pop("redis_port", config_storage.get("redis_port"))
+        if host is None or port is None:
+            raise SignalBotError("The distributed queue requires a Redis host")
+        try:
+            self._stream = StreamQueue.from_config(
+                host, port, metrics=self.metrics, **config_distributed
+            )
+        except TypeError as e:
+            raise SignalBotError(f"Could not initialize distributed queue: {e}")
+
+    def _init_journal(self):
+        config_journal = self.config.get("journal")
+        self._journal = None
+        if config_journal is None:
+            return
+        if self._stream is not None:
+            # the stream keeps messages until they are acknowledged already
+            logger.warning("[Bot] The journal is not used with a distributed queue")
+            return
+
+        try:
+            self._journal = MessageJournal(**config_journal)
+        except TypeError as e:
+            raise SignalBotError(f"Could not initialize journal: {e}")
+
+    def _init_executors(self):
+        try:
+            self.executors = CommandExecutors(**self.config.get("executor", {}))
+        except TypeError as e:
+            raise SignalBotError(f"Could not initialize executors: {e}")
+
+        self._loop_lag = self.metrics.gauge(
+            "signalbot_event_loop_lag_seconds",
+            "How late the event loop ran a scheduled callback, last measurement",
+        )
+
     def _init_scheduler(self):
         try:
-            self.scheduler = AsyncIOScheduler(event_loop=self._event_loop)
+            self.scheduler = AsyncIOScheduler()  # uses the loop of .start()
         except Exception as e:
             raise SignalBotError(f"Could not initialize scheduler: {e}")
 
+        # running jobs, so that the shutdown can wait for them
+        self._running_jobs = 0
+        self._jobs_done = asyncio.Event()
+        self._jobs_done.set()
+        self.scheduler.add_listener(
+            self._count_jobs, EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR
+        )
+
+    def _count_jobs(self, event):
+        if event.code == EVENT_JOB_SUBMITTED:
+            self._running_jobs += 1
+            self._jobs_done.clear()
+            return
+        self._running_jobs -= 1
+        if self._running_jobs == 0:
+            self._jobs_done.set()
+
+    def _init_shutdown(self):
+        config_shutdown = self.config.get("shutdown", {})
+        self._drain_timeout = config_shutdown.get("drain_timeout", 30)
+        self._intake_tasks = set()  # producers and the distributed queue reader
+        self._background_tasks = set()
+        self._stopping = False
+        self._stop_requested = asyncio.Event()
+
     def listen(self, required_id: str, optional_id: str = None):
         # Case 1: required id is a phone number, optional_id is not being used
         if self._is_phone_number(required_id):
@@ -91,13 +536,13 @@ class SignalBot:
             self.listenGroup(group_id, internal_id)
             return
 
-        logging.warning(
+        logger.warning(
             "[Bot] Can't listen for user/group because input does not look valid"
         )
 
     def listenUser(self, phone_number: str):
         if not self._is_phone_number(phone_number):
-            logging.warning(
+            logger.warning(
                 "[Bot] Can't listen for user because phone number does not look valid"
             )
             return
@@ -106,7 +551,7 @@ class SignalBot:
 
     def listenGroup(self, group_id: str, internal_id: str):
         if not (self._is_group_id(group_id) and self._is_internal_id(internal_id)):
-            logging.warning(
+            logger.warning(
                 "[Bot] Can't listen for group because group id and "
                 "internal id do not look valid"
             )
@@ -142,16 +587,140 @@ class SignalBot:
         command.bot = self
         command.setup()
         self.commands.append(command)
+        self._trigger_index = None
 
     def start(self):
-        self._event_loop.create_task(self._produce_consume_messages())
+        """Run the bot in a new event loop until .stop(), SIGTERM or SIGINT"""
+        self._run_loop(self._run_until_signal())
+
+    async def run(self):
+        """Run the bot in the running event loop until .stop() is called
 
-        # Add more scheduler tasks here
-        # self.scheduler.add_job(...)
-        self.scheduler.start()
+        Use it to run the bot next to other code in one loop, e.g. a web app:
+            task = asyncio.create_task(bot.run())
+        or start the bot with async with SignalBot(config) as bot: ...
+        """
+        async with self:
+            await self._stop_requested.wait()
+
+    async def __aenter__(self) -> "SignalBot":
+        self._event_loop = asyncio.get_running_loop()
+        try:
+            # Open the pooled HTTP session before any message is sent
+            await self._signal.open()
+            await self._produce_consume_messages()
 
-        # Run event loop
-        self._event_loop.run_forever()
+            # Add more scheduler tasks here
+            # self.scheduler.add_job(...)
+            self.scheduler.start()
+        except BaseException:
+            await self.shutdown()
+            raise
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.shutdown()
+
+    async def _run_until_signal(self):
+        # SIGTERM (e.g. during a deploy) and SIGINT stop the bot, see .stop()
+        loop = asyncio.get_running_loop()
+        signals = []
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(signum, self.stop)
+                signals.append(signum)
+            except (NotImplementedError, RuntimeError):
+                pass  # not supported on Windows or outside the main thread
+
+        try:
+            await self.run()
+        finally:
+            for signum in signals:
+                loop.remove_signal_handler(signum)
+
+    def stop(self):
+        """Stop the bot started with .start() or .run(), safe from other threads
+
+        .start() and .run() return after .shutdown() finished.
+        """
+        if self._event_loop is None:
+            self._stop_requested.set()  # not running yet, .run() returns at once
+        else:
+            self._event_loop.call_soon_threadsafe(self._stop_requested.set)
+
+    async def shutdown(self, drain_timeout: float | None = None):
+        """Stop receiving, finish the queued and running commands, clean up
+
+        Commands get drain_timeout seconds (default from the shutdown config)
+        to finish. Commands still queued or running after that are cancelled.
+        In a distributed setup they were not acknowledged and are handled by
+        another worker.
+        """
+        if self._stopping:
+            return
+        self._stopping = True
+        if drain_timeout is None:
+            drain_timeout = self._drain_timeout
+        logger.info("[Bot] Shutting down")
+
+        await self._cancel(self._intake_tasks)
+        if self.scheduler.running:
+            self.scheduler.pause()  # no new jobs, running ones finish below
+        try:
+            await asyncio.wait_for(self._drain(), drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                "[Bot] %s queued commands and %s jobs did not finish within %ss",
+                self._q.qsize() + self._consumers.busy(),
+                self._running_jobs,
+                drain_timeout,
+            )
+            self._completions.clear()  # cancelled commands are not acknowledged
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)  # cancels jobs that are left
+            await asyncio.sleep(0)  # AsyncIOScheduler shuts down in a callback
+        await self._consumers.stop()
+        await self._cancel(self._background_tasks)
+        if self._ack_tasks:
+            await asyncio.gather(*self._ack_tasks, return_exceptions=True)
+
+        if self._metrics_server is not None:
+            await self._metrics_server.stop()
+        if isinstance(self.storage, AsyncStorage):
+            await self.storage.close()  # flushes the write-behind cache
+        if self._stream is not None:
+            await self._stream.close()
+        if self._journal is not None:
+            self._journal.close()  # commands that did not finish are replayed
+        await self._signal.close()
+        # joining the pools would block the loop on commands still running
+        self.executors.shutdown(wait=False)
+        logger.info("[Bot] Shut down")
+        log.stop()
+        self._event_loop = None  # a late .stop() has nothing left to do
+
+    async def _drain(self):
+        await self._jobs_done.wait()  # jobs may still queue messages
+        await self._q.join()
+
+    @staticmethod
+    async def _cancel(tasks: set):
+        # a task can lose a cancellation, e.g. to asyncio.wait_for before
+        # Python 3.12 when the awaited call fails at the same time
+        pending = set(tasks)
+        while pending:
+            for task in pending:
+                task.cancel()
+            _, pending = await asyncio.wait(pending, timeout=0.1)
+        await asyncio.gather(*tasks, return_exceptions=True)
+        tasks.clear()
+
+    def _create_task(self, coro, intake: bool = False) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        tasks = self._intake_tasks if intake else self._background_tasks
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        return task
 
     async def send(
         self,
@@ -159,14 +728,32 @@ class SignalBot:
         text: str,
         base64_attachments: list = None,
         listen: bool = False,
+        account: str = None,
     ) -> int:
+        """Send a message, from the given account or the main phone_number"""
+        signal = self._api(account)
+        scheduler = self._send_schedulers.get(signal.phone_number)
         resolved_receiver = self._resolve_receiver(receiver)
-        resp = await self._signal.send(
-            resolved_receiver, text, base64_attachments=base64_attachments
-        )
-        resp_payload = await resp.json()
-        timestamp = resp_payload["timestamp"]
-        logging.info(f"[Bot] New message {timestamp} sent:\n{text}")
+
+        async def send(text: str) -> int:
+            resp = await signal.send(
+                resolved_receiver, text, base64_attachments=base64_attachments
+            )
+            resp_payload = await resp.json()
+            return resp_payload["timestamp"]
+
+        if scheduler is None:
+            timestamp = await send(text)
+        else:
+            # only plain text can be merged with other messages
+            coalesce = not base64_attachments and not listen
+            replayable = all(
+                isinstance(a, str) or a.replayable for a in base64_attachments or []
+            )
+            timestamp = await scheduler.send(
+                resolved_receiver, text, send, coalesce=coalesce, retry=replayable
+            )
+        logger.debug("[Bot] New message %s sent", timestamp)  # no message contents
 
         if listen:
             if self._is_phone_number(receiver):
@@ -177,39 +764,136 @@ class SignalBot:
                     text=text,
                     base64_attachments=base64_attachments,
                     group=None,
+                    account=signal.phone_number,
                 )
             else:
                 sent_message = Message(
-                    source=self._phone_number,  # no need to pretend
+                    source=signal.phone_number,  # no need to pretend
                     timestamp=timestamp,
                     type=MessageType.SYNC_MESSAGE,
                     text=text,
                     base64_attachments=base64_attachments,
                     group=receiver,
+                    account=signal.phone_number,
                 )
             await self._ask_commands_to_handle(sent_message)
 
         return timestamp
 
+    async def broadcast(
+        self,
+        receivers: list[str],
+        text: str,
+        base64_attachments: list = None,
+        batch_size: int = 50,
+        concurrency: int = 4,
+        account: str = None,
+    ) -> dict[str, int | Exception]:
+        """Send the same message to many receivers
+
+        Receivers are grouped into requests of up to batch_size recipients and
+        at most concurrency requests run at the same time. If a request was
+        rejected (400, e.g. for an invalid receiver), its receivers are sent
+        one by one so that the error can be attributed. Other errors may come
+        after some receivers got the message, they are reported for the whole
+        request and not sent again. Returns the timestamp of the sent message
+        or the exception per receiver.
+        """
+        signal = self._api(account)
+        scheduler = self._send_schedulers.get(signal.phone_number)
+        results = {}
+        resolved = {}
+        for receiver in dict.fromkeys(receivers):  # unique, in order
+            try:
+                resolved[receiver] = self._resolve_receiver(receiver)
+            except SignalBotError as e:
+                results[receiver] = e
+
+        # encode every attachment once for all requests
+        for attachment in base64_attachments or []:
+            if isinstance(attachment, SendAttachment):
+                await attachment.encode()
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def send(batch: list[str]):
+            async def send_now():
+                resp = await signal.send(
+                    [resolved[receiver] for receiver in batch],
+                    text,
+                    base64_attachments=base64_attachments,
+                )
+                resp_payload = await resp.json()
+                return resp_payload["timestamp"]
+
+            async with semaphore:
+                if scheduler is None:
+                    return await send_now()
+                # signal-cli sends one message per recipient
+                return await scheduler.call(send_now, cost=len(batch))
+
+        async def send_batch(batch: list[str]):
+            try:
+                timestamp = await send(batch)
+                results.update({receiver: timestamp for receiver in batch})
+            except Exception as e:
+                # nothing was sent only if the API rejected the request
+                rejected = isinstance(e, SendMessageError) and e.status == 400
+                if len(batch) == 1 or not rejected:
+                    results.update({receiver: e for receiver in batch})
+                    return
+                await asyncio.gather(*[send_batch([receiver]) for receiver in batch])
+
+        pending = list(resolved)
+        batches = [
+            pending[i : i + batch_size] for i in range(0, len(pending), batch_size)
+        ]
+        await asyncio.gather(*[send_batch(batch) for batch in batches])
+
+        failed = sum(isinstance(r, Exception) for r in results.values())
+        logger.info(
+            "[Bot] Broadcast sent to %s receivers, %s failed",
+            len(results) - failed,
+            failed,
+        )
+        return {receiver: results[receiver] for receiver in dict.fromkeys(receivers)}
+
     async def react(self, message: Message, emoji: str):
         # TODO: check that emoji is really an emoji
         recipient = self._resolve_receiver(message.recipient())
         target_author = message.source
         timestamp = message.timestamp
-        await self._signal.react(recipient, emoji, target_author, timestamp)
-        logging.info(f"[Bot] New reaction: {emoji}")
+        signal = self._api(message.account)
+        await signal.react(recipient, emoji, target_author, timestamp)
+        logger.debug("[Bot] New reaction to %s", timestamp)
 
-    async def start_typing(self, receiver: str):
+    async def start_typing(self, receiver: str, account: str = None):
         receiver = self._resolve_receiver(receiver)
-        await self._signal.start_typing(receiver)
+        await self._api(account).start_typing(receiver)
 
-    async def stop_typing(self, receiver: str):
+    async def stop_typing(self, receiver: str, account: str = None):
         receiver = self._resolve_receiver(receiver)
-        await self._signal.stop_typing(receiver)
-        
+        await self._api(account).stop_typing(receiver)
+
     async def fetch_attachment_data(self, attachment_ids: str):
         await self._signal.fetch_attachment_data(attachment_ids)
 
+    async def download_attachment(
+        self, attachment: ReceiveAttachment, destination, **kwargs
+    ) -> tuple[int, str | None]:
+        return await self._signal.download_attachment(attachment, destination, **kwargs)
+
+    def iter_attachment(self, attachment: ReceiveAttachment, **kwargs):
+        return self._signal.iter_attachment(attachment, **kwargs)
+
+    def _api(self, account: str | None) -> SignalAPI:
+        if account is None:
+            return self._signal
+        try:
+            return self._accounts[account]
+        except KeyError:
+            raise SignalBotError(f"Account {account} is not served by this bot")
+
     def _resolve_receiver(self, receiver: str) -> str:
         if self._is_phone_number(receiver):
             return receiver
@@ -226,65 +910,140 @@ class SignalBot:
 
     # see https://stackoverflow.com/questions/55184226/catching-exceptions-in-individual-tasks-and-restarting-them
     @classmethod
-    async def _rerun_on_exception(cls, coro, *args, **kwargs):
-        """Restart coroutine by waiting an exponential time deplay"""
-        max_sleep = 5 * 60  # sleep for at most 5 mins until rerun
-        reset = 3 * 60  # reset after 3 minutes running successfully
-        init_sleep = 1  # always start with sleeping for 1 second
+    async def _rerun_on_exception(
+        cls, coro, *args, policy: RetryPolicy | None = None, **kwargs
+    ):
+        """Restart coroutine by waiting an exponential time deplay
+
+        The delay follows the retry policy, by default starting at 1 second up
+        to 5 minutes. It is reset after 3 minutes of running successfully.
+        """
+        if policy is None:
+            policy = cls.RERUN_POLICY
+        reset = 3 * 60
 
-        next_sleep = init_sleep
+        attempt = 0
         while True:
-            start_t = int(time.monotonic())  # seconds
+            start_t = time.monotonic()
 
             try:
                 await coro(*args, **kwargs)
             except asyncio.CancelledError:
                 raise
             except Exception:
-                traceback.print_exc()
+                logger.exception("[Bot] %s crashed", coro.__name__)
 
-            end_t = int(time.monotonic())  # seconds
-
-            if end_t - start_t < reset:
-                sleep_t = next_sleep
-                next_sleep = min(max_sleep, next_sleep * 2)  # double sleep time
-            else:
-                next_sleep = init_sleep  # reset sleep time
-                sleep_t = next_sleep
+            if time.monotonic() - start_t >= reset:
+                attempt = 0  # reset sleep time
+            if not policy.attempts_left(attempt):
+                logger.error("[Bot] Giving up coroutine after %s attempts", attempt + 1)
+                return
 
-            logging.warning(f"Restarting coroutine in {sleep_t} seconds")
+            sleep_t = policy.delay(attempt)
+            attempt += 1
+            logger.warning("[Bot] Restarting coroutine in %.1f seconds", sleep_t)
             await asyncio.sleep(sleep_t)
 
-    async def _produce_consume_messages(self, producers=1, consumers=3) -> None:
-        for n in range(1, producers + 1):
-            produce_task = self._rerun_on_exception(self._produce, n)
-            asyncio.create_task(produce_task)
+    async def _produce_consume_messages(self, producers=None, consumers=None) -> None:
+        if producers is None:
+            producers = self._producers
+        if consumers is None:
+            consumers = self._consumer_count
 
-        for n in range(1, consumers + 1):
-            consume_task = self._rerun_on_exception(self._consume, n)
-            asyncio.create_task(consume_task)
+        if self._metrics_enabled:
+            self._create_task(self._monitor_loop_lag())
+        if self._metrics_server is not None:
+            await self._metrics_server.start()
+        if self._stream is not None:
+            await self._stream.setup()
+        if self._journal is not None:
+            # before the producers append to it
+            pending = self._journal.open()
+            self._create_task(self._replay_journal(pending), intake=True)
 
-    async def _produce(self, name: int) -> None:
-        logging.info(f"[Bot] Producer #{name} started")
+        if self._role != "worker":
+            policy = self._signal.retry_policies["receive"]
+            for account in self._accounts:
+                for n in range(1, producers + 1):
+                    produce_task = self._rerun_on_exception(
+                        self._produce, n, account, policy=policy
+                    )
+                    self._create_task(produce_task, intake=True)
+
+        if isinstance(self.storage, CachedStorage):
+            self.storage.start()
+
+        if self._role == "receiver":
+            return  # commands are handled by the workers
+        if self._stream is not None:
+            self._create_task(
+                self._rerun_on_exception(self._consume_stream), intake=True
+            )
+
+        self._consumers.start(consumers)
+        if self._autoscale_interval is not None:
+            self._create_task(
+                self._consumers.autoscale(self._q, self._autoscale_interval)
+            )
+
+    async def _monitor_loop_lag(self, interval: float = 0.5):
+        # a callback that blocks the loop delays every following wakeup
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            self._loop_lag.set(max(0, time.perf_counter() - start - interval))
+
+    def _run_consumer(self, name: int):
+        return self._rerun_on_exception(self._consume, name)
+
+    async def _produce(self, name: int, account: str = None) -> None:
+        signal = self._api(account)
+        logger.info("[Bot] Producer #%s for %s started", name, signal.phone_number)
+        receiver = self._create_receiver(signal)
         try:
-            async for raw_message in self._signal.receive():
-                logging.info(f"[Raw Message] {raw_message}")
+            async for raw_message in receiver.receive():
+                if logger.isEnabledFor(logging.DEBUG) and self._sample_raw():
+                    logger.debug("[Raw Message] %s", raw_message)
 
                 try:
-                    message = Message.parse(raw_message)
+                    # decide on the routing information before parsing it all
+                    envelope = Envelope.parse(raw_message)
+                    envelope.account = signal.phone_number  # reply through it
+                    # a group message received by several accounts is handled once
+                    if not self._seen.add((envelope.source, envelope.timestamp)):
+                        self._duplicates.inc()
+                        continue
+                    if not self._should_react(envelope):
+                        continue
+                    message = Message.from_envelope(envelope)
                 except UnknownMessageFormatError:
+                    self._parse_failures.inc()
                     continue
 
-                if not self._should_react(message):
-                    continue
-
-                await self._ask_commands_to_handle(message)
+                if self._stream is not None:
+                    await self._stream.publish(message)
+                elif self._journal is not None:
+                    sequence = self._journal.append(message)
+                    await self._ask_commands_to_handle(
+                        message, on_done=functools.partial(self._journal.done, sequence)
+                    )
+                else:
+                    await self._ask_commands_to_handle(message)
 
         except ReceiveMessagesError as e:
-            # TODO: retry strategy
             raise SignalBotError(f"Cannot receive messages: {e}")
 
-    def _should_react(self, message: Message) -> bool:
+    def _create_receiver(
+        self, signal: SignalAPI | None = None
+    ) -> WebSocketReceiver | PollingReceiver:
+        if signal is None:
+            signal = self._signal
+        policy = signal.retry_policies["receive"]
+        if self._receive_mode == "poll":
+            return PollingReceiver(signal, policy, self.metrics, **self._poll_options)
+        return WebSocketReceiver(signal, policy, self.metrics)
+
+    def _should_react(self, message: Message | Envelope) -> bool:
         group = message.group
         if group in self.group_chats:
             return True
@@ -295,12 +1054,71 @@ class SignalBot:
 
         return False
 
-    async def _ask_commands_to_handle(self, message: Message):
-        for command in self.commands:
-            await self._q.put((command, message, time.perf_counter()))
+    async def _replay_journal(self, pending: list[tuple[int, Message]]) -> None:
+        """Handle the messages that were received but not handled before"""
+        for sequence, message in pending:
+            await self._ask_commands_to_handle(
+                message, on_done=functools.partial(self._journal.done, sequence)
+            )
+
+    async def _consume_stream(self) -> None:
+        """Move messages from the distributed queue into the dispatch queue
+
+        A message is acknowledged once all its commands are done, so messages
+        of a crashed worker are redelivered.
+        """
+        logger.info("[Bot] Reading messages as %s", self._stream.consumer)
+        in_flight = asyncio.Semaphore(self._max_in_flight)
+
+        def done(entry_id: str):
+            in_flight.release()
+            task = asyncio.create_task(self._stream.ack(entry_id))
+            self._ack_tasks.add(task)
+            task.add_done_callback(self._ack_tasks.discard)
+
+        while True:
+            entries = await self._stream.read()
+            for entry_id, message in entries:
+                if message is None:
+                    await self._stream.ack(entry_id)
+                    continue
+                await in_flight.acquire()
+                await self._ask_commands_to_handle(
+                    message, on_done=functools.partial(done, entry_id)
+                )
+
+    async def _ask_commands_to_handle(
+        self, message: Message, on_done: Callable[[], None] | None = None
+    ):
+        """Queue the matching commands, on_done is called after the last one"""
+        commands = self._matching_commands(message)
+        if on_done is not None:
+            if not commands:
+                on_done()
+                return
+            self._completions[message] = [len(commands), on_done]
+
+        chat = message.recipient()
+        for command in commands:
+            priority = self._priority(command, message)
+            await self._q.put(
+                (command, message, time.perf_counter()), chat=chat, priority=priority
+            )
+
+    def _matching_commands(self, message: Message) -> list[Command]:
+        if self._trigger_index is None:
+            self._trigger_index = TriggerIndex(self.commands)
+        return self._trigger_index.match(message)
+
+    def _priority(self, command: Command, message: Message) -> int:
+        if command.priority is not None:
+            return command.priority
+        if message.group is None:
+            return self._user_priority
+        return self._group_priority
 
     async def _consume(self, name: int) -> None:
-        logging.info(f"[Bot] Consumer #{name} started")
+        logger.info("[Bot] Consumer #%s started", name)
         while True:
             try:
                 await self._consume_new_item(name)
@@ -310,18 +1128,46 @@ class SignalBot:
     async def _consume_new_item(self, name: int) -> None:
         command, message, t = await self._q.get()
         now = time.perf_counter()
-        logging.info(f"[Bot] Consumer #{name} got new job in {now-t:0.5f} seconds")
+        if logger.isEnabledFor(logging.DEBUG) and self._sample_jobs():
+            logger.debug(
+                "[Bot] Consumer #%s got new job in %.5f seconds", name, now - t
+            )
+        self._queue_wait.observe(now - t)
+        self._consumers.mark_busy(name)
+        command_name = command.__class__.__name__
 
         # handle Command
         try:
             context = Context(self, message)
-            await command.handle(context)
+            if command.executor is None:
+                await command.handle(context)
+            else:
+                result = await self.executors.run(command, message)
+                await command.handle_result(context, result)
         except Exception as e:
-            logging.error(f"[{command.__class__.__name__}] Error: {e}")
+            self._command_errors.labels(command=command_name).inc()
+            logger.error("[%s] Error: %s", command_name, e)
             raise e
+        finally:
+            duration = time.perf_counter() - now
+            self._command_duration.labels(command=command_name).observe(duration)
+            self._consumers.mark_idle(name, duration)
+            self._complete(message)  # failed commands are not retried either
+            # in ordered mode this lets the next message of the chat through
+            self._q.task_done(message.recipient())
+
+    def _complete(self, message: Message):
+        completion = self._completions.get(message)
+        if completion is None:
+            return
+        completion[0] -= 1
+        if completion[0] == 0:
+            del self._completions[message]
+            completion[1]()
 
-        # done
-        self._q.task_done()
+    def _on_dropped(self, item: tuple):
+        _, message, _ = item
+        self._complete(message)
 
 
 class SignalBotError(Exception):
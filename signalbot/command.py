@@ -2,6 +2,7 @@ import functools
 
 from .message import Message
 from .context import Context
+from .trigger import Trigger
 
 
 def triggered(*by, case_sensitive=False):
@@ -22,12 +23,26 @@ def triggered(*by, case_sensitive=False):
 
             return await func(*args, **kwargs)
 
+        # lets the bot skip this command for other messages before dispatching
+        wrapper_triggered.trigger = Trigger(words=by, case_sensitive=case_sensitive)
         return wrapper_triggered
 
     return decorator_triggered
 
 
 class Command:
+    # optional: dispatch priority, higher is handled first.
+    # None uses the bot's user/group priority of the message
+    priority = None
+
+    # optional: Trigger describing which messages the command handles.
+    # None means every message is passed to .handle()
+    trigger = None
+
+    # optional: "thread" for blocking or "process" for CPU-bound commands.
+    # The bot then calls .run() in a pool instead of .handle()
+    executor = None
+
     # optional
     def setup(self):
         pass
@@ -40,6 +55,23 @@ class Command:
     async def handle(self, context: Context):
         raise NotImplementedError
 
+    # overwrite instead of handle() if executor is set.
+    # With "process", the command and the message are pickled and changes
+    # to the command's attributes are not seen by the bot
+    def run(self, message: Message):
+        raise NotImplementedError
+
+    # optional: called in the event loop with the return value of run()
+    async def handle_result(self, context: Context, result):
+        if result is not None:
+            await context.send(str(result))
+
+    def __getstate__(self):
+        # the bot can't be pickled and is not needed inside of a worker process
+        state = self.__dict__.copy()
+        state.pop("bot", None)
+        return state
+
     # helper method
     # deprecated: please use @triggered
     @classmethod
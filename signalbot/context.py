@@ -15,16 +15,34 @@ class Context:
             text,
             base64_attachments=base64_attachments,
             listen=listen,
+            account=self.message.account,  # reply from the account that received it
         )
 
     async def react(self, emoji: str):
         await self.bot.react(self.message, emoji)
 
     async def start_typing(self):
-        await self.bot.start_typing(self.message.recipient())
+        await self.bot.start_typing(
+            self.message.recipient(), account=self.message.account
+        )
 
     async def stop_typing(self):
-        await self.bot.stop_typing(self.message.recipient())
+        await self.bot.stop_typing(
+            self.message.recipient(), account=self.message.account
+        )
 
     async def fetch_attachment_data(self, attachment):
-        await self.bot.fetch_attachment_data(attachment)
\ No newline at end of file
+        await self.bot.fetch_attachment_data(attachment)
+
+    async def download_attachment(self, attachment, destination, **kwargs):
+        """Stream attachment to a path or file, see SignalAPI.download_attachment"""
+        return await self.bot.download_attachment(attachment, destination, **kwargs)
+
+    def iter_attachment(self, attachment, **kwargs):
+        """Async iterator over the chunks of attachment"""
+        return self.bot.iter_attachment(attachment, **kwargs)
+
+    async def run_in_executor(self, func, *args, executor: str = "thread", **kwargs):
+        """Run a blocking ("thread") or CPU-bound ("process") function in the
+        bot's pools without blocking the other chats"""
+        return await self.bot.executors.submit(executor, func, *args, **kwargs)
@@ -0,0 +1,194 @@
+import asyncio
+import itertools
+import logging
+from collections import OrderedDict, deque
+from enum import Enum
+from typing import Any, Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class OverflowPolicy(Enum):
+    BLOCK = "block"  # wait until there is space again
+    DROP_OLDEST = "drop_oldest"  # evict the oldest item of the lowest priority
+    DROP_NEWEST = "drop_newest"  # reject the item that is being put
+
+
+class DispatchQueue:
+    """Bounded queue with priorities and per-chat fairness
+
+    Items are grouped into lanes, one lane per chat and priority. Higher
+    priorities are always served first. Within one priority, lanes are served
+    round-robin so that a busy chat cannot starve the other chats.
+
+    With ordered=True, a chat is handed out to one consumer at a time: after
+    get() returned an item of a chat, its other items are held back until
+    task_done(chat) is called. Items of one chat are then handled one after
+    the other, in order of priority and arrival, while other chats run in
+    parallel.
+
+    The interface follows asyncio.Queue (put, get, task_done, join, qsize).
+    on_drop is called with every item that is dropped because of the overflow
+    policy.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 0,
+        overflow: OverflowPolicy = OverflowPolicy.BLOCK,
+        on_drop: Callable[[Any], None] | None = None,
+        ordered: bool = False,
+    ):
+        self.maxsize = maxsize
+        self.overflow = OverflowPolicy(overflow)
+        self.on_drop = on_drop
+        self.ordered = ordered
+
+        self._levels = {}  # priority -> OrderedDict(chat -> deque of entries)
+        self._busy = {}  # chat being handled -> {priority: held back lane}
+        self._size = 0
+        self._ready = 0  # items in self._levels, i.e. not held back
+        self._unfinished = 0
+        self._counter = itertools.count()  # insertion order, used by DROP_OLDEST
+
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._finished = asyncio.Event()
+        self._not_full.set()
+        self._finished.set()
+
+    def qsize(self) -> int:
+        return self._size
+
+    def empty(self) -> bool:
+        return self._size == 0
+
+    def full(self) -> bool:
+        return 0 < self.maxsize <= self._size
+
+    async def put(self, item: Any, chat: Hashable = None, priority: int = 0) -> bool:
+        """Put item into the lane of chat. Returns False if the item was dropped"""
+        while self.full():
+            if self.overflow == OverflowPolicy.DROP_NEWEST:
+                logger.warning("[Dispatch] Queue is full, dropping newest item")
+                self._dropped(item)
+                return False
+
+            if self.overflow == OverflowPolicy.DROP_OLDEST:
+                if not self._drop_oldest(below=priority):
+                    logger.warning("[Dispatch] Queue is full, dropping newest item")
+                    self._dropped(item)
+                    return False
+                logger.warning("[Dispatch] Queue is full, dropped oldest item")
+                continue
+
+            self._not_full.clear()
+            await self._not_full.wait()
+
+        self.put_nowait(item, chat=chat, priority=priority)
+        return True
+
+    def put_nowait(self, item: Any, chat: Hashable = None, priority: int = 0):
+        if self.full():
+            raise asyncio.QueueFull
+
+        entry = (next(self._counter), item)
+        held_back = self._busy.get(chat) if self.ordered else None
+        if held_back is not None:
+            held_back.setdefault(priority, deque()).append(entry)
+        else:
+            lanes = self._levels.setdefault(priority, OrderedDict())
+            lanes.setdefault(chat, deque()).append(entry)
+            self._ready += 1
+            self._not_empty.set()
+
+        self._size += 1
+        self._unfinished += 1
+        self._finished.clear()
+
+    async def get(self) -> Any:
+        while self._ready == 0:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        return self.get_nowait()
+
+    def get_nowait(self) -> Any:
+        if self._ready == 0:
+            raise asyncio.QueueEmpty
+
+        priority = max(p for p, lanes in self._levels.items() if lanes)
+        lanes = self._levels[priority]
+        chat, lane = next(iter(lanes.items()))
+        _, item = lane.popleft()
+        self._ready -= 1
+
+        # round-robin: the chat goes to the back of the line
+        if lane:
+            lanes.move_to_end(chat)
+        else:
+            del lanes[chat]  # idle lanes are dropped right away
+
+        if self.ordered:
+            self._hold_back(chat)
+
+        self._size -= 1
+        self._not_full.set()
+        return item
+
+    def task_done(self, chat: Hashable = None):
+        """Mark an item as done. In ordered mode, chat must be its chat"""
+        if self._unfinished <= 0:
+            raise ValueError("task_done() called too many times")
+        self._unfinished -= 1
+        if self._unfinished == 0:
+            self._finished.set()
+        if self.ordered:
+            self._release(chat)
+
+    async def join(self):
+        await self._finished.wait()
+
+    def _hold_back(self, chat: Hashable):
+        held_back = self._busy[chat] = {}
+        for priority, lanes in self._levels.items():
+            lane = lanes.pop(chat, None)
+            if lane is not None:
+                held_back[priority] = lane
+                self._ready -= len(lane)
+
+    def _release(self, chat: Hashable):
+        # lanes of idle chats are dropped, so memory stays bounded
+        held_back = self._busy.pop(chat, None)
+        if not held_back:
+            return
+        for priority, lane in held_back.items():
+            self._levels.setdefault(priority, OrderedDict())[chat] = lane
+            self._ready += len(lane)
+        self._not_empty.set()
+
+    def _drop_oldest(self, below: int) -> bool:
+        """Drop the oldest item with a priority of at most below
+
+        Items held back for busy chats are not considered.
+        """
+        candidates = [p for p, lanes in self._levels.items() if lanes and p <= below]
+        if not candidates:
+            return False
+
+        lanes = self._levels[min(candidates)]
+        chat, lane = min(lanes.items(), key=lambda lane_item: lane_item[1][0][0])
+        _, item = lane.popleft()
+        if not lane:
+            del lanes[chat]
+
+        self._ready -= 1
+        self._size -= 1
+        self._unfinished -= 1
+        if self._unfinished == 0:
+            self._finished.set()
+        self._dropped(item)
+        return True
+
+    def _dropped(self, item: Any):
+        if self.on_drop is not None:
+            self.on_drop(item)
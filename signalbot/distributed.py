@@ -0,0 +1,177 @@
+import json
+import logging
+import os
+import socket
+import time
+
+import redis.asyncio
+
+from .message import Envelope, Message, UnknownMessageFormatError
+from .metrics import MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+
+class StreamQueue:
+    """Work queue on a Redis stream, shared by several bot processes
+
+    Receivers publish messages with .publish(). Workers read them in a
+    consumer group, so every message is handed to one worker only, and
+    acknowledge them with .ack() once handled. Messages that a worker read but
+    did not acknowledge within claim_idle seconds, e.g. because it crashed,
+    are delivered again to another worker (at-least-once delivery).
+    """
+
+    def __init__(
+        self,
+        client: redis.asyncio.Redis,
+        stream: str = "signalbot:messages",
+        group: str = "signalbot",
+        consumer: str | None = None,
+        max_len: int | None = 100_000,
+        claim_idle: float = 60,
+        block: float = 1,
+        metrics: MetricsRegistry | None = None,
+    ):
+        self.client = client
+        self.stream = stream
+        self.group = group
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.max_len = max_len  # trimmed approximately, see XADD MAXLEN ~
+        self.claim_idle = claim_idle
+        self.block = block
+        self._claim_start = "0-0"
+        self._next_claim = 0  # time.monotonic() of the next XAUTOCLAIM
+
+        self._latency = None
+        if metrics is not None:
+            self._latency = metrics.histogram(
+                "signalbot_stream_request_seconds",
+                "Duration of Redis stream calls, per operation",
+                labelnames=("operation",),
+            )
+
+    @classmethod
+    def from_config(cls, host: str, port: int, **kwargs) -> "StreamQueue":
+        return cls(redis.asyncio.Redis(host=host, port=port), **kwargs)
+
+    async def setup(self):
+        """Create the consumer group (and the stream) if they don't exist yet"""
+        try:
+            await self.client.xgroup_create(
+                self.stream, self.group, id="0", mkstream=True
+            )
+        except redis.exceptions.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise DistributedQueueError(f"Cannot create consumer group: {e}")
+
+    async def publish(self, message: Message) -> str:
+        fields = {"message": json.dumps(message.raw_message)}
+        if message.account is not None:
+            fields["account"] = message.account
+        start = time.perf_counter()
+        try:
+            entry_id = await self.client.xadd(
+                self.stream, fields, maxlen=self.max_len, approximate=True
+            )
+        except redis.exceptions.RedisError as e:
+            raise DistributedQueueError(f"Cannot publish message: {e}")
+        finally:
+            self._observe("publish", start)
+        return self._decode(entry_id)
+
+    async def read(self, count: int = 10) -> list[tuple[str, Message | None]]:
+        """Next messages for this worker, redelivered ones first
+
+        Entries that cannot be parsed are returned with None as message, so
+        that they can be acknowledged and don't come back.
+        """
+        start = time.perf_counter()
+        try:
+            entries = await self._claim(count)
+            if not entries:
+                response = await self.client.xreadgroup(
+                    self.group,
+                    self.consumer,
+                    {self.stream: ">"},
+                    count=count,
+                    block=int(self.block * 1000),
+                )
+                for _, stream_entries in response or []:
+                    entries.extend(stream_entries)
+        except redis.exceptions.RedisError as e:
+            raise DistributedQueueError(f"Cannot read messages: {e}")
+        finally:
+            self._observe("read", start)  # includes blocking for new entries
+
+        return [
+            (self._decode(entry_id), self._parse(fields))
+            for entry_id, fields in entries
+        ]
+
+    async def ack(self, *entry_ids: str):
+        if not entry_ids:
+            return
+        start = time.perf_counter()
+        try:
+            await self.client.xack(self.stream, self.group, *entry_ids)
+        except redis.exceptions.RedisError as e:
+            raise DistributedQueueError(f"Cannot acknowledge messages: {e}")
+        finally:
+            self._observe("ack", start)
+
+    async def close(self):
+        # redis-py < 5 only knows close()
+        close = getattr(self.client, "aclose", None) or self.client.close
+        await close()
+
+    def _observe(self, operation: str, start: float):
+        if self._latency is not None:
+            self._latency.labels(operation=operation).observe(
+                time.perf_counter() - start
+            )
+
+    async def _claim(self, count: int) -> list:
+        # no need to look for stale entries more often than they can go stale
+        if time.monotonic() < self._next_claim:
+            return []
+
+        # XAUTOCLAIM walks through the pending entries in several calls
+        response = await self.client.xautoclaim(
+            self.stream,
+            self.group,
+            self.consumer,
+            min_idle_time=int(self.claim_idle * 1000),
+            start_id=self._claim_start,
+            count=count,
+        )
+        next_start, entries = response[0], response[1]
+        self._claim_start = self._decode(next_start)
+        if self._claim_start == "0-0":  # all pending entries were checked
+            self._next_claim = time.monotonic() + self.claim_idle / 2
+        # entries deleted from the stream meanwhile come back without fields
+        entries = [(entry_id, fields) for entry_id, fields in entries if fields]
+        if entries:
+            logger.info("[Distributed] Claimed %s unacknowledged", len(entries))
+        return entries
+
+    @staticmethod
+    def _parse(fields: dict) -> Message | None:
+        fields = {
+            StreamQueue._decode(k): StreamQueue._decode(v) for k, v in fields.items()
+        }
+        try:
+            envelope = Envelope.parse(json.loads(fields["message"]))
+        except (KeyError, ValueError, UnknownMessageFormatError):
+            logger.warning("[Distributed] Dropping a message in an unknown format")
+            return None
+        envelope.account = fields.get("account")
+        return Message.from_envelope(envelope)
+
+    @staticmethod
+    def _decode(value) -> str:
+        return value.decode() if isinstance(value, bytes) else value
+
+
+class DistributedQueueError(Exception):
+    pass
@@ -0,0 +1,80 @@
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable
+
+from .message import Message
+
+THREAD = "thread"
+PROCESS = "process"
+
+
+def _run_command(command, message: Message) -> Any:
+    # module level, so that it can be pickled for the process pool
+    return command.run(message)
+
+
+class CommandExecutors:
+    """Thread and process pools for blocking and CPU-bound command work
+
+    The pools are created on first use. At most max_pending calls per pool are
+    submitted at once, further calls wait in the event loop, so that a burst
+    of messages does not pile up unbounded work inside the pool.
+    """
+
+    def __init__(
+        self,
+        threads: int | None = None,
+        processes: int | None = None,
+        max_pending: int = 100,
+        start_method: str | None = None,
+    ):
+        self.threads = threads
+        self.processes = processes
+        self.start_method = start_method  # see multiprocessing.get_context
+        self._pools = {}
+        self._pending = {
+            THREAD: asyncio.Semaphore(max_pending),
+            PROCESS: asyncio.Semaphore(max_pending),
+        }
+
+    async def run(self, command, message: Message) -> Any:
+        """Call command.run(message) in the pool given by command.executor
+
+        For the process pool, the command (without its bot, see
+        Command.__getstate__) and the message are pickled.
+        """
+        return await self.submit(command.executor, _run_command, command, message)
+
+    async def submit(self, kind: str, func: Callable, *args, **kwargs) -> Any:
+        pool = self._pool(kind)
+        call = functools.partial(func, *args, **kwargs)
+        async with self._pending[kind]:
+            return await asyncio.get_running_loop().run_in_executor(pool, call)
+
+    def shutdown(self, wait: bool = True):
+        """Stop the pools, wait=True blocks until running calls returned"""
+        for pool in self._pools.values():
+            pool.shutdown(wait=wait, cancel_futures=True)
+        self._pools = {}
+
+    def _pool(self, kind: str) -> Executor:
+        if kind not in (THREAD, PROCESS):
+            raise ValueError(f"Unknown executor {kind}, use 'thread' or 'process'")
+
+        pool = self._pools.get(kind)
+        if pool is None:
+            if kind == THREAD:
+                pool = ThreadPoolExecutor(
+                    max_workers=self.threads, thread_name_prefix="signalbot"
+                )
+            else:
+                context = None
+                if self.start_method is not None:
+                    context = multiprocessing.get_context(self.start_method)
+                pool = ProcessPoolExecutor(
+                    max_workers=self.processes, mp_context=context
+                )
+            self._pools[kind] = pool
+        return pool
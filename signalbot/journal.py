@@ -0,0 +1,233 @@
+import json
+import logging
+import os
+import struct
+import zlib
+
+from .message import Envelope, Message, UnknownMessageFormatError
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+
+    _dumps = orjson.dumps
+except ImportError:
+
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+
+# payload length, CRC32 of everything after the CRC, record kind, sequence number
+_HEADER = struct.Struct("<IIBQ")
+_CHECKED = struct.Struct("<BQ")  # the part of the header the CRC covers
+_ACCOUNT = struct.Struct("<H")  # length of the account, then account + JSON
+_MESSAGE = 1
+_DONE = 2
+_SUFFIX = ".seg"
+
+
+class MessageJournal:
+    """Append-only log of received messages that survives a crash of the bot
+
+    Every message is appended before it is queued and marked as done once all
+    its commands handled it. .open() returns the messages that were not done
+    yet, e.g. because the process died, so that they can be handled again.
+
+    The log is split into segment files of about segment_size bytes. The
+    oldest segments are deleted once all their messages are done (segments
+    are only deleted oldest first, as later ones may mark their messages as
+    done). When a new segment is started, old segments with only a few
+    messages left are compacted by copying those messages into the new one.
+
+    Records are written to the OS on every append, which is enough to survive
+    a crash of the process. With fsync=True they are also forced to disk,
+    which survives a crash of the machine but is a lot slower.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        segment_size: int = 64 * 1024 * 1024,
+        fsync: bool = False,
+        compact_ratio: float = 0.25,
+    ):
+        self.path = path
+        self.segment_size = segment_size
+        self.fsync = fsync
+        self.compact_ratio = compact_ratio  # pending/appended that is copied
+
+        self._file = None  # active segment
+        self._active = None  # name of the active segment
+        self._segments = {}  # name -> [messages appended, messages pending]
+        self._segment_of = {}  # sequence number of a pending message -> name
+        self._sequence = 0
+        self._next_segment = 0
+
+    def open(self) -> list[tuple[int, Message]]:
+        """Open the journal and return the messages that are not done yet"""
+        os.makedirs(self.path, exist_ok=True)
+        messages = {}  # sequence number -> (name, payload)
+        done = set()
+        for name in self._segment_names():
+            self._next_segment = int(name[: -len(_SUFFIX)]) + 1
+            appended = 0
+            for kind, sequence, payload in self._read(name):
+                self._sequence = max(self._sequence, sequence + 1)
+                if kind == _MESSAGE:
+                    messages[sequence] = (name, payload)
+                    appended += 1
+                else:
+                    done.add(sequence)
+            self._segments[name] = [appended, 0]
+
+        pending = []
+        for sequence in sorted(messages.keys() - done):
+            name, payload = messages[sequence]
+            message = self._decode(payload)
+            if message is None:
+                continue
+            self._segment_of[sequence] = name
+            self._segments[name][1] += 1
+            pending.append((sequence, message))
+
+        self._rotate()
+        if pending:
+            logger.info("[Journal] Replaying %s unfinished messages", len(pending))
+        return pending
+
+    def append(self, message: Message) -> int:
+        """Write a message to the journal, returns its sequence number"""
+        sequence = self._sequence
+        self._sequence += 1
+        self._write_message(sequence, self._encode(message))
+        return sequence
+
+    def done(self, sequence: int):
+        """Mark the message as handled, it will not be replayed"""
+        name = self._segment_of.pop(sequence, None)
+        if name is None:
+            return
+        self._write(_DONE, sequence, b"")
+        self._segments[name][1] -= 1
+        if self._segments[name][1] == 0:
+            self._delete_done()
+
+    def pending(self) -> int:
+        return len(self._segment_of)
+
+    def close(self):
+        if self._file is None:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+
+    def _write_message(self, sequence: int, payload: bytes, rotate: bool = True):
+        if rotate and self._file.tell() >= self.segment_size:
+            self._rotate()
+        self._write(_MESSAGE, sequence, payload)
+        self._segment_of[sequence] = self._active
+        segment = self._segments[self._active]
+        segment[0] += 1
+        segment[1] += 1
+
+    def _write(self, kind: int, sequence: int, payload: bytes):
+        crc = _crc(kind, sequence, payload)
+        self._file.write(_HEADER.pack(len(payload), crc, kind, sequence) + payload)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def _rotate(self):
+        self.close()
+        self._active = f"{self._next_segment:010d}{_SUFFIX}"
+        self._next_segment += 1
+        self._segments[self._active] = [0, 0]
+        self._file = open(os.path.join(self.path, self._active), "ab")
+        if self.fsync:
+            _fsync_directory(self.path)
+        self._compact()
+
+    def _compact(self):
+        for name, (appended, pending) in list(self._segments.items()):
+            if name == self._active:
+                return
+            if pending > appended * self.compact_ratio:
+                return
+            if pending > 0:
+                self._copy_pending(name)
+            self._delete(name)
+
+    def _delete_done(self):
+        for name, (_, pending) in list(self._segments.items()):
+            if name == self._active or pending > 0:
+                return
+            self._delete(name)
+
+    def _copy_pending(self, name: str):
+        # the copies keep their sequence numbers, so a crash in between only
+        # leaves duplicates in the old segment that .open() ignores
+        for kind, sequence, payload in self._read(name):
+            if kind == _MESSAGE and self._segment_of.get(sequence) == name:
+                self._write_message(sequence, payload, rotate=False)
+        logger.info("[Journal] Compacted segment %s", name)
+
+    def _delete(self, name: str):
+        os.remove(os.path.join(self.path, name))
+        del self._segments[name]
+
+    def _segment_names(self) -> list[str]:
+        return sorted(n for n in os.listdir(self.path) if n.endswith(_SUFFIX))
+
+    def _read(self, name: str):
+        with open(os.path.join(self.path, name), "rb") as f:
+            data = f.read()
+        offset = 0
+        while offset + _HEADER.size <= len(data):
+            length, crc, kind, sequence = _HEADER.unpack_from(data, offset)
+            start = offset + _HEADER.size
+            payload = data[start : start + length]
+            if len(payload) < length or _crc(kind, sequence, payload) != crc:
+                # the process died while writing this record
+                logger.warning("[Journal] Ignoring a torn record in %s", name)
+                return
+            yield kind, sequence, payload
+            offset = start + length
+
+    @staticmethod
+    def _encode(message: Message) -> bytes:
+        account = (message.account or "").encode()
+        return _ACCOUNT.pack(len(account)) + account + _dumps(message.raw_message)
+
+    @staticmethod
+    def _decode(payload: bytes) -> Message | None:
+        (length,) = _ACCOUNT.unpack_from(payload)
+        start = _ACCOUNT.size
+        account = payload[start : start + length].decode() or None
+        try:
+            envelope = Envelope.parse(payload[start + length :])
+        except UnknownMessageFormatError:
+            logger.warning("[Journal] Dropping a message in an unknown format")
+            return None
+        envelope.account = account
+        return Message.from_envelope(envelope)
+
+
+def _crc(kind: int, sequence: int, payload: bytes) -> int:
+    return zlib.crc32(payload, zlib.crc32(_CHECKED.pack(kind, sequence)))
+
+
+def _fsync_directory(path: str):
+    # makes a new segment file itself durable, not supported on Windows
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
@@ -0,0 +1,86 @@
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+# loggers are named after their modules, e.g. signalbot.receiver
+ROOT = "signalbot"
+
+_sample_every = 1
+_listener = None
+
+
+class Sampler:
+    """Lets the first and then every n-th call through
+
+    For events that happen once per message, which would flood the log at
+    production volume:
+
+        if logger.isEnabledFor(logging.DEBUG) and self._sample():
+            logger.debug("...", ...)
+
+    Without every, the sample_every value given to configure() is used.
+    """
+
+    def __init__(self, every: int | None = None):
+        self.every = every
+        self._count = 0
+
+    def __call__(self) -> bool:
+        every = self.every or _sample_every
+        passed = self._count % every == 0
+        self._count += 1
+        return passed
+
+
+def configure(
+    level: int | str | None = None,
+    levels: dict[str, int | str] | None = None,
+    use_queue: bool = False,
+    sample_every: int | None = None,
+):
+    """Configure the signalbot loggers
+
+    level applies to all of them, levels to single modules, e.g.
+    {"receiver": "DEBUG", "api": "WARNING"}. With use_queue, records are
+    handed to the handlers of the root logger in a background thread, so
+    slow handlers (files, network) don't block the event loop.
+    """
+    global _sample_every
+
+    logger = logging.getLogger(ROOT)
+    if level is not None:
+        logger.setLevel(level)
+    for name, module_level in (levels or {}).items():
+        logging.getLogger(f"{ROOT}.{name}").setLevel(module_level)
+    if sample_every is not None:
+        if sample_every < 1:
+            raise ValueError("sample_every must be at least 1")
+        _sample_every = sample_every
+    if use_queue:
+        _start_queue(logger)
+
+
+def stop():
+    """Write out queued records and log in the calling thread again"""
+    global _listener
+    if _listener is None:
+        return
+    logger = logging.getLogger(ROOT)
+    for handler in list(logger.handlers):
+        if isinstance(handler, QueueHandler):
+            logger.removeHandler(handler)
+    logger.propagate = True
+    _listener.stop()
+    _listener = None
+
+
+def _start_queue(logger: logging.Logger):
+    global _listener
+    stop()  # configured before
+
+    handlers = logging.getLogger().handlers or [logging.StreamHandler()]
+    records = queue.SimpleQueue()
+    _listener = QueueListener(records, *handlers, respect_handler_level=True)
+    logger.addHandler(QueueHandler(records))
+    logger.propagate = False  # the listener passes records to the root handlers
+    _listener.start()
@@ -3,13 +3,112 @@ from enum import Enum
 
 from .attachment import ReceiveAttachment
 
+# Use the fastest JSON decoder that is installed
+try:
+    import orjson
+
+    _loads = orjson.loads
+except ImportError:
+    try:
+        import msgspec
+
+        _loads = msgspec.json.decode
+    except ImportError:
+        _loads = json.loads
+
 
 class MessageType(Enum):
     SYNC_MESSAGE = 1
     DATA_MESSAGE = 2
 
 
+class Envelope:
+    """Routing information of a raw message
+
+    Decoding an envelope only extracts what is needed to decide whether the
+    bot is interested in a message at all (source, timestamp, group and type).
+    Use Message.from_envelope() to turn it into a full Message afterwards.
+    """
+
+    __slots__ = (
+        "source",
+        "timestamp",
+        "type",
+        "group",
+        "content",
+        "raw_message",
+        "account",
+    )
+
+    def __init__(
+        self,
+        source: str,
+        timestamp: int,
+        type: MessageType,
+        group: str,
+        content: dict,
+        raw_message: dict,
+        account: str = None,
+    ):
+        self.source = source
+        self.timestamp = timestamp
+        self.type = type
+        self.group = group
+        self.content = content  # sentMessage or dataMessage
+        self.raw_message = raw_message
+        self.account = account  # phone number of the bot that received it
+
+    @classmethod
+    def parse(cls, raw_message: str | bytes | dict):
+        if not isinstance(raw_message, dict):
+            try:
+                raw_message = _loads(raw_message)
+            except Exception:
+                raise UnknownMessageFormatError
+
+        try:
+            envelope = raw_message["envelope"]
+            source = envelope["source"]
+            timestamp = envelope["timestamp"]
+        except Exception:
+            raise UnknownMessageFormatError
+
+        # Option 1: syncMessage
+        if "syncMessage" in envelope:
+            type = MessageType.SYNC_MESSAGE
+            try:
+                content = envelope["syncMessage"]["sentMessage"]
+            except Exception:
+                raise UnknownMessageFormatError
+
+        # Option 2: dataMessage
+        elif "dataMessage" in envelope:
+            type = MessageType.DATA_MESSAGE
+            content = envelope["dataMessage"]
+
+        else:
+            raise UnknownMessageFormatError
+
+        group = Message._parse_group_information(content)
+        account = raw_message.get("account")
+        return cls(source, timestamp, type, group, content, raw_message, account)
+
+
 class Message:
+    __slots__ = (
+        "source",
+        "timestamp",
+        "type",
+        "text",
+        "group",
+        "reaction",
+        "raw_message",
+        "account",
+        "_content",
+        "_mentions",
+        "_attachments",
+    )
+
     def __init__(
         self,
         source: str,
@@ -21,6 +120,7 @@ class Message:
         reaction: str = None,
         mentions: list = None,
         raw_message: str = None,
+        account: str = None,
     ):
         # required
         self.source = source
@@ -29,20 +129,40 @@ class Message:
         self.text = text
 
         # optional
-        self.base64_attachments = base64_attachments
-        if self.base64_attachments is None:
-            self.base64_attachments = []
-
         self.group = group
 
         self.reaction = reaction
 
-        self.mentions = mentions
-        if self.mentions is None:
-            self.mentions = []
-
         self.raw_message = raw_message
 
+        # phone number of the bot account that received the message
+        self.account = account
+
+        # mentions and attachments of parsed messages are built on first access
+        self._content = None
+        self._mentions = mentions
+        self._attachments = base64_attachments
+
+    @property
+    def mentions(self) -> list:
+        if self._mentions is None:
+            self._mentions = self._parse_mentions(self._content)
+        return self._mentions
+
+    @mentions.setter
+    def mentions(self, mentions: list):
+        self._mentions = mentions
+
+    @property
+    def base64_attachments(self) -> list:
+        if self._attachments is None:
+            self._attachments = self._parse_attachments(self._content)
+        return self._attachments
+
+    @base64_attachments.setter
+    def base64_attachments(self, base64_attachments: list):
+        self._attachments = base64_attachments
+
     def recipient(self) -> str:
         # Case 1: Group chat
         if self.group:
@@ -52,67 +172,24 @@ class Message:
         return self.source
 
     @classmethod
-    def parse(cls, raw_message: str):
-        try:
-            raw_message = json.loads(raw_message)
-        except Exception:
-            raise UnknownMessageFormatError
-
-        # General attributes
-        try:
-            source = raw_message["envelope"]["source"]
-            timestamp = raw_message["envelope"]["timestamp"]
-        except Exception:
-            raise UnknownMessageFormatError
-
-        # Option 1: syncMessage
-        if "syncMessage" in raw_message["envelope"]:
-            type = MessageType.SYNC_MESSAGE
-            text = cls._parse_sync_message(raw_message["envelope"]["syncMessage"])
-            group = cls._parse_group_information(
-                raw_message["envelope"]["syncMessage"]["sentMessage"]
-            )
-            reaction = cls._parse_reaction(
-                raw_message["envelope"]["syncMessage"]["sentMessage"]
-            )
-            mentions = cls._parse_mentions(
-                raw_message["envelope"]["syncMessage"]["sentMessage"]
-            )
-            base64_attachments = cls._parse_attachments(
-                raw_message["envelope"]["syncMessage"]["sentMessage"]
-            )
-
-        # Option 2: dataMessage
-        elif "dataMessage" in raw_message["envelope"]:
-            type = MessageType.DATA_MESSAGE
-            text = cls._parse_data_message(raw_message["envelope"]["dataMessage"])
-            group = cls._parse_group_information(raw_message["envelope"]["dataMessage"])
-            reaction = cls._parse_reaction(raw_message["envelope"]["dataMessage"])
-            mentions = cls._parse_mentions(raw_message["envelope"]["dataMessage"])
-            base64_attachments = cls._parse_attachments(raw_message["envelope"]["dataMessage"])
-
-        else:
-            raise UnknownMessageFormatError
-
-        return cls(
-            source,
-            timestamp,
-            type,
-            text,
-            base64_attachments,
-            group,
-            reaction,
-            mentions,
-            raw_message,
-        )
+    def parse(cls, raw_message: str | bytes | dict):
+        return cls.from_envelope(Envelope.parse(raw_message))
 
     @classmethod
-    def _parse_sync_message(cls, sync_message: dict) -> str:
-        try:
-            text = sync_message["sentMessage"]["message"]
-            return text
-        except Exception:
-            raise UnknownMessageFormatError
+    def from_envelope(cls, envelope: Envelope):
+        content = envelope.content
+        message = cls(
+            envelope.source,
+            envelope.timestamp,
+            envelope.type,
+            cls._parse_data_message(content),
+            group=envelope.group,
+            reaction=cls._parse_reaction(content),
+            raw_message=envelope.raw_message,
+            account=envelope.account,
+        )
+        message._content = content
+        return message
 
     @classmethod
     def _parse_data_message(cls, data_message: dict) -> str:
@@ -0,0 +1,323 @@
+import logging
+import math
+from typing import Callable
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+
+class _Metric:
+    """Base of all metrics, optionally split into children by label values
+
+    A metric with labelnames is a family: its samples are recorded on the
+    children returned by .labels(), e.g.
+    requests.labels(operation="send", status="200").inc()
+    """
+
+    type = "untyped"
+
+    def __init__(self, name: str, description: str = "", labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._children = {}  # tuple of label values -> child metric
+
+    def labels(self, **labels):
+        key = tuple(str(labels.get(name)) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            if set(labels) != set(self.labelnames):
+                raise MetricsError(f"Metric {self.name} has labels {self.labelnames}")
+            child = self._children[key] = self._child()
+        return child
+
+    @property
+    def value(self):
+        return {key: child._value() for key, child in self._children.items()}
+
+    def samples(self):
+        """(suffix, labels, value) of every sample, see MetricsRegistry.render"""
+        if not self.labelnames:
+            yield from self._samples({})
+            return
+        for key, child in self._children.items():
+            yield from child._samples(dict(zip(self.labelnames, key)))
+
+    def _child(self):
+        raise NotImplementedError
+
+    def _value(self):
+        raise NotImplementedError
+
+    def _samples(self, labels: dict):
+        yield "", labels, self._value()
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, description: str = "", labelnames=()):
+        super().__init__(name, description, labelnames)
+        self._count = 0
+
+    @property
+    def value(self) -> float:
+        return super().value if self.labelnames else self._count
+
+    def inc(self, amount: float = 1):
+        self._count += amount
+
+    def _child(self):
+        return Counter(self.name, self.description)
+
+    def _value(self):
+        return self._count
+
+
+class Gauge(_Metric):
+    """Gauge that is either set explicitly or reads its value from a function"""
+
+    type = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        description: str = "",
+        function: Callable[[], float] | None = None,
+        labelnames=(),
+    ):
+        super().__init__(name, description, labelnames)
+        self.function = function
+        self._current = 0
+
+    @property
+    def value(self) -> float:
+        return super().value if self.labelnames else self._value()
+
+    def set(self, value: float):
+        self._current = value
+
+    def inc(self, amount: float = 1):
+        self._current += amount
+
+    def dec(self, amount: float = 1):
+        self._current -= amount
+
+    def _child(self):
+        return Gauge(self.name, self.description)
+
+    def _value(self):
+        if self.function is not None:
+            return self.function()
+        return self._current
+
+
+class Histogram(_Metric):
+    """Histogram with fixed bucket upper bounds (in seconds by default)"""
+
+    type = "histogram"
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(
+        self,
+        name: str,
+        description: str = "",
+        buckets=DEFAULT_BUCKETS,
+        labelnames=(),
+    ):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * len(self.buckets)  # not cumulative, see .cumulative()
+        self.sum = 0
+        self.count = 0
+
+    @property
+    def value(self) -> dict:
+        return super().value if self.labelnames else self._value()
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self) -> list[tuple[float, int]]:
+        result = []
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def _child(self):
+        return Histogram(self.name, self.description, self.buckets)
+
+    def _value(self):
+        return {"count": self.count, "sum": self.sum}
+
+    def _samples(self, labels: dict):
+        for bound, count in self.cumulative():
+            yield "_bucket", {**labels, "le": _format_value(bound)}, count
+        yield "_bucket", {**labels, "le": "+Inf"}, self.count
+        yield "_sum", labels, self.sum
+        yield "_count", labels, self.count
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+
+    def counter(self, name: str, description: str = "", labelnames=()) -> Counter:
+        return self._register(Counter(name, description, labelnames))
+
+    def gauge(
+        self,
+        name: str,
+        description: str = "",
+        function: Callable[[], float] | None = None,
+        labelnames=(),
+    ) -> Gauge:
+        return self._register(Gauge(name, description, function, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        description: str = "",
+        buckets=Histogram.DEFAULT_BUCKETS,
+        labelnames=(),
+    ) -> Histogram:
+        return self._register(Histogram(name, description, buckets, labelnames))
+
+    def get(self, name: str):
+        return self._metrics[name]
+
+    def snapshot(self) -> dict:
+        return {name: metric.value for name, metric in self._metrics.items()}
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics.values():
+            if metric.description:
+                lines.append(f"# HELP {metric.name} {_escape(metric.description)}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for suffix, labels, value in metric.samples():
+                lines.append(
+                    f"{metric.name}{suffix}{_format_labels(labels)} "
+                    f"{_format_value(value)}"
+                )
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            existing = self._metrics[metric.name]
+            if type(existing) is not type(metric):
+                raise MetricsError(f"Metric {metric.name} exists with another type")
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+
+class _NullMetric:
+    """Accepts every update and records nothing"""
+
+    value = 0
+    sum = 0
+    count = 0
+
+    def labels(self, **labels):
+        return self
+
+    def inc(self, amount: float = 1):
+        pass
+
+    def dec(self, amount: float = 1):
+        pass
+
+    def set(self, value: float):
+        pass
+
+    def observe(self, value: float):
+        pass
+
+
+class NullMetricsRegistry(MetricsRegistry):
+    """Registry for disabled metrics, all metrics it hands out are no-ops"""
+
+    _NULL = _NullMetric()
+
+    def _register(self, metric):
+        return self._NULL
+
+
+class MetricsServer:
+    """Serves the metrics of a registry on http://host:port/metrics"""
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(
+        self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9090
+    ):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        try:
+            site = web.TCPSite(self._runner, self.host, self.port)
+            await site.start()
+        except OSError as e:
+            await self.stop()
+            raise MetricsError(f"Cannot serve metrics on {self.host}:{self.port}: {e}")
+        logger.info(
+            "[Bot] Serving metrics on http://%s:%s/metrics", self.host, self.port
+        )
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        return web.Response(
+            body=self.registry.render().encode(),
+            headers={"Content-Type": self.CONTENT_TYPE},
+        )
+
+
+def _escape(text: str, quote: bool = False) -> str:
+    text = text.replace("\\", "\\\\").replace("\n", "\\n")
+    if quote:
+        text = text.replace('"', '\\"')
+    return text
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(str(value), quote=True)}"' for name, value in labels.items()
+    )
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class MetricsError(Exception):
+    pass
@@ -0,0 +1,266 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, TypeVar
+
+from .api import SendMessageError
+from .retry import RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# signal-cli-rest-api answers with these when Signal rate limits the account
+RATE_LIMIT_STATUSES = (413, 429)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate  # tokens per second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0
+
+    def delay(self, tokens: float = 1) -> float:
+        """Seconds until tokens are available
+
+        A cost above the capacity only waits for a full bucket, .consume() then
+        takes the whole cost and the deficit delays the following calls.
+        """
+        self._refill()
+        tokens = min(tokens, self.capacity)
+        delay = max(0, (tokens - self.tokens) / self.rate)
+        return max(delay, self.blocked_until - time.monotonic())
+
+    def consume(self, tokens: float = 1):
+        self._refill()
+        self.tokens -= tokens  # may go negative
+
+    def block(self, seconds: float):
+        """Hand out no tokens for the given time, e.g. after a rate limit error"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def is_full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity and self.blocked_until <= time.monotonic()
+
+    async def acquire(self, tokens: float = 1) -> float:
+        """Wait until tokens are available and take them. Returns the wait time"""
+        waited = 0
+        while True:
+            delay = self.delay(tokens)
+            if delay <= 0:
+                self.consume(tokens)
+                return waited
+            await asyncio.sleep(delay)
+            waited += delay
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class _PendingSend:
+    __slots__ = ("text", "send", "coalesce", "retry", "future", "queued_at")
+
+    def __init__(self, text: str, send, coalesce: bool, retry: bool):
+        self.text = text
+        self.send = send
+        self.coalesce = coalesce
+        self.retry = retry
+        self.future = asyncio.get_running_loop().create_future()
+        self.queued_at = time.monotonic()
+
+
+class SendScheduler:
+    """Throttles outgoing messages to stay within Signal's rate limits
+
+    Every send takes a token from a per-recipient and from a global token
+    bucket. Sends to the same recipient are serialized; while a recipient is
+    throttled, further text-only messages to it are coalesced into one message.
+    Rate limit responses block the global bucket and the send is retried with
+    exponential backoff (or after Retry-After, if the server sent it).
+    """
+
+    def __init__(
+        self,
+        rate: float = 1.0,
+        burst: float = 10,
+        recipient_rate: float = 0.5,
+        recipient_burst: float = 3,
+        coalesce: bool = True,
+        coalesce_separator: str = "\n",
+        max_retries: int = 5,
+        backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        metrics=None,
+    ):
+        self.recipient_rate = recipient_rate
+        self.recipient_burst = recipient_burst
+        self.coalesce = coalesce
+        self.coalesce_separator = coalesce_separator
+        self.retry_policy = RetryPolicy(
+            max_attempts=max_retries + 1,
+            backoff=backoff,
+            max_backoff=max_backoff,
+            retry_statuses=RATE_LIMIT_STATUSES,
+        )
+
+        self._global = TokenBucket(rate, burst)
+        self._buckets = {}  # recipient -> TokenBucket
+        self._queues = {}  # recipient -> list of _PendingSend, while one is active
+        self._drain_tasks = set()
+
+        self._wait_histogram = None
+        self._rate_limited = None
+        self._coalesced = None
+        if metrics is not None:
+            self._wait_histogram = metrics.histogram(
+                "signalbot_send_wait_seconds", "Time a send waited for the rate limit"
+            )
+            self._rate_limited = metrics.counter(
+                "signalbot_send_rate_limited", "Rate limit responses from the API"
+            )
+            self._coalesced = metrics.counter(
+                "signalbot_send_coalesced", "Messages merged into another message"
+            )
+
+    async def send(
+        self,
+        recipient: str,
+        text: str,
+        send: Callable[[str], Awaitable[T]],
+        coalesce: bool = True,
+        retry: bool = True,
+    ) -> T:
+        """Call send(text) once the rate limits allow it and return its result
+
+        If the message gets coalesced, send of the first message is called with
+        the merged text and all merged messages get the same result. With
+        retry=False, e.g. for a body that can be read only once, a rate limit
+        response is raised instead of sending again.
+        """
+        pending = _PendingSend(text, send, coalesce and self.coalesce, retry)
+        queue = self._queues.get(recipient)
+        if queue is None:
+            # sends to one recipient are drained by one task, in order
+            queue = self._queues[recipient] = [pending]
+            task = asyncio.create_task(self._drain(recipient))
+            self._drain_tasks.add(task)
+            task.add_done_callback(self._drain_tasks.discard)
+        else:
+            queue.append(pending)
+        return await pending.future
+
+    async def call(self, send: Callable[[], Awaitable[T]], cost: float = 1) -> T:
+        """Call send once cost global tokens are available, retry rate limits
+
+        A send with a cost above 1 goes to several recipients, some of which
+        may have got it before the rate limit response, so it is not retried.
+        """
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            await self._global.acquire(cost)
+            if attempt == 0:
+                self._observe_wait(time.monotonic() - started)
+            try:
+                return await send()
+            except SendMessageError as e:
+                if not self._retry_rate_limit(e, attempt) or cost > 1:
+                    raise
+            attempt += 1
+
+    async def _drain(self, recipient: str):
+        queue = self._queues[recipient]
+        bucket = self._buckets.get(recipient)
+        if bucket is None:
+            bucket = TokenBucket(self.recipient_rate, self.recipient_burst)
+            self._buckets[recipient] = bucket
+
+        try:
+            while queue:
+                waited = await bucket.acquire()
+                waited += await self._global.acquire()
+
+                # messages that piled up while the chat was throttled are merged
+                batch = [queue.pop(0)]
+                if batch[0].coalesce and waited > 0:
+                    while queue and queue[0].coalesce:
+                        batch.append(queue.pop(0))
+
+                # senders that gave up waiting don't need to be sent
+                batch = [pending for pending in batch if not pending.future.done()]
+                if batch:
+                    await self._send_batch(batch)
+        finally:
+            del self._queues[recipient]
+            self._set_exception(queue, SendMessageError("Send scheduler stopped"))
+            self._prune()
+
+    async def _send_batch(self, batch: list[_PendingSend]):
+        now = time.monotonic()
+        for pending in batch:
+            self._observe_wait(now - pending.queued_at)
+
+        text = batch[0].text
+        if len(batch) > 1:
+            text = self.coalesce_separator.join(p.text or "" for p in batch)
+            if self._coalesced is not None:
+                self._coalesced.inc(len(batch) - 1)
+
+        attempt = 0
+        while True:
+            try:
+                result = await batch[0].send(text)
+                break
+            except SendMessageError as e:
+                if not self._retry_rate_limit(e, attempt) or not batch[0].retry:
+                    self._set_exception(batch, e)
+                    return
+                await self._global.acquire()
+            except Exception as e:
+                self._set_exception(batch, e)
+                return
+            attempt += 1
+
+        for pending in batch:
+            if not pending.future.done():
+                pending.future.set_result(result)
+
+    def _retry_rate_limit(self, e: SendMessageError, attempt: int) -> bool:
+        """Block sending after a rate limit response. False if not retryable"""
+        policy = self.retry_policy
+        if e.status not in policy.retry_statuses or not policy.attempts_left(attempt):
+            return False
+
+        if self._rate_limited is not None:
+            self._rate_limited.inc()
+        delay = e.retry_after
+        if delay is None:
+            delay = policy.delay(attempt)
+        logger.warning("[Bot] Rate limited by the API, pausing for %.1fs", delay)
+        self._global.block(delay)
+        return True
+
+    def _observe_wait(self, seconds: float):
+        if self._wait_histogram is not None:
+            self._wait_histogram.observe(seconds)
+        if seconds >= 1:
+            logger.info("[Bot] Send was throttled for %.2f seconds", seconds)
+
+    def _prune(self):
+        # forget idle recipients, a full bucket behaves like a new one
+        if len(self._buckets) < 1024:
+            return
+        for recipient in list(self._buckets):
+            if recipient not in self._queues and self._buckets[recipient].is_full():
+                del self._buckets[recipient]
+
+    @staticmethod
+    def _set_exception(batch: list[_PendingSend], e: Exception):
+        for pending in batch:
+            if not pending.future.done():
+                pending.future.set_exception(e)
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Hashable
+
+from .api import SignalAPI, ReceiveMessagesError
+from .metrics import MetricsRegistry
+from .retry import RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+
+class SeenSet:
+    """Bounded set of recently seen keys, the oldest keys are forgotten first"""
+
+    def __init__(self, max_size: int = 4096):
+        self.max_size = max_size
+        self._keys = OrderedDict()
+
+    def add(self, key: Hashable) -> bool:
+        """Remember key. Returns False if it was seen before"""
+        if key in self._keys:
+            return False
+        self._keys[key] = None
+        if len(self._keys) > self.max_size:
+            self._keys.popitem(last=False)
+        return True
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+class WebSocketReceiver:
+    """Receives raw messages over the websocket and reconnects when it drops
+
+    The API is pinged to notice dead connections (see SignalAPI ping_interval).
+    A lost connection is reopened after a short delay of the retry policy; the
+    delay starts over once a connection was established again. The receiver
+    only stops when the policy runs out of attempts.
+    """
+
+    def __init__(
+        self,
+        api: SignalAPI,
+        policy: RetryPolicy,
+        metrics: MetricsRegistry | None = None,
+    ):
+        self.api = api
+        self.policy = policy
+        self._disconnected_at = None
+
+        self._connections = None
+        self._reconnects = None
+        self._gaps = None
+        if metrics is not None:
+            self._connections = metrics.gauge(
+                "signalbot_receive_connections", "Open websocket connections"
+            )
+            self._reconnects = metrics.counter(
+                "signalbot_receive_reconnects", "Websocket reconnects"
+            )
+            self._gaps = metrics.histogram(
+                "signalbot_receive_gap_seconds",
+                "Time without a websocket connection before a reconnect",
+                buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300),
+            )
+
+    async def receive(self) -> AsyncIterator[str]:
+        attempt = 0
+        while True:
+            connected = False
+            error = None
+
+            def on_connect():
+                nonlocal connected
+                connected = True
+                self._on_connect()
+
+            try:
+                async for raw_message in self.api.receive(on_connect=on_connect):
+                    yield raw_message
+                logger.warning("[Receiver] Websocket closed by the API")
+            except ReceiveMessagesError as e:
+                error = e
+                logger.warning("[Receiver] Websocket failed: %s", e)
+            finally:
+                if connected:
+                    self._on_disconnect()
+
+            if connected:
+                attempt = 0
+            if not self.policy.attempts_left(attempt):
+                if error is not None:
+                    raise error
+                return
+
+            delay = self.policy.delay(attempt)
+            attempt += 1
+            logger.info("[Receiver] Reconnecting in %.1f seconds", delay)
+            await asyncio.sleep(delay)
+
+    def _on_connect(self):
+        if self._connections is not None:
+            self._connections.inc()
+        if self._disconnected_at is None:
+            return
+
+        gap = time.monotonic() - self._disconnected_at
+        logger.info("[Receiver] Reconnected after %.2f seconds", gap)
+        if self._reconnects is not None:
+            self._reconnects.inc()
+            self._gaps.observe(gap)
+
+    def _on_disconnect(self):
+        self._disconnected_at = time.monotonic()
+        if self._connections is not None:
+            self._connections.dec()
+
+
+class PollingReceiver:
+    """Polls the REST receive endpoint, for signal-cli in normal or native mode
+
+    Batches of up to batch_size messages are fetched. After a full batch the
+    next one is fetched right away, otherwise the receiver waits interval
+    seconds. Failed polls are retried with the delays of the retry policy.
+    """
+
+    def __init__(
+        self,
+        api: SignalAPI,
+        policy: RetryPolicy,
+        metrics: MetricsRegistry | None = None,
+        interval: float = 1.0,
+        batch_size: int = 100,
+        timeout: float = 1,
+    ):
+        self.api = api
+        self.policy = policy
+        self.interval = interval
+        self.batch_size = batch_size
+        self.timeout = timeout
+
+        self._batch_sizes = None
+        if metrics is not None:
+            self._batch_sizes = metrics.histogram(
+                "signalbot_receive_batch_size",
+                "Messages per polled batch",
+                buckets=(0, 1, 5, 10, 25, 50, 100, 250, 500, 1000),
+            )
+
+    async def receive(self) -> AsyncIterator[dict]:
+        attempt = 0
+        while True:
+            try:
+                batch = await self.api.receive_batch(self.timeout, self.batch_size)
+            except ReceiveMessagesError as e:
+                if not self.policy.attempts_left(attempt):
+                    raise
+                delay = self.policy.delay(attempt)
+                attempt += 1
+                logger.warning(
+                    "[Receiver] Polling failed (%s), retry in %.1fs", e, delay
+                )
+                await asyncio.sleep(delay)
+                continue
+
+            attempt = 0
+            if self._batch_sizes is not None:
+                self._batch_sizes.observe(len(batch))
+            for raw_message in batch:
+                yield raw_message
+
+            if len(batch) < self.batch_size:
+                await asyncio.sleep(self.interval)
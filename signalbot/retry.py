@@ -0,0 +1,132 @@
+import asyncio
+import random
+import time
+
+import aiohttp
+
+
+class RetryPolicy:
+    """When and how often to retry a failed operation
+
+    Delays grow exponentially from backoff up to max_backoff. With jitter, a
+    random delay between half and the full value is used so that clients do
+    not retry in lockstep. max_attempts=None retries forever.
+
+    Errors before the request reached the server (connection refused, DNS)
+    are always retryable. HTTP responses are retryable if their status is in
+    retry_statuses. Other errors, e.g. a timeout after the request was sent,
+    are only retried for idempotent operations, as the request might have
+    been processed already.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int | None = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 10.0,
+        jitter: bool = True,
+        retry_statuses: tuple[int, ...] = (502, 503, 504),
+        idempotent: bool = True,
+    ):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_statuses = tuple(retry_statuses)
+        self.idempotent = idempotent
+
+    def replace(self, **changes) -> "RetryPolicy":
+        options = {
+            "max_attempts": self.max_attempts,
+            "backoff": self.backoff,
+            "max_backoff": self.max_backoff,
+            "jitter": self.jitter,
+            "retry_statuses": self.retry_statuses,
+            "idempotent": self.idempotent,
+        }
+        options.update(changes)
+        return RetryPolicy(**options)
+
+    def delay(self, attempt: int) -> float:
+        """Seconds to wait after the given failed attempt (starting at 0)"""
+        delay = min(self.max_backoff, self.backoff * 2**attempt)
+        if self.jitter:
+            delay *= random.uniform(0.5, 1)
+        return delay
+
+    def attempts_left(self, attempt: int) -> bool:
+        return self.max_attempts is None or attempt + 1 < self.max_attempts
+
+    def should_retry(self, error: Exception, attempt: int) -> bool:
+        if not self.attempts_left(attempt):
+            return False
+        if isinstance(error, aiohttp.ClientResponseError):
+            return error.status in self.retry_statuses
+        if isinstance(error, aiohttp.ClientConnectorError):
+            return True  # the request never left this machine
+        return self.idempotent
+
+
+class CircuitBreaker:
+    """Fail fast while a service is down
+
+    After failure_threshold consecutive failures the circuit opens and calls
+    are rejected right away. After reset_timeout seconds, a single trial call
+    is let through (half-open); its result closes or reopens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CircuitBreaker.CLOSED
+        self.failures = 0
+        self._opened_at = 0
+        self._trial_running = False
+
+    def allow(self) -> bool:
+        if self.state == CircuitBreaker.CLOSED:
+            return True
+        if self.state == CircuitBreaker.OPEN:
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self.state = CircuitBreaker.HALF_OPEN
+            self._trial_running = False
+        if self._trial_running:
+            return False
+        self._trial_running = True
+        return True
+
+    def record_success(self):
+        self.state = CircuitBreaker.CLOSED
+        self.failures = 0
+        self._trial_running = False
+
+    def release(self):
+        """Free the trial of a call that ended without a result, e.g. cancelled"""
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_running = False
+        if (
+            self.state == CircuitBreaker.HALF_OPEN
+            or self.failures >= self.failure_threshold
+        ):
+            self.state = CircuitBreaker.OPEN
+            self._opened_at = time.monotonic()
+
+    @staticmethod
+    def is_failure(error: Exception) -> bool:
+        """Only errors that hint at an unavailable service count as failures"""
+        if isinstance(error, aiohttp.ClientResponseError):
+            return error.status >= 500
+        # asyncio.TimeoutError is not the builtin TimeoutError before 3.11
+        return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+
+class CircuitOpenError(Exception):
+    pass
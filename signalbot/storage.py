@@ -1,7 +1,14 @@
+import asyncio
 import redis
+import redis.asyncio
 import json
+import logging
+import time
+from collections import OrderedDict
 from typing import Any
 
+logger = logging.getLogger(__name__)
+
 
 class Storage:
     def exists(self, key: str) -> bool:
@@ -63,3 +70,353 @@ class RedisStorage(Storage):
             self._redis.set(key, object_str)
         except Exception as e:
             raise StorageError(f"Redis save failed: {e}")
+
+
+class AsyncStorage:
+    """Storage interface for async handlers, see AsyncRedisStorage
+
+    ttl is given in seconds, None keeps the object forever.
+    """
+
+    async def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    async def read(self, key: str) -> Any:
+        raise NotImplementedError
+
+    async def save(self, key: str, object: Any, ttl: float | None = None):
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    async def read_many(self, keys: list[str]) -> dict[str, Any]:
+        """Read several keys at once. Missing keys are left out of the result"""
+        raise NotImplementedError
+
+    async def save_many(self, objects: dict[str, Any], ttl: float | None = None):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class AsyncInMemoryStorage(AsyncStorage):
+    def __init__(self):
+        self._storage = {}  # key -> (json string, expiry on the monotonic clock)
+
+    async def exists(self, key: str) -> bool:
+        return self._get(key) is not None
+
+    async def read(self, key: str) -> Any:
+        try:
+            return json.loads(self._get(key))
+        except Exception as e:
+            raise StorageError(f"InMemory load failed: {e}")
+
+    async def save(self, key: str, object: Any, ttl: float | None = None):
+        try:
+            self._set(key, json.dumps(object), ttl)
+        except Exception as e:
+            raise StorageError(f"InMemory save failed: {e}")
+
+    async def delete(self, key: str):
+        self._storage.pop(key, None)
+
+    async def read_many(self, keys: list[str]) -> dict[str, Any]:
+        result = {}
+        for key in keys:
+            value = self._get(key)
+            if value is not None:
+                result[key] = json.loads(value)
+        return result
+
+    async def save_many(self, objects: dict[str, Any], ttl: float | None = None):
+        try:
+            for key, object in objects.items():
+                self._set(key, json.dumps(object), ttl)
+        except Exception as e:
+            raise StorageError(f"InMemory save failed: {e}")
+
+    def _get(self, key: str) -> str | None:
+        entry = self._storage.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._storage[key]
+            return None
+        return value
+
+    def _set(self, key: str, value: str, ttl: float | None):
+        expires_at = None if ttl is None else time.monotonic() + ttl
+        self._storage[key] = (value, expires_at)
+
+
+class AsyncRedisStorage(AsyncStorage):
+    """Non-blocking Redis storage backed by a connection pool"""
+
+    def __init__(self, host, port, db=0, max_connections: int | None = None):
+        self._pool = redis.asyncio.ConnectionPool(
+            host=host, port=port, db=db, max_connections=max_connections
+        )
+        self._redis = redis.asyncio.Redis(connection_pool=self._pool)
+
+    async def exists(self, key: str) -> bool:
+        return await self._redis.exists(key) > 0
+
+    async def read(self, key: str) -> Any:
+        try:
+            result_bytes = await self._redis.get(key)
+            result_str = result_bytes.decode("utf-8")
+            result_dict = json.loads(result_str)
+            return result_dict
+        except Exception as e:
+            raise StorageError(f"Redis load failed: {e}")
+
+    async def save(self, key: str, object: Any, ttl: float | None = None):
+        try:
+            object_str = json.dumps(object)
+            await self._redis.set(key, object_str, px=self._ttl_ms(ttl))
+        except Exception as e:
+            raise StorageError(f"Redis save failed: {e}")
+
+    async def delete(self, key: str):
+        try:
+            await self._redis.delete(key)
+        except Exception as e:
+            raise StorageError(f"Redis delete failed: {e}")
+
+    async def read_many(self, keys: list[str]) -> dict[str, Any]:
+        if not keys:
+            return {}
+        try:
+            values = await self._redis.mget(keys)
+            return {
+                key: json.loads(value.decode("utf-8"))
+                for key, value in zip(keys, values)
+                if value is not None
+            }
+        except Exception as e:
+            raise StorageError(f"Redis load failed: {e}")
+
+    async def save_many(self, objects: dict[str, Any], ttl: float | None = None):
+        if not objects:
+            return
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for key, object in objects.items():
+                    pipe.set(key, json.dumps(object), px=self._ttl_ms(ttl))
+                await pipe.execute()
+        except Exception as e:
+            raise StorageError(f"Redis save failed: {e}")
+
+    async def close(self):
+        # redis-py < 5 only knows close()
+        close = getattr(self._redis, "aclose", None) or self._redis.close
+        await close()
+        await self._pool.disconnect()
+
+    @staticmethod
+    def _ttl_ms(ttl: float | None) -> int | None:
+        if ttl is None:
+            return None
+        return max(1, int(ttl * 1000))
+
+
+_MISSING = object()  # cache miss marker, None is a valid stored object
+_EXPIRED = object()  # saved with a TTL that ran out before it was written
+
+
+class CachedStorage(AsyncStorage):
+    """Write-behind LRU cache in front of another AsyncStorage
+
+    Decoded objects are kept in memory, so reads of cached keys neither decode
+    JSON nor hit the network. Saves only update the cache and mark the key as
+    dirty; dirty keys are written to the underlying storage in batches by
+    .flush(), which runs every flush_interval seconds after .start() and once
+    more on .close().
+
+    The ttl of .save() also expires the cached entry. Keys that are read
+    from the underlying storage are cached for cache_ttl seconds regardless of
+    their TTL there.
+
+    Note that .read() returns the cached object itself, not a copy. Call
+    .save() after modifying it so that the change gets written back.
+    """
+
+    def __init__(
+        self,
+        storage: AsyncStorage,
+        max_size: int = 1024,
+        cache_ttl: float | None = None,
+        flush_interval: float = 1.0,
+    ):
+        self.storage = storage
+        self.max_size = max_size
+        self.cache_ttl = cache_ttl  # seconds an entry is trusted without reload
+        self.flush_interval = flush_interval
+
+        self._cache = OrderedDict()  # key -> (object, expiry on the monotonic clock)
+        self._dirty = {}  # key -> (object, ttl, expiry), not yet written
+        self._flushing = {}  # like _dirty, being written right now
+        self._lock = asyncio.Lock()
+        self._flush_task = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.flushes = 0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "flushes": self.flushes,
+            "size": len(self._cache),
+            "dirty": len(self._dirty),
+        }
+
+    async def exists(self, key: str) -> bool:
+        object = self._lookup(key)
+        if object is _EXPIRED:
+            return False
+        if object is not _MISSING:
+            return True
+        return await self.storage.exists(key)
+
+    async def read(self, key: str) -> Any:
+        object = self._lookup(key)
+        if object is _EXPIRED:
+            raise StorageError(f"Cache load failed: {key} expired")
+        if object is not _MISSING:
+            self.hits += 1
+            return object
+
+        self.misses += 1
+        object = await self.storage.read(key)
+        self._remember(key, object)
+        return object
+
+    async def save(self, key: str, object: Any, ttl: float | None = None):
+        expires_at = None if ttl is None else time.monotonic() + ttl
+        self._remember(key, object, expires_at)
+        self._dirty[key] = (object, ttl, expires_at)
+
+    async def delete(self, key: str):
+        async with self._lock:
+            self._cache.pop(key, None)
+            self._dirty.pop(key, None)
+            await self.storage.delete(key)
+
+    async def read_many(self, keys: list[str]) -> dict[str, Any]:
+        result = {}
+        missing = []
+        for key in keys:
+            object = self._lookup(key)
+            if object is _MISSING:
+                missing.append(key)
+            elif object is not _EXPIRED:
+                result[key] = object
+        self.hits += len(result)
+        self.misses += len(missing)
+
+        if missing:
+            loaded = await self.storage.read_many(missing)
+            for key, object in loaded.items():
+                self._remember(key, object)
+            result.update(loaded)
+        return result
+
+    async def save_many(self, objects: dict[str, Any], ttl: float | None = None):
+        for key, object in objects.items():
+            await self.save(key, object, ttl)
+
+    async def flush(self):
+        """Write all dirty keys to the underlying storage"""
+        async with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            if not dirty:
+                return
+            # still readable while written, even if evicted from the cache
+            self._flushing = dirty
+
+            # one batch per TTL, usually there is only one
+            batches = {}
+            expired = []
+            now = time.monotonic()
+            for key, (object, ttl, expires_at) in dirty.items():
+                if expires_at is not None and expires_at <= now:
+                    expired.append(key)  # replaced what was stored, then expired
+                else:
+                    batches.setdefault(ttl, {})[key] = object
+
+            try:
+                for ttl, objects in batches.items():
+                    await self.storage.save_many(objects, ttl)
+                for key in expired:
+                    await self.storage.delete(key)
+            except BaseException:
+                # keep the writes for the next flush unless they were superseded,
+                # also when cancelled, e.g. by .close()
+                for key, value in dirty.items():
+                    self._dirty.setdefault(key, value)
+                raise
+            finally:
+                self._flushing = {}
+            self.flushes += 1
+
+    def start(self):
+        """Flush periodically in the background, requires a running event loop"""
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_periodically())
+
+    async def close(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            # a cancelled flush puts its batch back for the final one
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        await self.flush()
+        await self.storage.close()
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.warning("[Storage] Write-behind flush failed: %s", e)
+
+    def _lookup(self, key: str) -> Any:
+        now = time.monotonic()
+        entry = self._cache.get(key)
+        if entry is not None:
+            object, expires_at = entry
+            if expires_at is None or expires_at > now:
+                self._cache.move_to_end(key)
+                return object
+            del self._cache[key]
+
+        # evicted or expired, but the latest value was not written yet
+        for pending in (self._dirty, self._flushing):
+            if key in pending:
+                object, _, expires_at = pending[key]
+                if expires_at is not None and expires_at <= now:
+                    return _EXPIRED
+                self._remember(key, object, expires_at)
+                return object
+        return _MISSING
+
+    def _remember(self, key: str, object: Any, expires_at: float | None = None):
+        # expires_at of the key itself, the cache may drop it earlier
+        if self.cache_ttl is not None:
+            cache_expires_at = time.monotonic() + self.cache_ttl
+            if expires_at is None or cache_expires_at < expires_at:
+                expires_at = cache_expires_at
+        self._cache[key] = (object, expires_at)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+            self.evictions += 1
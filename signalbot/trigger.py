@@ -0,0 +1,213 @@
+import re
+from typing import Iterable
+
+from .message import Message, MessageType
+
+# Patterns with backreferences or global inline flags cannot be safely merged
+# into the combined pattern, they are always searched on their own.
+_BACKREFERENCE = re.compile(r"\\[1-9]|\(\?P=")
+
+
+class Trigger:
+    """Declarative description of the messages a command is interested in
+
+    The text of a message matches if it equals one of words, starts with one of
+    prefixes or if one of the regexes can be found in it. If none of these are
+    given, any text (or no text at all) matches. On top of that, all given
+    filters (type, has_attachment, groups, users) must match as well.
+    """
+
+    def __init__(
+        self,
+        words: Iterable[str] = (),
+        prefixes: Iterable[str] = (),
+        regexes: Iterable[str] = (),
+        type: MessageType | None = None,
+        has_attachment: bool | None = None,
+        groups: Iterable[str] | None = None,
+        users: Iterable[str] | None = None,
+        case_sensitive: bool = False,
+    ):
+        self.words = tuple(words)
+        self.prefixes = tuple(prefixes)
+        self.regexes = tuple(regexes)
+        self.type = type
+        self.has_attachment = has_attachment
+        self.groups = None if groups is None else frozenset(groups)
+        self.users = None if users is None else frozenset(users)
+        self.case_sensitive = case_sensitive
+
+        flags = 0 if case_sensitive else re.IGNORECASE
+        self._compiled = [re.compile(regex, flags) for regex in self.regexes]
+
+    def has_text_conditions(self) -> bool:
+        return bool(self.words or self.prefixes or self.regexes)
+
+    def matches(self, message: Message) -> bool:
+        return self.matches_text(message.text) and self.accepts(message)
+
+    def matches_text(self, text: str) -> bool:
+        if not self.has_text_conditions():
+            return True
+        if not isinstance(text, str):
+            return False
+
+        normalized = text if self.case_sensitive else text.lower()
+        if normalized in self._normalize(self.words):
+            return True
+        if normalized.startswith(tuple(self._normalize(self.prefixes))):
+            return True
+        return any(regex.search(text) for regex in self._compiled)
+
+    def accepts(self, message: Message) -> bool:
+        """Check all non-text filters"""
+        if self.type is not None and message.type != self.type:
+            return False
+        if self.has_attachment is not None:
+            if bool(message.base64_attachments) != self.has_attachment:
+                return False
+        if self.groups is not None and message.group not in self.groups:
+            return False
+        if self.users is not None and message.source not in self.users:
+            return False
+        return True
+
+    def _normalize(self, texts: Iterable[str]) -> list[str]:
+        if self.case_sensitive:
+            return list(texts)
+        return [text.lower() for text in texts]
+
+
+def get_trigger(command) -> Trigger | None:
+    """Trigger of a command, either declared directly or through @triggered"""
+    trigger = getattr(command, "trigger", None)
+    if trigger is None:
+        trigger = getattr(command.handle, "trigger", None)
+    return trigger
+
+
+class _TrieNode:
+    __slots__ = ("children", "positions")
+
+    def __init__(self):
+        self.children = {}
+        self.positions = []
+
+
+class TriggerIndex:
+    """Index over the triggers of all registered commands
+
+    Finds the commands a message has to be dispatched to without asking every
+    single command: exact words are looked up in a hash map, prefixes in a trie
+    and all regexes are first tried as one combined pattern.
+    Commands without a trigger receive every message.
+    """
+
+    def __init__(self, commands: list):
+        self.commands = list(commands)
+        self._triggers = [get_trigger(command) for command in self.commands]
+
+        self._unconditional = []  # positions that match any text
+        self._words = {True: {}, False: {}}  # case_sensitive -> word -> positions
+        self._prefixes = {True: _TrieNode(), False: _TrieNode()}
+        self._regexes = []  # (position, compiled regex)
+        self._combined = None
+        self._separate_regexes = []  # positions that can't use the combined regex
+
+        combined = []
+        for position, trigger in enumerate(self._triggers):
+            if trigger is None or not trigger.has_text_conditions():
+                self._unconditional.append(position)
+                continue
+
+            case_sensitive = trigger.case_sensitive
+            for word in trigger._normalize(trigger.words):
+                self._words[case_sensitive].setdefault(word, []).append(position)
+            for prefix in trigger._normalize(trigger.prefixes):
+                self._insert_prefix(self._prefixes[case_sensitive], prefix, position)
+            for regex in trigger._compiled:
+                self._regexes.append((position, regex))
+                pattern = self._scoped_pattern(regex)
+                if pattern is None:
+                    self._separate_regexes.append(position)
+                else:
+                    combined.append(pattern)
+
+        if combined:
+            try:
+                self._combined = re.compile("|".join(combined))
+            except re.error:  # e.g. the same group name used twice
+                self._separate_regexes = [position for position, _ in self._regexes]
+
+    def match(self, message: Message) -> list:
+        positions = set(self._unconditional)
+
+        text = message.text
+        if isinstance(text, str):
+            positions.update(self._match_words(text))
+            positions.update(self._match_prefixes(text))
+            positions.update(self._match_regexes(text))
+
+        commands = []
+        for position in sorted(positions):
+            trigger = self._triggers[position]
+            if trigger is None or trigger.accepts(message):
+                commands.append(self.commands[position])
+        return commands
+
+    def _match_words(self, text: str) -> list[int]:
+        positions = list(self._words[True].get(text, ()))
+        if self._words[False]:
+            positions.extend(self._words[False].get(text.lower(), ()))
+        return positions
+
+    def _match_prefixes(self, text: str) -> list[int]:
+        positions = self._walk_trie(self._prefixes[True], text)
+        root = self._prefixes[False]
+        if root.children or root.positions:
+            positions.extend(self._walk_trie(root, text.lower()))
+        return positions
+
+    def _match_regexes(self, text: str) -> list[int]:
+        if not self._regexes:
+            return []
+
+        # Cheap rejection: if the combined pattern does not match, only the
+        # regexes that could not be combined need to be tried
+        candidates = self._regexes
+        if self._combined is not None and self._combined.search(text) is None:
+            separate = set(self._separate_regexes)
+            candidates = [c for c in self._regexes if c[0] in separate]
+
+        return [position for position, regex in candidates if regex.search(text)]
+
+    @staticmethod
+    def _insert_prefix(root: _TrieNode, prefix: str, position: int):
+        node = root
+        for char in prefix:
+            node = node.children.setdefault(char, _TrieNode())
+        node.positions.append(position)
+
+    @staticmethod
+    def _walk_trie(root: _TrieNode, text: str) -> list[int]:
+        positions = list(root.positions)
+        node = root
+        for char in text:
+            node = node.children.get(char)
+            if node is None:
+                break
+            positions.extend(node.positions)
+        return positions
+
+    @staticmethod
+    def _scoped_pattern(regex: re.Pattern) -> str | None:
+        if _BACKREFERENCE.search(regex.pattern):
+            return None
+
+        flags = "i" if regex.flags & re.IGNORECASE else ""
+        pattern = f"(?{flags}:{regex.pattern})" if flags else f"(?:{regex.pattern})"
+        try:
+            re.compile(pattern)
+        except re.error:
+            return None
+        return pattern
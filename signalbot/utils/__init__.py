@@ -1,5 +1,7 @@
 from .chat_testing import (
     ChatTestCase,
+    LoadProfile,
+    LoadResult,
     SendMessagesMock,
     ReceiveMessagesMock,
     ReactMessageMock,
@@ -8,6 +10,8 @@ from .chat_testing import (
 
 __all__ = [
     "ChatTestCase",
+    "LoadProfile",
+    "LoadResult",
     "SendMessagesMock",
     "ReceiveMessagesMock",
     "ReactMessageMock",
@@ -1,12 +1,18 @@
+import asyncio
 import unittest
 import uuid
 import time
 import json
 import functools
+import random
+import string
 import aiohttp
-from unittest.mock import AsyncMock, MagicMock
+from typing import Callable
+from unittest.mock import DEFAULT, AsyncMock, MagicMock
 
+from ..api import SignalAPI
 from ..bot import SignalBot
+from ..retry import RetryPolicy
 
 from unittest.mock import patch
 
@@ -50,6 +56,8 @@ class ChatTestCase(unittest.IsolatedAsyncioTestCase):
     def setUp(self):
         self.signal_bot = SignalBot(ChatTestCase.config)
         self.signal_bot.listen(ChatTestCase.group_id, ChatTestCase.group_secret)
+        # the mocked receive yields the messages once, don't reconnect after it
+        self.signal_bot._signal.retry_policies["receive"] = RetryPolicy(max_attempts=1)
 
     async def run_bot(self):
         PRODUCER_ID = 1337
@@ -58,6 +66,107 @@ class ChatTestCase(unittest.IsolatedAsyncioTestCase):
         while self.signal_bot._q.qsize() > 0:
             await self.signal_bot._consume_new_item(HANDLER_ID)
 
+    async def run_load(
+        self,
+        profile: "LoadProfile" = None,
+        consumers: int = None,
+        api_latency: float = 0,
+        timeout: float = 60,
+    ) -> "LoadResult":
+        """Run the real producer and consumer tasks on synthetic traffic
+
+        The bot listens to all users and groups of the profile. API calls
+        (send, react, typing) answer after api_latency seconds. Returns once
+        every message was handled by all its commands.
+        """
+        if profile is None:
+            profile = LoadProfile()
+        if consumers is None:
+            consumers = self.signal_bot._consumer_count
+        bot = self.signal_bot
+        for user in profile.users:
+            bot.listenUser(user)
+        for internal_id, group_id in profile.groups.items():
+            bot.listenGroup(group_id, internal_id)
+
+        received = {}  # timestamp -> time.perf_counter() when received
+        latencies = []
+
+        async def receive(api, on_connect=None):
+            if on_connect is not None:
+                on_connect()
+            for burst in profile.bursts():
+                for raw_message in burst:
+                    received[raw_message["envelope"]["timestamp"]] = time.perf_counter()
+                    yield json.dumps(raw_message)
+                await asyncio.sleep(profile.draw(profile.burst_interval))
+
+        ask_commands_to_handle = bot._ask_commands_to_handle
+
+        async def ask_and_time(message, on_done=None):
+            # only messages of the profile are timed, not e.g. sent ones (listen)
+            start = received.pop(message.timestamp, None)
+            if start is None:
+                await ask_commands_to_handle(message, on_done=on_done)
+                return
+
+            def done():
+                latencies.append(time.perf_counter() - start)
+                if on_done is not None:
+                    on_done()  # e.g. acknowledges the message in the journal
+
+            await ask_commands_to_handle(message, on_done=done)
+
+        async def api_call(*args, **kwargs):
+            await asyncio.sleep(api_latency)
+            return DEFAULT
+
+        send_mock = SendMessagesMock(side_effect=api_call)
+        other_mock = AsyncMock(side_effect=api_call)
+        with patch.multiple(
+            SignalAPI,
+            receive=receive,
+            send=send_mock,
+            react=other_mock,
+            start_typing=other_mock,
+            stop_typing=other_mock,
+        ), patch.object(bot, "_ask_commands_to_handle", ask_and_time):
+            start = time.perf_counter()
+            bot._consumers.start(consumers)
+            try:
+                await asyncio.wait_for(self._drain_load(bot), timeout)
+            finally:
+                while bot._consumers.retire():
+                    pass
+            duration = time.perf_counter() - start
+
+        return LoadResult(latencies, duration, send_mock.call_count)
+
+    @staticmethod
+    async def _drain_load(bot: SignalBot):
+        await bot._produce(1)
+        await bot._q.join()
+
+    def assertLatency(
+        self,
+        result: "LoadResult",
+        p50: float = None,
+        p99: float = None,
+        maximum: float = None,
+    ):
+        """Fail if the handling latency exceeds any of the given budgets"""
+        budgets = {
+            "p50": (p50, result.p50),
+            "p99": (p99, result.p99),
+            "max": (maximum, result.max),
+        }
+        for name, (budget, value) in budgets.items():
+            if budget is not None and value > budget:
+                self.fail(
+                    f"{name} latency {value * 1000:.1f}ms exceeds the budget of "
+                    f"{budget * 1000:.1f}ms ({result})"
+                )
+
     @classmethod
     def new_message(cls, text) -> str:
         timestamp = time.time()
@@ -131,3 +240,137 @@ class ReactMessageMock(AsyncMock):
         for args in self.call_args_list:
             results.append(args[0])
         return results
+
+
+class LoadProfile:
+    """Synthetic traffic for ChatTestCase.run_load
+
+    Messages come in bursts from random users, directly or in random groups.
+    Every count or duration is either a number, a (low, high) range to draw
+    uniformly from, or a function that gets a random.Random and returns one.
+    texts, if given, are picked from instead of generating words, e.g. to hit
+    the triggers of the commands under test.
+    """
+
+    def __init__(
+        self,
+        messages: int = 1000,
+        users: int = 1000,
+        groups: int = 100,
+        group_ratio: float = 0.5,
+        burst_size=(1, 20),
+        burst_interval=0,
+        text_length=(1, 100),
+        attachment_ratio: float = 0,
+        mention_ratio: float = 0,
+        texts: list[str] = None,
+        seed: int = 0,
+    ):
+        self.messages = messages
+        self.users = [f"+4917{i:09d}" for i in range(users)]
+        self.groups = {f"load{i}=": f"group.load{i}=" for i in range(groups)}
+        self.group_ratio = group_ratio if groups else 0
+        self.burst_size = burst_size
+        self.burst_interval = burst_interval  # seconds between bursts
+        self.text_length = text_length  # characters
+        self.attachment_ratio = attachment_ratio
+        self.mention_ratio = mention_ratio
+        self.texts = texts
+        self.random = random.Random(seed)
+
+    def draw(self, value: float | tuple | Callable[[random.Random], float]):
+        if callable(value):
+            return value(self.random)
+        if isinstance(value, tuple):
+            low, high = value
+            if isinstance(low, int) and isinstance(high, int):
+                return self.random.randint(low, high)
+            return self.random.uniform(low, high)
+        return value
+
+    def bursts(self):
+        sequence = 0
+        while sequence < self.messages:
+            size = min(max(1, self.draw(self.burst_size)), self.messages - sequence)
+            yield [self.message(sequence + i) for i in range(size)]
+            sequence += size
+
+    def message(self, sequence: int) -> dict:
+        source = self.random.choice(self.users)
+        timestamp = 1633169000000 + sequence  # unique, duplicates are dropped
+        content = {"timestamp": timestamp, "message": self._text()}
+        if self.random.random() < self.group_ratio:
+            internal_id = self.random.choice(list(self.groups))
+            content["groupInfo"] = {"groupId": internal_id, "type": "DELIVER"}
+        if self.random.random() < self.mention_ratio:
+            mentioned = self.random.choice(self.users)
+            content["mentions"] = [
+                {"name": mentioned, "number": mentioned, "start": 0, "length": 1}
+            ]
+        if self.random.random() < self.attachment_ratio:
+            content["attachments"] = [
+                {
+                    "contentType": "image/jpeg",
+                    "filename": f"image{sequence}.jpg",
+                    "id": f"attachment{sequence}",
+                    "size": self.random.randint(1, 5_000_000),
+                }
+            ]
+        return {
+            "envelope": {
+                "source": source,
+                "sourceNumber": source,
+                "sourceDevice": 1,
+                "timestamp": timestamp,
+                "dataMessage": content,
+            }
+        }
+
+    def _text(self) -> str:
+        if self.texts:
+            return self.random.choice(self.texts)
+        length = max(1, self.draw(self.text_length))
+        return "".join(self.random.choices(string.ascii_lowercase + " ", k=length))
+
+
+class LoadResult:
+    """Latencies from receiving a message until all its commands handled it"""
+
+    def __init__(self, latencies: list[float], duration: float, replies: int):
+        self.latencies = sorted(latencies)
+        self.duration = duration  # seconds
+        self.replies = replies  # calls of SignalAPI.send
+
+    @property
+    def messages(self) -> int:
+        return len(self.latencies)
+
+    @property
+    def throughput(self) -> float:
+        """Handled messages per second"""
+        return self.messages / self.duration if self.duration else 0
+
+    @property
+    def p50(self) -> float:
+        return self.percentile(0.5)
+
+    @property
+    def p99(self) -> float:
+        return self.percentile(0.99)
+
+    @property
+    def max(self) -> float:
+        return self.latencies[-1] if self.latencies else 0
+
+    def percentile(self, p: float) -> float:
+        if not self.latencies:
+            return 0
+        index = min(len(self.latencies) - 1, int(len(self.latencies) * p))
+        return self.latencies[index]
+
+    def __str__(self):
+        return (
+            f"{self.messages} messages in {self.duration:.2f}s, "
+            f"{self.throughput:.0f}/s, p50 {self.p50 * 1000:.1f}ms, "
+            f"p99 {self.p99 * 1000:.1f}ms, max {self.max * 1000:.1f}ms"
+        )
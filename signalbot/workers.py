@@ -0,0 +1,132 @@
+import asyncio
+import itertools
+import logging
+from typing import Callable, Coroutine
+
+logger = logging.getLogger(__name__)
+
+
+class ConsumerPool:
+    """Set of consumer tasks that can grow and shrink while the bot is running
+
+    The pool keeps track of which consumers are busy and of the handler latency
+    (exponentially weighted moving average) so that .autoscale() can add
+    consumers when the queue backs up and remove idle ones again.
+    """
+
+    def __init__(
+        self,
+        consume: Callable[[int], Coroutine],
+        min_consumers: int = 1,
+        max_consumers: int = 3,
+        target_wait: float = 1.0,
+        scale_down_after: int = 5,
+        latency_smoothing: float = 0.2,
+    ):
+        if not 0 < min_consumers <= max_consumers:
+            raise ValueError("0 < min_consumers <= max_consumers must hold")
+
+        self._consume = consume
+        self.min_consumers = min_consumers
+        self.max_consumers = max_consumers
+        self.target_wait = target_wait  # seconds an item should wait at most
+        self.scale_down_after = scale_down_after  # idle rounds before shrinking
+        self.latency_smoothing = latency_smoothing
+
+        self.latency = None  # seconds per handled item, None until observed
+        self._tasks = {}  # name -> task
+        self._busy = set()
+        self._names = itertools.count(1)
+        self._idle_rounds = 0
+
+    def size(self) -> int:
+        return len(self._tasks)
+
+    def busy(self) -> int:
+        return len(self._busy & self._tasks.keys())
+
+    def idle(self) -> int:
+        return self.size() - self.busy()
+
+    def start(self, consumers: int):
+        for _ in range(consumers):
+            self.spawn()
+
+    def spawn(self) -> int:
+        name = next(self._names)
+        task = asyncio.create_task(self._consume(name))
+        task.add_done_callback(lambda _: self._forget(name))
+        self._tasks[name] = task
+        logger.info("[Bot] Consumer #%s added (%s running)", name, self.size())
+        return name
+
+    def retire(self) -> bool:
+        """Stop one idle consumer. Busy consumers are never interrupted"""
+        for name, task in self._tasks.items():
+            if name not in self._busy:
+                task.cancel()
+                self._forget(name)
+                logger.info(
+                    "[Bot] Consumer #%s removed (%s running)", name, self.size()
+                )
+                return True
+        return False
+
+    async def stop(self):
+        """Cancel all consumers, busy or not, and wait until they are done"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = {}
+        self._busy = set()
+
+    def mark_busy(self, name: int):
+        self._busy.add(name)
+
+    def mark_idle(self, name: int, duration: float = None):
+        self._busy.discard(name)
+        if duration is None:
+            return
+        if self.latency is None:
+            self.latency = duration
+        else:
+            alpha = self.latency_smoothing
+            self.latency = alpha * duration + (1 - alpha) * self.latency
+
+    def scale(self, queue_depth: int) -> int:
+        """Add or remove at most one consumer. Returns the change in size"""
+        size = self.size()
+        if size < self.min_consumers:
+            self.spawn()
+            return 1
+
+        if queue_depth > 0 and self.idle() == 0:
+            self._idle_rounds = 0
+            if size >= self.max_consumers:
+                return 0
+            # estimated time the last item in the queue has to wait
+            expected_wait = queue_depth * (self.latency or 0) / size
+            if self.latency is None or expected_wait > self.target_wait:
+                self.spawn()
+                return 1
+            return 0
+
+        if queue_depth == 0 and self.idle() > 1 and size > self.min_consumers:
+            self._idle_rounds += 1
+            if self._idle_rounds >= self.scale_down_after:
+                self._idle_rounds = 0
+                return -1 if self.retire() else 0
+            return 0
+
+        self._idle_rounds = 0
+        return 0
+
+    async def autoscale(self, queue, interval: float = 1.0):
+        while True:
+            await asyncio.sleep(interval)
+            self.scale(queue.qsize())
+
+    def _forget(self, name: int):
+        self._tasks.pop(name, None)
+        self._busy.discard(name)
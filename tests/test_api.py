@@ -1,8 +1,20 @@
 import unittest
+import base64
+import hashlib
+import io
+import os
+import tempfile
 import aiohttp
-from unittest.mock import patch, AsyncMock
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from unittest.mock import patch, AsyncMock, MagicMock
 
-from signalbot import SignalAPI
+from signalbot import (
+    SignalAPI,
+    ReceiveAttachment,
+    SendAttachment,
+    AttachmentTooLargeError,
+)
 
 
 class TestAPI(unittest.IsolatedAsyncioTestCase):
@@ -31,6 +43,16 @@ class TestAPI(unittest.IsolatedAsyncioTestCase):
         resp = await self.signal_api.send(receiver, message)
 
         self.assertEqual(resp.status_code, 201)
+        await self.signal_api.close()
+
+    async def test_session_is_shared_and_closed(self):
+        session = await self.signal_api.open()
+        self.assertIs(await self.signal_api.open(), session)
+        self.assertEqual(session.connector.limit_per_host, 10)
+
+        await self.signal_api.close()
+        self.assertTrue(session.closed)
+        self.assertIsNone(self.signal_api.session)
 
     @patch("websockets.connect")
     async def test_receive(self, mock):
@@ -60,5 +82,149 @@ class TestAPI(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(actual_uri, expected_uri)
 
 
+class TestAttachmentDownload(unittest.IsolatedAsyncioTestCase):
+    phone_number = "+49123456789"
+    data = os.urandom(200 * 1024)
+
+    async def asyncSetUp(self):
+        async def attachment(request):
+            return web.Response(body=TestAttachmentDownload.data)
+
+        app = web.Application()
+        app.router.add_get("/v1/attachments/{attachment_id}", attachment)
+        self.server = TestServer(app)
+        await self.server.start_server()
+
+        signal_service = f"{self.server.host}:{self.server.port}"
+        self.signal_api = SignalAPI(signal_service, self.phone_number)
+        self.attachment = ReceiveAttachment.parse({"id": "1", "size": len(self.data)})
+
+    async def asyncTearDown(self):
+        await self.signal_api.close()
+        await self.server.close()
+
+    async def test_iter_attachment(self):
+        chunks = []
+        async for chunk in self.signal_api.iter_attachment(
+            self.attachment, chunk_size=1024
+        ):
+            self.assertLessEqual(len(chunk), 1024)
+            chunks.append(chunk)
+        self.assertEqual(b"".join(chunks), self.data)
+
+    async def test_download_to_file_object(self):
+        file = io.BytesIO()
+        size, digest = await self.signal_api.download_attachment(
+            self.attachment, file, hash_algorithm="sha256"
+        )
+        self.assertEqual(size, len(self.data))
+        self.assertEqual(file.getvalue(), self.data)
+        self.assertEqual(digest, hashlib.sha256(self.data).hexdigest())
+
+    async def test_download_to_path(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "attachment")
+            size, digest = await self.signal_api.download_attachment(
+                self.attachment, path
+            )
+            self.assertIsNone(digest)
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), self.data)
+
+    async def test_download_limit(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "attachment")
+            with self.assertRaises(AttachmentTooLargeError):
+                await self.signal_api.download_attachment(
+                    self.attachment, path, max_bytes=1024
+                )
+            self.assertFalse(os.path.exists(path))
+
+    async def test_failed_download_keeps_existing_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "attachment")
+            with open(path, "wb") as f:
+                f.write(b"existing")
+            with self.assertRaises(AttachmentTooLargeError):
+                await self.signal_api.download_attachment(
+                    self.attachment, path, max_bytes=1024
+                )
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), b"existing")
+            self.assertEqual(os.listdir(directory), ["attachment"])
+
+    async def test_failed_write_closes_download(self):
+        file = MagicMock(spec=io.BytesIO)
+        file.write.side_effect = OSError("disk full")
+        with self.assertRaises(OSError):
+            await self.signal_api.download_attachment(self.attachment, file)
+        # the connection went back to the pool
+        self.assertEqual(len(self.signal_api.session.connector._acquired), 0)
+
+
+class TestStreamingSend(unittest.IsolatedAsyncioTestCase):
+    phone_number = "+49123456789"
+    receiver = "+49987654321"
+    data = os.urandom(3 * 64 * 1024 + 100)  # more than one chunk
+
+    async def asyncSetUp(self):
+        self.requests = []
+
+        async def send(request):
+            self.requests.append(await request.json())
+            return web.json_response({"timestamp": "1638715559464"}, status=201)
+
+        app = web.Application()
+        app.router.add_post("/v2/send", send)
+        self.server = TestServer(app)
+        await self.server.start_server()
+
+        signal_service = f"{self.server.host}:{self.server.port}"
+        self.signal_api = SignalAPI(signal_service, self.phone_number)
+        self.expected = base64.b64encode(self.data).decode()
+
+    async def asyncTearDown(self):
+        await self.signal_api.close()
+        await self.server.close()
+
+    async def test_send_from_path(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "image.png")
+            with open(path, "wb") as f:
+                f.write(self.data)
+            attachment = SendAttachment.from_path(path)
+            await self.signal_api.send(self.receiver, "Hi", [attachment])
+
+        payload = self.requests[0]
+        self.assertEqual(payload["message"], "Hi")
+        self.assertEqual(payload["recipients"], [self.receiver])
+        self.assertEqual(
+            payload["base64_attachments"],
+            ["data:image/png;filename=image.png;base64," + self.expected],
+        )
+
+    async def test_send_from_async_source(self):
+        async def source():
+            for i in range(0, len(self.data), 1000):
+                yield self.data[i : i + 1000]
+
+        attachment = SendAttachment(source=source())
+        await self.signal_api.send(self.receiver, "Hi", [attachment, "abc="])
+        self.assertEqual(
+            self.requests[0]["base64_attachments"], [self.expected, "abc="]
+        )
+
+    async def test_in_memory_data_is_encoded_once(self):
+        attachment = SendAttachment(self.data, content_type="image/png")
+        await self.signal_api.send(self.receiver, "1", [attachment])
+        encoded = attachment._encoded
+        await self.signal_api.send(self.receiver, "2", [attachment])
+        self.assertIs(attachment._encoded, encoded)
+        self.assertEqual(
+            self.requests[1]["base64_attachments"],
+            ["data:image/png;base64," + self.expected],
+        )
+
+
 if __name__ == "__main__":
     unittest.main()
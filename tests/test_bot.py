@@ -1,7 +1,18 @@
 import unittest
-import asyncio
 from unittest.mock import patch, AsyncMock
-from signalbot import SignalBot, Command, SignalAPI
+from signalbot import (
+    SignalBot,
+    Command,
+    SignalAPI,
+    Message,
+    MessageType,
+    Trigger,
+    SendMessageError,
+    RetryPolicy,
+    Context,
+)
+from signalbot.bot import SignalBotError
+from signalbot.utils import SendMessagesMock
 
 
 class BotTestCase(unittest.IsolatedAsyncioTestCase):
@@ -19,21 +30,29 @@ class BotTestCase(unittest.IsolatedAsyncioTestCase):
 
 
 class TestProducer(BotTestCase):
-    @patch("websockets.connect")
-    async def test_produce(self, mock):
-        # Two messages
-        message1 = '{"envelope":{"source":"+4901234567890","sourceNumber":"+4901234567890","sourceUuid":"asdf","sourceName":"name","sourceDevice":1,"timestamp":1633169000000,"syncMessage":{"sentMessage":{"timestamp":1633169000000,"message":"Message 1","expiresInSeconds":0,"viewOnce":false,"mentions":[],"attachments":[],"contacts":[],"groupInfo":{"groupId":"group_id1=","type":"DELIVER"},"destination":null,"destinationNumber":null,"destinationUuid":null}}}}'  # noqa
-        message2 = '{"envelope":{"source":"+4901234567890","sourceNumber":"+4901234567890","sourceUuid":"asdf","sourceName":"name","sourceDevice":1,"timestamp":1633169000000,"syncMessage":{"sentMessage":{"timestamp":1633169000000,"message":"Message 2","expiresInSeconds":0,"viewOnce":false,"mentions":[],"attachments":[],"contacts":[],"groupInfo":{"groupId":"group_id1=","type":"DELIVER"},"destination":null,"destinationNumber":null,"destinationUuid":null}}}}'  # noqa
-        messages = [message1, message2]
-        mock_iterator = AsyncMock()
-        mock_iterator.__aiter__.return_value = messages
-        mock.return_value.__aenter__.return_value = mock_iterator
+    # Two messages
+    message1 = '{"envelope":{"source":"+4901234567890","sourceNumber":"+4901234567890","sourceUuid":"asdf","sourceName":"name","sourceDevice":1,"timestamp":1633169000000,"syncMessage":{"sentMessage":{"timestamp":1633169000000,"message":"Message 1","expiresInSeconds":0,"viewOnce":false,"mentions":[],"attachments":[],"contacts":[],"groupInfo":{"groupId":"group_id1=","type":"DELIVER"},"destination":null,"destinationNumber":null,"destinationUuid":null}}}}'  # noqa
+    message2 = '{"envelope":{"source":"+4901234567890","sourceNumber":"+4901234567890","sourceUuid":"asdf","sourceName":"name","sourceDevice":1,"timestamp":1633169000001,"syncMessage":{"sentMessage":{"timestamp":1633169000001,"message":"Message 2","expiresInSeconds":0,"viewOnce":false,"mentions":[],"attachments":[],"contacts":[],"groupInfo":{"groupId":"group_id1=","type":"DELIVER"},"destination":null,"destinationNumber":null,"destinationUuid":null}}}}'  # noqa
 
-        self.signal_bot._q = asyncio.Queue()
+    def setUp(self):
+        super().setUp()
         self.signal_bot._signal = SignalAPI(
-            TestProducer.signal_service, TestProducer.phone_number
+            TestProducer.signal_service,
+            TestProducer.phone_number,
+            # a single connection, don't reconnect after the mocked messages
+            retry_policies={"receive": RetryPolicy(max_attempts=1)},
         )
         self.signal_bot.listen(TestProducer.group_id, TestProducer.internal_id)
+
+    def mock_messages(self, mock):
+        messages = [TestProducer.message1, TestProducer.message2]
+        mock_iterator = AsyncMock()
+        mock_iterator.__aiter__.return_value = messages
+        mock.return_value.__aenter__.return_value = mock_iterator
+
+    @patch("websockets.connect")
+    async def test_produce(self, mock):
+        self.mock_messages(mock)
         # Any two commands
         self.signal_bot.register(Command())
         self.signal_bot.register(Command())
@@ -42,6 +61,167 @@ class TestProducer(BotTestCase):
 
         self.assertEqual(self.signal_bot._q.qsize(), 4)
 
+    @patch("websockets.connect")
+    async def test_produce_only_triggered_commands(self, mock):
+        self.mock_messages(mock)
+        matching = Command()
+        matching.trigger = Trigger(words=["message 1"])
+        not_matching = Command()
+        not_matching.trigger = Trigger(prefixes=["/"])
+        self.signal_bot.register(matching)
+        self.signal_bot.register(not_matching)
+
+        await self.signal_bot._produce(1337)
+
+        self.assertEqual(self.signal_bot._q.qsize(), 1)
+
+    @patch("websockets.connect")
+    async def test_produce_drops_duplicates(self, mock):
+        # e.g. delivered again after a reconnect
+        messages = [TestProducer.message1, TestProducer.message1]
+        mock_iterator = AsyncMock()
+        mock_iterator.__aiter__.return_value = messages
+        mock.return_value.__aenter__.return_value = mock_iterator
+        self.signal_bot.register(Command())
+
+        await self.signal_bot._produce(1337)
+
+        self.assertEqual(self.signal_bot._q.qsize(), 1)
+        snapshot = self.signal_bot.metrics.snapshot()
+        self.assertEqual(snapshot["signalbot_receive_duplicates"], 1)
+
+
+class TestConnectionPool(BotTestCase):
+    def test_connection_pool_config(self):
+        config = {
+            "signal_service": BotTestCase.signal_service,
+            "phone_number": BotTestCase.phone_number,
+            "connection_pool": {"limit_per_host": 4, "keepalive_timeout": 60},
+        }
+        signal_bot = SignalBot(config)
+        self.assertEqual(signal_bot._signal.connection_limit_per_host, 4)
+        self.assertEqual(signal_bot._signal.keepalive_timeout, 60)
+
+
+class TestPriority(BotTestCase):
+    def test_user_chat_above_group_chat(self):
+        command = Command()
+        user_message = Message("+49987654321", 1, MessageType.DATA_MESSAGE, "hi")
+        group_message = Message(
+            "+49987654321", 1, MessageType.DATA_MESSAGE, "hi", group="group_id1="
+        )
+        self.assertGreater(
+            self.signal_bot._priority(command, user_message),
+            self.signal_bot._priority(command, group_message),
+        )
+
+    def test_command_priority_wins(self):
+        command = Command()
+        command.priority = 5
+        message = Message("+49987654321", 1, MessageType.DATA_MESSAGE, "hi")
+        self.assertEqual(self.signal_bot._priority(command, message), 5)
+
+
+class TestBroadcast(BotTestCase):
+    receivers = [f"+4998765432{i}" for i in range(5)]
+
+    @patch("signalbot.SignalAPI.send", new_callable=SendMessagesMock)
+    async def test_broadcast_in_batches(self, send_mock):
+        results = await self.signal_bot.broadcast(
+            TestBroadcast.receivers, "Hello", batch_size=2
+        )
+        self.assertEqual(send_mock.call_count, 3)
+        self.assertEqual(send_mock.results()[0], (TestBroadcast.receivers[:2], "Hello"))
+        self.assertEqual(list(results), TestBroadcast.receivers)
+        self.assertEqual(set(results.values()), {"1638715559464"})
+
+    @patch("signalbot.SignalAPI.send", new_callable=SendMessagesMock)
+    async def test_broadcast_errors_per_receiver(self, send_mock):
+        bad_receiver = TestBroadcast.receivers[1]
+        response = send_mock.return_value
+
+        async def send(receivers, *args, **kwargs):
+            if bad_receiver in receivers:
+                raise SendMessageError(status=400)
+            return response
+
+        send_mock.side_effect = send
+        results = await self.signal_bot.broadcast(
+            TestBroadcast.receivers + ["invalid"], "Hello", batch_size=3
+        )
+        self.assertIsInstance(results[bad_receiver], SendMessageError)
+        self.assertIsInstance(results["invalid"], SignalBotError)
+        for receiver in TestBroadcast.receivers:
+            if receiver != bad_receiver:
+                self.assertEqual(results[receiver], "1638715559464")
+
+    @patch("signalbot.SignalAPI.send", new_callable=SendMessagesMock)
+    async def test_broadcast_is_not_resent_after_server_error(self, send_mock):
+        send_mock.side_effect = SendMessageError(status=503)
+        results = await self.signal_bot.broadcast(
+            TestBroadcast.receivers, "Hello", batch_size=5
+        )
+        self.assertEqual(send_mock.call_count, 1)
+        self.assertEqual(len(set(map(id, results.values()))), 1)
+        self.assertIsInstance(results[TestBroadcast.receivers[0]], SendMessageError)
+
+
+class TestAccounts(BotTestCase):
+    second_number = "+49123456780"
+
+    def setUp(self):
+        config = {
+            "signal_service": BotTestCase.signal_service,
+            "phone_number": BotTestCase.phone_number,
+            "accounts": [TestAccounts.second_number],
+            "rate_limit": {},
+        }
+        self.signal_bot = SignalBot(config)
+
+    async def test_accounts_share_the_connection_pool(self):
+        second = self.signal_bot._api(TestAccounts.second_number)
+        self.assertEqual(second.phone_number, TestAccounts.second_number)
+        self.assertIs(await second.open(), await self.signal_bot._signal.open())
+        await self.signal_bot._signal.close()
+
+    async def test_each_account_has_its_own_rate_limit(self):
+        schedulers = self.signal_bot._send_schedulers
+        self.assertEqual(len(schedulers), 2)
+        self.assertIsNot(*schedulers.values())
+
+    def test_unknown_account(self):
+        with self.assertRaises(SignalBotError):
+            self.signal_bot._api("+49000000000")
+
+    @patch("websockets.connect")
+    async def test_messages_remember_the_receiving_account(self, mock):
+        mock_iterator = AsyncMock()
+        mock_iterator.__aiter__.return_value = [TestProducer.message1]
+        mock.return_value.__aenter__.return_value = mock_iterator
+        self.signal_bot._signal.retry_policies["receive"] = RetryPolicy(max_attempts=1)
+        self.signal_bot.listen(BotTestCase.group_id, BotTestCase.internal_id)
+        self.signal_bot.register(Command())
+
+        await self.signal_bot._produce(1, TestAccounts.second_number)
+
+        _, message, _ = await self.signal_bot._q.get()
+        self.assertEqual(message.account, TestAccounts.second_number)
+
+    @patch("signalbot.SignalAPI.send", autospec=True)
+    async def test_context_replies_through_the_receiving_account(self, send_mock):
+        send_mock.return_value = SendMessagesMock().return_value
+        message = Message(
+            "+49987654321",
+            1,
+            MessageType.DATA_MESSAGE,
+            "hi",
+            account=TestAccounts.second_number,
+        )
+        await Context(self.signal_bot, message).send("hello")
+
+        signal = send_mock.call_args.args[0]
+        self.assertEqual(signal.phone_number, TestAccounts.second_number)
+
 
 class TestListenUser(BotTestCase):
     def test_listen_phone_number(self):
@@ -2,9 +2,12 @@ import unittest
 from unittest.mock import patch
 import asyncio
 import logging
+import tempfile
 from signalbot import Command, Context
+from signalbot.journal import MessageJournal
 from signalbot.utils import (
     ChatTestCase,
+    LoadProfile,
     SendMessagesMock,
     ReceiveMessagesMock,
     chat,
@@ -70,6 +73,68 @@ class DecoratorChatTest(ChatTestCase):
         self.assertEqual(replies.call_count, 2)
 
 
+class PingCommand(Command):
+    def __init__(self, listen=False):
+        self.listen = listen
+
+    async def handle(self, c: Context):
+        if c.message.text == "ping":
+            await c.send("pong", listen=self.listen)
+
+
+class LoadChatTest(ChatTestCase):
+    def setUp(self):
+        super().setUp()
+        self.signal_bot.register(PingCommand())
+
+    async def test_load(self):
+        profile = LoadProfile(
+            messages=500,
+            users=2000,
+            groups=200,
+            burst_size=(1, 50),
+            texts=["ping", "hello"],
+            attachment_ratio=0.1,
+            mention_ratio=0.1,
+        )
+        result = await self.run_load(profile, consumers=5, api_latency=0.001)
+
+        self.assertEqual(result.messages, 500)
+        self.assertGreater(result.replies, 0)
+        self.assertLess(result.replies, 500)
+        self.assertLatency(result, p99=5)
+
+    async def test_load_acknowledges_messages(self):
+        with tempfile.TemporaryDirectory() as path:
+            journal = self.signal_bot._journal = MessageJournal(path)
+            journal.open()
+            await self.run_load(LoadProfile(messages=20, texts=["ping"]))
+            self.assertEqual(journal.pending(), 0)
+            journal.close()
+
+    async def test_load_with_listen(self):
+        self.signal_bot.register(PingCommand(listen=True))
+        profile = LoadProfile(messages=10, texts=["ping"])
+        with self.assertNoLogs("signalbot", level="ERROR"):
+            result = await self.run_load(profile)
+        self.assertEqual(result.messages, 10)
+
+    async def test_latency_budget(self):
+        result = await self.run_load(LoadProfile(messages=20, texts=["ping"]))
+        with self.assertRaises(AssertionError):
+            self.assertLatency(result, p50=0)
+
+    def test_profile_distributions(self):
+        profile = LoadProfile(
+            messages=100, burst_size=lambda r: 7, text_length=(5, 5), groups=0
+        )
+        bursts = list(profile.bursts())
+        self.assertEqual([len(b) for b in bursts], [7] * 14 + [2])
+        content = bursts[0][0]["envelope"]["dataMessage"]
+        self.assertEqual(len(content["message"]), 5)
+        self.assertNotIn("groupInfo", content)
+
+
 if __name__ == "__main__":
     logging.basicConfig(level="INFO")
     unittest.main()
@@ -0,0 +1,131 @@
+import unittest
+import asyncio
+
+from signalbot.dispatch import DispatchQueue, OverflowPolicy
+
+
+class TestDispatchQueue(unittest.IsolatedAsyncioTestCase):
+    def drain(self, q: DispatchQueue) -> list:
+        items = []
+        while not q.empty():
+            items.append(q.get_nowait())
+            q.task_done()
+        return items
+
+    async def test_fifo_within_one_chat(self):
+        q = DispatchQueue()
+        for i in range(3):
+            await q.put(i, chat="a")
+        self.assertEqual(self.drain(q), [0, 1, 2])
+
+    async def test_round_robin_over_chats(self):
+        q = DispatchQueue()
+        for i in range(3):
+            await q.put(f"a{i}", chat="a")
+        await q.put("b0", chat="b")
+        await q.put("c0", chat="c")
+        self.assertEqual(self.drain(q), ["a0", "b0", "c0", "a1", "a2"])
+
+    async def test_higher_priority_first(self):
+        q = DispatchQueue()
+        await q.put("group", chat="g", priority=0)
+        await q.put("user", chat="u", priority=1)
+        self.assertEqual(self.drain(q), ["user", "group"])
+
+    async def test_drop_newest(self):
+        q = DispatchQueue(maxsize=2, overflow=OverflowPolicy.DROP_NEWEST)
+        self.assertTrue(await q.put(1))
+        self.assertTrue(await q.put(2))
+        self.assertFalse(await q.put(3))
+        self.assertEqual(self.drain(q), [1, 2])
+
+    async def test_drop_oldest(self):
+        q = DispatchQueue(maxsize=2, overflow=OverflowPolicy.DROP_OLDEST)
+        await q.put(1, chat="a")
+        await q.put(2, chat="b")
+        self.assertTrue(await q.put(3, chat="c"))
+        self.assertEqual(self.drain(q), [2, 3])
+
+    async def test_drop_oldest_keeps_higher_priority(self):
+        q = DispatchQueue(maxsize=1, overflow=OverflowPolicy.DROP_OLDEST)
+        await q.put("important", priority=1)
+        self.assertFalse(await q.put("unimportant", priority=0))
+        self.assertEqual(self.drain(q), ["important"])
+
+    async def test_on_drop(self):
+        dropped = []
+        q = DispatchQueue(maxsize=1, overflow=OverflowPolicy.DROP_OLDEST)
+        q.on_drop = dropped.append
+        await q.put(1)
+        await q.put(2)
+        q.overflow = OverflowPolicy.DROP_NEWEST
+        await q.put(3)
+        self.assertEqual(dropped, [1, 3])
+
+    async def test_block_until_space(self):
+        q = DispatchQueue(maxsize=1)
+        await q.put(1)
+        put_task = asyncio.create_task(q.put(2))
+        await asyncio.sleep(0)
+        self.assertFalse(put_task.done())
+
+        self.assertEqual(await q.get(), 1)
+        q.task_done()
+        await put_task
+        self.assertEqual(await q.get(), 2)
+        q.task_done()
+        await asyncio.wait_for(q.join(), timeout=1)
+
+    async def test_ordered_one_item_per_chat_at_a_time(self):
+        q = DispatchQueue(ordered=True)
+        await q.put("a1", chat="a")
+        await q.put("a2", chat="a")
+        await q.put("b1", chat="b")
+
+        self.assertEqual(q.get_nowait(), "a1")
+        self.assertEqual(q.get_nowait(), "b1")
+        # a2 is held back until a1 is done
+        with self.assertRaises(asyncio.QueueEmpty):
+            q.get_nowait()
+        await q.put("a3", chat="a")
+
+        q.task_done("a")
+        self.assertEqual(q.get_nowait(), "a2")
+        q.task_done("a")
+        self.assertEqual(q.get_nowait(), "a3")
+
+    async def test_ordered_get_waits_for_task_done(self):
+        q = DispatchQueue(ordered=True)
+        await q.put(1, chat="a")
+        await q.put(2, chat="a")
+        self.assertEqual(await q.get(), 1)
+
+        get_task = asyncio.create_task(q.get())
+        await asyncio.sleep(0)
+        self.assertFalse(get_task.done())
+        q.task_done("a")
+        self.assertEqual(await asyncio.wait_for(get_task, timeout=1), 2)
+
+    async def test_ordered_idle_chats_are_released(self):
+        q = DispatchQueue(ordered=True)
+        for chat in range(100):
+            await q.put(chat, chat=chat)
+        for chat in range(100):
+            q.get_nowait()
+            q.task_done(chat)
+        self.assertEqual(q._busy, {})
+        self.assertFalse(any(q._levels.values()))
+        await asyncio.wait_for(q.join(), timeout=1)
+
+    async def test_ordered_drop_oldest_skips_busy_chats(self):
+        q = DispatchQueue(maxsize=2, overflow=OverflowPolicy.DROP_OLDEST, ordered=True)
+        await q.put("a1", chat="a")
+        self.assertEqual(q.get_nowait(), "a1")
+        await q.put("a2", chat="a")
+        await q.put("b1", chat="b")
+        await q.put("b2", chat="b")
+        self.assertEqual(q.get_nowait(), "b2")
+
+
+if __name__ == "__main__":
+    unittest.main()
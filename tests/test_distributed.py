@@ -0,0 +1,129 @@
+import json
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+from signalbot import Command, Message, SignalBot
+from signalbot.bot import SignalBotError
+from signalbot.distributed import StreamQueue
+
+RAW_MESSAGE = {
+    "envelope": {
+        "source": "+49987654321",
+        "timestamp": 1633169000000,
+        "dataMessage": {"message": "Hello", "timestamp": 1633169000000},
+    }
+}
+
+
+class TestStreamQueue(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.client.xautoclaim = AsyncMock(return_value=[b"0-0", [], []])
+        self.client.xreadgroup = AsyncMock(return_value=[])
+        self.client.xadd = AsyncMock(return_value=b"1-0")
+        self.client.xack = AsyncMock()
+        self.queue = StreamQueue(self.client, consumer="worker-1")
+
+    def entry(self, entry_id: bytes, raw_message: dict, account: str = None):
+        fields = {b"message": json.dumps(raw_message).encode()}
+        if account is not None:
+            fields[b"account"] = account.encode()
+        return (entry_id, fields)
+
+    async def test_publish(self):
+        message = Message.parse(RAW_MESSAGE)
+        message.account = "+49123456789"
+        entry_id = await self.queue.publish(message)
+
+        self.assertEqual(entry_id, "1-0")
+        fields = self.client.xadd.call_args.args[1]
+        self.assertEqual(json.loads(fields["message"]), RAW_MESSAGE)
+        self.assertEqual(fields["account"], "+49123456789")
+
+    async def test_read_new_messages(self):
+        entry = self.entry(b"1-0", RAW_MESSAGE, "+49123456789")
+        self.client.xreadgroup.return_value = [[b"signalbot:messages", [entry]]]
+
+        [(entry_id, message)] = await self.queue.read()
+
+        self.assertEqual(entry_id, "1-0")
+        self.assertEqual(message.text, "Hello")
+        self.assertEqual(message.account, "+49123456789")
+        args = self.client.xreadgroup.call_args.args
+        self.assertEqual(args[:2], ("signalbot", "worker-1"))
+
+    async def test_unacknowledged_messages_are_claimed_first(self):
+        entry = self.entry(b"1-0", RAW_MESSAGE)
+        self.client.xautoclaim.return_value = [b"0-0", [entry], []]
+
+        [(entry_id, _)] = await self.queue.read()
+
+        self.assertEqual(entry_id, "1-0")
+        self.client.xreadgroup.assert_not_awaited()
+        # all pending entries were checked, don't claim again right away
+        await self.queue.read()
+        self.assertEqual(self.client.xautoclaim.await_count, 1)
+
+    async def test_unknown_format(self):
+        entry = self.entry(b"1-0", {"unknown": True})
+        self.client.xreadgroup.return_value = [[b"signalbot:messages", [entry]]]
+        self.assertEqual(await self.queue.read(), [("1-0", None)])
+
+
+class NoopCommand(Command):
+    async def handle(self, context):
+        pass
+
+
+class TestDistributedBot(unittest.IsolatedAsyncioTestCase):
+    config = {
+        "signal_service": "127.0.0.1:8080",
+        "phone_number": "+49123456789",
+        "distributed": {"role": "worker", "redis_host": "redis", "redis_port": 6379},
+    }
+
+    def setUp(self):
+        self.signal_bot = SignalBot(TestDistributedBot.config)
+        self.signal_bot.listenUser("+49987654321")
+
+    async def consume_all(self):
+        while self.signal_bot._q.qsize() > 0:
+            await self.signal_bot._consume_new_item(1)
+
+    async def test_done_after_all_commands(self):
+        self.signal_bot.register(NoopCommand())
+        self.signal_bot.register(NoopCommand())
+        on_done = MagicMock()
+
+        await self.signal_bot._ask_commands_to_handle(
+            Message.parse(RAW_MESSAGE), on_done=on_done
+        )
+        on_done.assert_not_called()
+        await self.consume_all()
+        on_done.assert_called_once()
+
+    async def test_done_without_commands(self):
+        on_done = MagicMock()
+        await self.signal_bot._ask_commands_to_handle(
+            Message.parse(RAW_MESSAGE), on_done=on_done
+        )
+        on_done.assert_called_once()
+
+    async def test_done_after_failed_command(self):
+        class FailingCommand(Command):
+            async def handle(self, context):
+                raise RuntimeError
+
+        self.signal_bot.register(FailingCommand())
+        on_done = MagicMock()
+        await self.signal_bot._ask_commands_to_handle(
+            Message.parse(RAW_MESSAGE), on_done=on_done
+        )
+        with self.assertRaises(RuntimeError):
+            await self.signal_bot._consume_new_item(1)
+        on_done.assert_called_once()
+
+    async def test_unknown_role(self):
+        config = dict(TestDistributedBot.config, distributed={"role": "boss"})
+        with self.assertRaises(SignalBotError):
+            SignalBot(config)
@@ -0,0 +1,84 @@
+import os
+import pickle
+import threading
+import unittest
+from unittest.mock import patch
+
+from signalbot import Command, Context, Message, SignalBot
+from signalbot.executor import CommandExecutors
+from signalbot.utils import SendMessagesMock
+
+RAW_MESSAGE = {
+    "envelope": {
+        "source": "+49987654321",
+        "timestamp": 1633169000000,
+        "dataMessage": {"message": "count these words", "timestamp": 1633169000000},
+    }
+}
+
+
+# module level, so that the process pool can unpickle it
+class WordCountCommand(Command):
+    executor = "process"
+
+    def run(self, message: Message):
+        return f"{len(message.text.split())} words in {os.getpid()}"
+
+
+class TestCommandExecutors(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.executors = CommandExecutors(threads=2, processes=1)
+
+    def tearDown(self):
+        self.executors.shutdown()
+
+    async def test_thread(self):
+        name = await self.executors.submit(
+            "thread", lambda: threading.current_thread().name
+        )
+        self.assertTrue(name.startswith("signalbot"))
+
+    async def test_process(self):
+        result = await self.executors.run(
+            WordCountCommand(), Message.parse(RAW_MESSAGE)
+        )
+        words, pid = result.split(" words in ")
+        self.assertEqual(words, "3")
+        self.assertNotEqual(int(pid), os.getpid())
+
+    async def test_unknown_executor(self):
+        with self.assertRaises(ValueError):
+            await self.executors.submit("gpu", print)
+
+    def test_command_is_pickled_without_bot(self):
+        command = WordCountCommand()
+        command.bot = object()
+        self.assertFalse(hasattr(pickle.loads(pickle.dumps(command)), "bot"))
+
+
+class TestExecutorCommands(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        config = {
+            "signal_service": "127.0.0.1:8080",
+            "phone_number": "+49123456789",
+            "executor": {"processes": 1},
+        }
+        self.signal_bot = SignalBot(config)
+        self.signal_bot.listenUser("+49987654321")
+
+    def tearDown(self):
+        self.signal_bot.executors.shutdown()
+
+    @patch("signalbot.SignalAPI.send", new_callable=SendMessagesMock)
+    async def test_result_is_sent_back(self, send_mock):
+        self.signal_bot.register(WordCountCommand())
+        await self.signal_bot._ask_commands_to_handle(Message.parse(RAW_MESSAGE))
+        await self.signal_bot._consume_new_item(1)
+
+        receiver, text = send_mock.results()[0]
+        self.assertEqual(receiver, "+49987654321")
+        self.assertTrue(text.startswith("3 words"))
+
+    async def test_context_run_in_executor(self):
+        context = Context(self.signal_bot, Message.parse(RAW_MESSAGE))
+        self.assertEqual(await context.run_in_executor(sum, [1, 2, 3]), 6)
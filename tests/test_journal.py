@@ -0,0 +1,140 @@
+import os
+import tempfile
+import unittest
+
+from signalbot import Command, Message, SignalBot
+from signalbot.journal import MessageJournal
+
+
+def raw_message(i: int) -> dict:
+    return {
+        "envelope": {
+            "source": "+49987654321",
+            "timestamp": 1633169000000 + i,
+            "dataMessage": {"message": f"Hello {i}", "timestamp": 1633169000000 + i},
+        }
+    }
+
+
+class TestMessageJournal(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = self.directory.name
+
+    def journal(self, **kwargs) -> MessageJournal:
+        journal = MessageJournal(self.path, **kwargs)
+        self.addCleanup(journal.close)
+        return journal
+
+    def segments(self) -> list[str]:
+        return sorted(os.listdir(self.path))
+
+    def test_unfinished_messages_are_replayed(self):
+        journal = self.journal()
+        self.assertEqual(journal.open(), [])
+        message = Message.parse(raw_message(0))
+        message.account = "+49123456789"
+        first = journal.append(message)
+        second = journal.append(Message.parse(raw_message(1)))
+        journal.done(first)
+        journal.close()  # or the process died
+
+        [(sequence, replayed)] = self.journal().open()
+        self.assertEqual(sequence, second)
+        self.assertEqual(replayed.text, "Hello 1")
+        self.assertIsNone(replayed.account)
+
+        journal = self.journal()
+        journal.open()
+        journal.append(message)
+        journal.close()
+        self.assertEqual(
+            [m.account for _, m in self.journal().open()], [None, "+49123456789"]
+        )
+
+    def test_torn_record_is_ignored(self):
+        journal = self.journal()
+        journal.open()
+        journal.append(Message.parse(raw_message(0)))
+        journal.append(Message.parse(raw_message(1)))
+        journal.close()
+
+        [segment] = self.segments()
+        with open(os.path.join(self.path, segment), "r+b") as f:
+            f.truncate(os.path.getsize(f.name) - 3)
+
+        replayed = self.journal().open()
+        self.assertEqual([m.text for _, m in replayed], ["Hello 0"])
+
+    def test_done_segments_are_deleted(self):
+        journal = self.journal(segment_size=200)
+        journal.open()
+        sequences = [journal.append(Message.parse(raw_message(i))) for i in range(10)]
+        self.assertGreater(len(self.segments()), 2)
+
+        for sequence in sequences:
+            journal.done(sequence)
+        self.assertEqual(len(self.segments()), 1)  # the active one
+        self.assertEqual(journal.pending(), 0)
+
+    def test_segments_are_deleted_oldest_first(self):
+        journal = self.journal(segment_size=200, compact_ratio=0)
+        journal.open()
+        sequences = [journal.append(Message.parse(raw_message(i))) for i in range(6)]
+        segments = self.segments()
+
+        # a later segment must stay while it marks messages as done
+        for sequence in sequences[1:]:
+            journal.done(sequence)
+        self.assertEqual(self.segments(), segments)
+        journal.done(sequences[0])
+        self.assertEqual(len(self.segments()), 1)
+
+    def test_compaction(self):
+        journal = self.journal(segment_size=2000)
+        journal.open()
+        sequences = [journal.append(Message.parse(raw_message(i))) for i in range(8)]
+        for sequence in sequences[1:]:
+            journal.done(sequence)
+        [old_segment] = self.segments()
+
+        # the next segment takes over the one message that is left
+        while old_segment in self.segments():
+            journal.done(journal.append(Message.parse(raw_message(100))))
+        journal.close()
+
+        replayed = self.journal().open()
+        self.assertEqual(replayed[0][0], sequences[0])
+        self.assertEqual(replayed[0][1].text, "Hello 0")
+
+
+class NoopCommand(Command):
+    async def handle(self, context):
+        pass
+
+
+class TestJournalBot(unittest.IsolatedAsyncioTestCase):
+    async def test_replay(self):
+        with tempfile.TemporaryDirectory() as path:
+            journal = MessageJournal(path)
+            journal.open()
+            journal.append(Message.parse(raw_message(0)))
+            journal.close()
+
+            config = {
+                "signal_service": "127.0.0.1:8080",
+                "phone_number": "+49123456789",
+                "journal": {"path": path},
+            }
+            bot = SignalBot(config)
+            bot.register(NoopCommand())
+            await bot._replay_journal(bot._journal.open())
+            self.assertEqual(bot._q.qsize(), 1)
+            await bot._consume_new_item(1)
+            self.assertEqual(bot._journal.pending(), 0)
+            bot._journal.close()
+
+            journal = MessageJournal(path)
+            self.assertEqual(journal.open(), [])
+            journal.close()
@@ -0,0 +1,54 @@
+import logging
+import unittest
+
+from signalbot import log
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class TestLog(unittest.TestCase):
+    def setUp(self):
+        self.handler = RecordingHandler()
+        logging.getLogger().addHandler(self.handler)
+        self.logger = logging.getLogger("signalbot")
+        self.receiver_logger = logging.getLogger("signalbot.receiver")
+
+    def tearDown(self):
+        log.stop()
+        log.configure(sample_every=1)
+        logging.getLogger().removeHandler(self.handler)
+        self.logger.setLevel(logging.NOTSET)
+        self.receiver_logger.setLevel(logging.NOTSET)
+
+    def test_sampler(self):
+        sample = log.Sampler(every=3)
+        self.assertEqual([sample() for _ in range(7)], [1, 0, 0, 1, 0, 0, 1])
+
+    def test_sampler_uses_configured_rate(self):
+        sample = log.Sampler()
+        log.configure(sample_every=2)
+        self.assertEqual([sample() for _ in range(4)], [1, 0, 1, 0])
+        with self.assertRaises(ValueError):
+            log.configure(sample_every=0)
+
+    def test_levels(self):
+        log.configure(level="WARNING", levels={"receiver": "DEBUG"})
+        self.assertFalse(logging.getLogger("signalbot.api").isEnabledFor(logging.INFO))
+        self.assertTrue(self.receiver_logger.isEnabledFor(logging.DEBUG))
+
+    def test_queue(self):
+        log.configure(level="INFO", use_queue=True)
+        self.receiver_logger.info("Reconnected after %.2f seconds", 1.5)
+        log.stop()  # waits for the queued records
+
+        [record] = self.handler.records
+        self.assertEqual(record.getMessage(), "Reconnected after 1.50 seconds")
+        self.assertTrue(self.logger.propagate)
+        self.assertEqual(self.logger.handlers, [])
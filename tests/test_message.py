@@ -1,11 +1,13 @@
 import unittest
-from signalbot import Message, MessageType
+from signalbot import Message, MessageType, ReceiveAttachment
+from signalbot.message import Envelope, UnknownMessageFormatError
 
 
 class TestMessage(unittest.TestCase):
     raw_sync_message = '{"envelope":{"source":"+490123456789","sourceNumber":"+490123456789","sourceUuid":"<uuid>","sourceName":"<name>","sourceDevice":1,"timestamp":1632576001632,"syncMessage":{"sentMessage":{"timestamp":1632576001632,"message":"Uhrzeit","expiresInSeconds":0,"viewOnce":false,"mentions":[],"attachments":[],"contacts":[],"groupInfo":{"groupId":"<groupid>","type":"DELIVER"},"destination":null,"destinationNumber":null,"destinationUuid":null}}}}'  # noqa
     raw_data_message = '{"envelope":{"source":"+490123456789","sourceNumber":"+490123456789","sourceUuid":"<uuid>","sourceName":"<name>","sourceDevice":1,"timestamp":1632576001632,"dataMessage":{"timestamp":1632576001632,"message":"Uhrzeit","expiresInSeconds":0,"viewOnce":false,"mentions":[],"attachments":[],"contacts":[],"groupInfo":{"groupId":"<groupid>","type":"DELIVER"}}}}'  # noqa
     raw_reaction_message = '{"envelope":{"source":"<source>","sourceNumber":"<source>","sourceUuid":"<uuid>","sourceName":"<name>","sourceDevice":1,"timestamp":1632576001632,"syncMessage":{"sentMessage":{"timestamp":1632576001632,"message":null,"expiresInSeconds":0,"viewOnce":false,"reaction":{"emoji":"👍","targetAuthor":"<target>","targetAuthorNumber":"<target>","targetAuthorUuid":"<uuid>","targetSentTimestamp":1632576001632,"isRemove":false},"mentions":[],"attachments":[],"contacts":[],"groupInfo":{"groupId":"<groupid>","type":"DELIVER"},"destination":null,"destinationNumber":null,"destinationUuid":null}}}}'  # noqa
+    raw_attachment_message = '{"envelope":{"source":"+490123456789","sourceNumber":"+490123456789","sourceUuid":"<uuid>","sourceName":"<name>","sourceDevice":1,"timestamp":1632576001632,"dataMessage":{"timestamp":1632576001632,"message":null,"expiresInSeconds":0,"viewOnce":false,"mentions":[{"name":"+49987654321","number":"+49987654321","start":0,"length":1}],"attachments":[{"contentType":"image/png","filename":"image.png","id":"<id>","size":123}]}}}'  # noqa
     raw_user_chat_message = '{"envelope":{"source":"+490123456789","sourceNumber":"+490123456789","sourceUuid":"<uuid>","sourceName":"<name>","sourceDevice":1,"timestamp":1632576001632,"dataMessage":{"timestamp":1632576001632,"message":"Uhrzeit","expiresInSeconds":0,"viewOnce":false}},"account":"+49987654321","subscription":0}'  # noqa
 
     expected_source = "+490123456789"
@@ -67,6 +69,45 @@ class TestMessage(unittest.TestCase):
         self.assertEqual(message.timestamp, TestMessage.expected_timestamp)
         self.assertIsNone(message.group)
 
+    # Lazy parsing
+    def test_parse_attachments(self):
+        message = Message.parse(TestMessage.raw_attachment_message)
+        self.assertEqual(len(message.base64_attachments), 1)
+        attachment = message.base64_attachments[0]
+        self.assertIsInstance(attachment, ReceiveAttachment)
+        self.assertEqual(attachment.filename, "image.png")
+        self.assertIsNone(attachment.data)
+
+    def test_parse_mentions(self):
+        message = Message.parse(TestMessage.raw_attachment_message)
+        self.assertEqual(message.mentions[0]["number"], "+49987654321")
+
+    def test_attachments_are_parsed_once(self):
+        message = Message.parse(TestMessage.raw_attachment_message)
+        self.assertIs(message.base64_attachments, message.base64_attachments)
+
+    def test_no_attachments(self):
+        message = Message.parse(TestMessage.raw_user_chat_message)
+        self.assertEqual(message.base64_attachments, [])
+        self.assertEqual(message.mentions, [])
+
+    def test_envelope_routing_fields(self):
+        envelope = Envelope.parse(TestMessage.raw_sync_message)
+        self.assertEqual(envelope.source, TestMessage.expected_source)
+        self.assertEqual(envelope.group, TestMessage.expected_group)
+        self.assertEqual(envelope.type, MessageType.SYNC_MESSAGE)
+
+    def test_parse_decoded_message(self):
+        raw_message = Envelope.parse(TestMessage.raw_data_message).raw_message
+        message = Message.parse(raw_message)
+        self.assertEqual(message.text, TestMessage.expected_text)
+
+    def test_parse_invalid_message(self):
+        with self.assertRaises(UnknownMessageFormatError):
+            Message.parse("not json")
+        with self.assertRaises(UnknownMessageFormatError):
+            Message.parse('{"envelope": {"source": "a", "timestamp": 1}}')
+
 
 if __name__ == "__main__":
     unittest.main()
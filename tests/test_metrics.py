@@ -0,0 +1,158 @@
+import unittest
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from signalbot import Command, Message, SignalAPI, SignalBot
+from signalbot.metrics import (
+    MetricsError,
+    MetricsRegistry,
+    MetricsServer,
+    NullMetricsRegistry,
+)
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def setUp(self):
+        self.metrics = MetricsRegistry()
+
+    def test_labels(self):
+        requests = self.metrics.counter(
+            "requests", "Requests", labelnames=("operation", "status")
+        )
+        requests.labels(operation="send", status=201).inc()
+        requests.labels(operation="send", status=201).inc()
+        requests.labels(operation="send", status=503).inc()
+
+        self.assertEqual(
+            self.metrics.snapshot()["requests"],
+            {("send", "201"): 2, ("send", "503"): 1},
+        )
+        with self.assertRaises(MetricsError):
+            requests.labels(operation="send")
+
+    def test_render(self):
+        self.metrics.counter("received", "Received messages").inc(3)
+        self.metrics.gauge("depth", function=lambda: 1.5)
+        latency = self.metrics.histogram(
+            "latency", 'Latency in "seconds"', buckets=(0.1, 1), labelnames=("op",)
+        )
+        latency.labels(op="send").observe(0.5)
+        latency.labels(op="send").observe(2)
+
+        self.assertEqual(
+            self.metrics.render(),
+            "# HELP received Received messages\n"
+            "# TYPE received counter\n"
+            "received 3\n"
+            "# TYPE depth gauge\n"
+            "depth 1.5\n"
+            '# HELP latency Latency in "seconds"\n'
+            "# TYPE latency histogram\n"
+            'latency_bucket{op="send",le="0.1"} 0\n'
+            'latency_bucket{op="send",le="1"} 1\n'
+            'latency_bucket{op="send",le="+Inf"} 2\n'
+            'latency_sum{op="send"} 2.5\n'
+            'latency_count{op="send"} 2\n',
+        )
+
+    def test_label_values_are_escaped(self):
+        errors = self.metrics.counter("errors", labelnames=("command",))
+        errors.labels(command='say "hi"\n').inc()
+        self.assertIn('errors{command="say \\"hi\\"\\n"} 1', self.metrics.render())
+
+    def test_null_registry(self):
+        metrics = NullMetricsRegistry()
+        metrics.counter("received").inc()
+        metrics.histogram("latency", labelnames=("op",)).labels(op="x").observe(1)
+        metrics.gauge("depth", function=lambda: 1 / 0)
+        self.assertEqual(metrics.snapshot(), {})
+        self.assertEqual(metrics.render(), "")
+
+
+class TestMetricsServer(unittest.IsolatedAsyncioTestCase):
+    async def test_serve(self):
+        metrics = MetricsRegistry()
+        metrics.counter("received").inc()
+        server = MetricsServer(metrics, port=0)
+        await server.start()
+        try:
+            port = server._runner.addresses[0][1]
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f"http://127.0.0.1:{port}/metrics") as resp:
+                    self.assertEqual(resp.status, 200)
+                    self.assertIn("version=0.0.4", resp.headers["Content-Type"])
+                    self.assertIn("received 1\n", await resp.text())
+        finally:
+            await server.stop()
+
+
+class TestAPIMetrics(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        async def typing(request):
+            return web.Response(status=204)
+
+        app = web.Application()
+        app.router.add_put("/v1/typing-indicator/{number}", typing)
+        self.server = TestServer(app)
+        await self.server.start_server()
+
+        self.metrics = MetricsRegistry()
+        self.signal_api = SignalAPI(
+            f"{self.server.host}:{self.server.port}",
+            "+49123456789",
+            metrics=self.metrics,
+        )
+
+    async def asyncTearDown(self):
+        await self.signal_api.close()
+        await self.server.close()
+
+    async def test_request_latency(self):
+        await self.signal_api.start_typing("+49987654321")
+        latency = self.metrics.get("signalbot_api_request_seconds")
+        self.assertEqual(latency.labels(operation="typing", status=204).count, 1)
+
+
+class TestBotMetrics(unittest.IsolatedAsyncioTestCase):
+    config = {"signal_service": "127.0.0.1:8080", "phone_number": "+49123456789"}
+
+    def test_disabled(self):
+        bot = SignalBot(dict(self.config, metrics={"enabled": False}))
+        self.assertIsInstance(bot.metrics, NullMetricsRegistry)
+        self.assertIsNone(bot._metrics_server)
+
+    def test_server(self):
+        bot = SignalBot(dict(self.config, metrics={"port": 9191}))
+        self.assertEqual(bot._metrics_server.port, 9191)
+        self.assertEqual(bot._metrics_server.host, "127.0.0.1")
+
+    async def test_command_metrics(self):
+        class FailingCommand(Command):
+            async def handle(self, context):
+                raise RuntimeError
+
+        bot = SignalBot(self.config)
+        bot.listenUser("+49987654321")
+        bot.register(FailingCommand())
+        raw_message = {
+            "envelope": {
+                "source": "+49987654321",
+                "timestamp": 1633169000000,
+                "dataMessage": {"message": "Hi", "timestamp": 1633169000000},
+            }
+        }
+        await bot._ask_commands_to_handle(Message.parse(raw_message))
+        with self.assertRaises(RuntimeError):
+            await bot._consume_new_item(1)
+
+        snapshot = bot.metrics.snapshot()
+        self.assertEqual(snapshot["signalbot_queue_wait_seconds"]["count"], 1)
+        self.assertEqual(
+            snapshot["signalbot_command_duration_seconds"][("FailingCommand",)][
+                "count"
+            ],
+            1,
+        )
+        self.assertEqual(snapshot["signalbot_command_errors"], {("FailingCommand",): 1})
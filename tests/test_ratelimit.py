@@ -0,0 +1,104 @@
+import unittest
+import asyncio
+from unittest.mock import AsyncMock
+
+from signalbot import SendMessageError
+from signalbot.metrics import MetricsRegistry
+from signalbot.ratelimit import SendScheduler, TokenBucket
+
+
+class TestTokenBucket(unittest.IsolatedAsyncioTestCase):
+    async def test_burst_is_free(self):
+        bucket = TokenBucket(rate=1, capacity=3)
+        for _ in range(3):
+            self.assertEqual(await bucket.acquire(), 0)
+        self.assertGreater(bucket.delay(), 0.9)
+
+    async def test_cost_above_capacity_is_charged_in_full(self):
+        bucket = TokenBucket(rate=10, capacity=5)
+        self.assertEqual(await bucket.acquire(50), 0)
+        # the 45 tokens of the deficit and one more for the next call
+        self.assertGreater(bucket.delay(), 4.5)
+
+    async def test_block(self):
+        bucket = TokenBucket(rate=100, capacity=3)
+        bucket.block(10)
+        self.assertGreater(bucket.delay(), 9)
+
+
+class TestSendScheduler(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.metrics = MetricsRegistry()
+        self.scheduler = SendScheduler(
+            rate=1000,
+            burst=1000,
+            recipient_rate=20,
+            recipient_burst=1,
+            backoff=0.01,
+            metrics=self.metrics,
+        )
+        self.sent = []
+
+    async def send(self, text):
+        self.sent.append(text)
+        return len(self.sent)
+
+    async def test_coalesce_flooded_chat(self):
+        results = await asyncio.gather(
+            *[self.scheduler.send("+491", str(i), self.send) for i in range(4)]
+        )
+        # the first message goes out right away, the others are merged
+        self.assertEqual(self.sent, ["0", "1\n2\n3"])
+        self.assertEqual(results, [1, 2, 2, 2])
+        self.assertEqual(self.metrics.get("signalbot_send_coalesced").value, 2)
+        self.assertEqual(self.metrics.get("signalbot_send_wait_seconds").count, 4)
+
+    async def test_no_coalescing_of_attachments(self):
+        await asyncio.gather(
+            *[
+                self.scheduler.send("+491", str(i), self.send, coalesce=False)
+                for i in range(3)
+            ]
+        )
+        self.assertEqual(self.sent, ["0", "1", "2"])
+
+    async def test_chats_are_independent(self):
+        await asyncio.gather(
+            self.scheduler.send("+491", "a", self.send),
+            self.scheduler.send("+492", "b", self.send),
+        )
+        self.assertCountEqual(self.sent, ["a", "b"])
+
+    async def test_retry_on_rate_limit(self):
+        send = AsyncMock(side_effect=[SendMessageError(status=429), 42])
+        self.assertEqual(await self.scheduler.send("+491", "a", send), 42)
+        self.assertEqual(send.await_count, 2)
+        self.assertEqual(self.metrics.get("signalbot_send_rate_limited").value, 1)
+
+    async def test_no_retry_of_single_use_body(self):
+        send = AsyncMock(side_effect=[SendMessageError(status=429), 42])
+        with self.assertRaises(SendMessageError):
+            await self.scheduler.send("+491", "a", send, coalesce=False, retry=False)
+        self.assertEqual(send.await_count, 1)
+
+    async def test_no_retry_of_multi_recipient_call(self):
+        send = AsyncMock(side_effect=[SendMessageError(status=429), 42])
+        with self.assertRaises(SendMessageError):
+            await self.scheduler.call(send, cost=3)
+        self.assertEqual(send.await_count, 1)
+        self.assertGreater(self.scheduler._global.blocked_until, 0)  # still pauses
+
+    async def test_no_retry_on_other_errors(self):
+        send = AsyncMock(side_effect=SendMessageError(status=400))
+        with self.assertRaises(SendMessageError):
+            await self.scheduler.send("+491", "a", send)
+        self.assertEqual(send.await_count, 1)
+
+    async def test_retry_after(self):
+        error = SendMessageError(status=413, retry_after=5)
+        self.assertTrue(self.scheduler._retry_rate_limit(error, attempt=0))
+        self.assertGreater(self.scheduler._global.delay(), 4.9)
+
+
+if __name__ == "__main__":
+    unittest.main()
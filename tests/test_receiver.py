@@ -0,0 +1,135 @@
+import unittest
+from unittest.mock import patch, AsyncMock
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from signalbot import ReceiveMessagesError, RetryPolicy, SignalAPI, SignalBot
+from signalbot.metrics import MetricsRegistry
+from signalbot.receiver import PollingReceiver, SeenSet, WebSocketReceiver
+
+
+class FakeAPI:
+    """Every connection yields its messages and then drops
+
+    Once all connections are used up, connecting fails.
+    """
+
+    def __init__(self, *connections):
+        self.connections = list(connections)
+
+    async def receive(self, on_connect=None):
+        if not self.connections:
+            raise ReceiveMessagesError("connection refused")
+        messages = self.connections.pop(0)
+        on_connect()
+        for message in messages:
+            yield message
+        raise ReceiveMessagesError("connection lost")
+
+
+class TestSeenSet(unittest.TestCase):
+    def test_add(self):
+        seen = SeenSet()
+        self.assertTrue(seen.add(("+49123", 1)))
+        self.assertFalse(seen.add(("+49123", 1)))
+        self.assertTrue(seen.add(("+49123", 2)))
+
+    def test_oldest_keys_are_forgotten(self):
+        seen = SeenSet(max_size=2)
+        for key in (1, 2, 3):
+            seen.add(key)
+        self.assertEqual(len(seen), 2)
+        self.assertNotIn(1, seen)
+        self.assertIn(3, seen)
+
+
+class TestWebSocketReceiver(unittest.IsolatedAsyncioTestCase):
+    async def receive_all(self, receiver, messages):
+        with self.assertRaises(ReceiveMessagesError):
+            async for message in receiver.receive():
+                messages.append(message)
+
+    @patch("asyncio.sleep", new_callable=AsyncMock)
+    async def test_reconnects_after_failure(self, sleep):
+        api = FakeAPI(["m1", "m2"], ["m3"])
+        metrics = MetricsRegistry()
+        policy = RetryPolicy(max_attempts=2, backoff=0.5, jitter=False)
+        receiver = WebSocketReceiver(api, policy, metrics)
+
+        messages = []
+        await self.receive_all(receiver, messages)
+        self.assertEqual(messages, ["m1", "m2", "m3"])
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["signalbot_receive_reconnects"], 1)
+        self.assertEqual(snapshot["signalbot_receive_gap_seconds"]["count"], 1)
+        self.assertEqual(snapshot["signalbot_receive_connections"], 0)
+
+    @patch("asyncio.sleep", new_callable=AsyncMock)
+    async def test_backoff_starts_over_after_connecting(self, sleep):
+        api = FakeAPI([], [])
+        policy = RetryPolicy(max_attempts=3, backoff=1, jitter=False)
+        await self.receive_all(WebSocketReceiver(api, policy), [])
+        # two dropped connections, then connecting fails until out of attempts
+        delays = [c.args[0] for c in sleep.call_args_list]
+        self.assertEqual(delays, [1, 1, 2])
+
+
+class TestPollingReceiver(unittest.IsolatedAsyncioTestCase):
+    phone_number = "+49123456789"
+
+    async def asyncSetUp(self):
+        self.batches = [
+            [{"envelope": {"timestamp": 1}}, {"envelope": {"timestamp": 2}}],
+            [{"envelope": {"timestamp": 3}}],
+        ]
+        self.params = []
+
+        async def receive(request):
+            self.params.append(dict(request.query))
+            batch = self.batches.pop(0) if self.batches else []
+            return web.json_response(batch)
+
+        app = web.Application()
+        app.router.add_get("/v1/receive/{number}", receive)
+        self.server = TestServer(app)
+        await self.server.start_server()
+
+        signal_service = f"{self.server.host}:{self.server.port}"
+        self.signal_api = SignalAPI(signal_service, self.phone_number)
+
+    async def asyncTearDown(self):
+        await self.signal_api.close()
+        await self.server.close()
+
+    async def test_receive_batch(self):
+        batch = await self.signal_api.receive_batch(timeout=5, max_messages=10)
+        self.assertEqual(len(batch), 2)
+        self.assertEqual(self.params, [{"timeout": "5", "max_messages": "10"}])
+
+    @patch("asyncio.sleep", new_callable=AsyncMock)
+    async def test_full_batches_are_fetched_without_waiting(self, sleep):
+        receiver = PollingReceiver(
+            self.signal_api, RetryPolicy(), interval=3, batch_size=2
+        )
+        messages = []
+        async for message in receiver.receive():
+            messages.append(message["envelope"]["timestamp"])
+            if len(messages) == 3:
+                break
+
+        self.assertEqual(messages, [1, 2, 3])
+        sleep.assert_not_awaited()  # no pause after the full first batch
+
+    async def test_poll_mode_config(self):
+        bot = SignalBot(
+            {
+                "signal_service": "127.0.0.1:8080",
+                "phone_number": self.phone_number,
+                "receive": {"mode": "poll", "batch_size": 20},
+            }
+        )
+        receiver = bot._create_receiver()
+        self.assertIsInstance(receiver, PollingReceiver)
+        self.assertEqual(receiver.batch_size, 20)
@@ -0,0 +1,244 @@
+import asyncio
+import unittest
+from unittest.mock import patch, AsyncMock
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from signalbot import (
+    SignalAPI,
+    SignalBot,
+    SendAttachment,
+    SendMessageError,
+    ReactionError,
+)
+from signalbot.retry import CircuitBreaker, CircuitOpenError, RetryPolicy
+
+
+def response_error(status: int) -> aiohttp.ClientResponseError:
+    return aiohttp.ClientResponseError(None, (), status=status)
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def test_delay_grows_up_to_max_backoff(self):
+        policy = RetryPolicy(backoff=1, max_backoff=5, jitter=False)
+        self.assertEqual([policy.delay(i) for i in range(4)], [1, 2, 4, 5])
+
+    def test_jitter_stays_within_half_and_full_delay(self):
+        policy = RetryPolicy(backoff=4, max_backoff=4)
+        for _ in range(100):
+            self.assertTrue(2 <= policy.delay(0) <= 4)
+
+    def test_max_attempts(self):
+        policy = RetryPolicy(max_attempts=3)
+        error = response_error(503)
+        self.assertTrue(policy.should_retry(error, 0))
+        self.assertTrue(policy.should_retry(error, 1))
+        self.assertFalse(policy.should_retry(error, 2))
+        self.assertTrue(RetryPolicy(max_attempts=None).should_retry(error, 1000))
+
+    def test_retry_statuses(self):
+        policy = RetryPolicy(retry_statuses=(503,))
+        self.assertTrue(policy.should_retry(response_error(503), 0))
+        self.assertFalse(policy.should_retry(response_error(400), 0))
+
+    def test_non_idempotent_retries_only_unsent_requests(self):
+        policy = RetryPolicy(idempotent=False)
+        refused = aiohttp.ClientConnectorError(None, ConnectionRefusedError())
+        self.assertTrue(policy.should_retry(refused, 0))
+        self.assertFalse(policy.should_retry(aiohttp.ServerDisconnectedError(), 0))
+        self.assertTrue(
+            RetryPolicy().should_retry(aiohttp.ServerDisconnectedError(), 0)
+        )
+
+    def test_replace(self):
+        policy = RetryPolicy(idempotent=False).replace(max_attempts=7)
+        self.assertEqual(policy.max_attempts, 7)
+        self.assertFalse(policy.idempotent)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_opens_after_threshold(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+
+    def test_half_open_lets_one_trial_through(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(breaker.allow())
+
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow())
+
+    def test_failed_trial_reopens(self):
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0)
+        for _ in range(3):
+            breaker.record_failure()
+        breaker.allow()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+    def test_client_errors_are_not_failures(self):
+        self.assertFalse(CircuitBreaker.is_failure(response_error(400)))
+        self.assertTrue(CircuitBreaker.is_failure(response_error(503)))
+        self.assertTrue(CircuitBreaker.is_failure(aiohttp.ServerDisconnectedError()))
+        self.assertTrue(CircuitBreaker.is_failure(asyncio.TimeoutError()))
+
+
+class TestAPIRetry(unittest.IsolatedAsyncioTestCase):
+    phone_number = "+49123456789"
+
+    async def asyncSetUp(self):
+        self.statuses = []  # answered in order, then 201
+        self.requests = 0
+        self.delay = 0
+
+        async def handler(request):
+            await request.read()
+            await asyncio.sleep(self.delay)
+            self.requests += 1
+            status = self.statuses.pop(0) if self.statuses else 201
+            return web.json_response({"timestamp": "1638715559464"}, status=status)
+
+        app = web.Application()
+        app.router.add_post("/v2/send", handler)
+        app.router.add_post("/v1/reactions/{number}", handler)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.signal_service = f"{self.server.host}:{self.server.port}"
+
+        fast = {"backoff": 0, "jitter": False}
+        self.signal_api = SignalAPI(
+            self.signal_service,
+            self.phone_number,
+            retry_policies={
+                "send": SignalAPI.DEFAULT_RETRY_POLICIES["send"].replace(**fast),
+                "react": RetryPolicy(max_attempts=3, **fast),
+            },
+        )
+
+    async def asyncTearDown(self):
+        await self.signal_api.close()
+        await self.server.close()
+
+    async def test_retries_unavailable_service(self):
+        self.statuses = [503, 502]
+        resp = await self.signal_api.send("+49987654321", "Hello")
+        self.assertEqual(resp.status, 201)
+        self.assertEqual(self.requests, 3)
+
+    async def test_gives_up_after_max_attempts(self):
+        self.statuses = [503, 503, 503, 503]
+        with self.assertRaises(SendMessageError) as cm:
+            await self.signal_api.send("+49987654321", "Hello")
+        self.assertEqual(cm.exception.status, 503)
+        self.assertEqual(self.requests, 3)
+
+    async def test_send_is_not_retried_after_gateway_timeout(self):
+        self.statuses = [504]
+        with self.assertRaises(SendMessageError):
+            await self.signal_api.send("+49987654321", "Hello")
+        self.assertEqual(self.requests, 1)
+
+    async def test_react_retries_gateway_timeout(self):
+        self.statuses = [504]
+        await self.signal_api.react("+49987654321", "👍", "+49987654321", 1)
+        self.assertEqual(self.requests, 2)
+
+    async def test_streamed_body_is_recreated_for_retries(self):
+        self.statuses = [503]
+        attachment = SendAttachment(b"data", content_type="text/plain")
+        resp = await self.signal_api.send("+49987654321", "Hello", [attachment])
+        self.assertEqual(resp.status, 201)
+        self.assertEqual(self.requests, 2)
+
+    async def test_async_source_is_sent_once(self):
+        async def source():
+            yield b"data"
+
+        self.statuses = [503]
+        attachment = SendAttachment(source=source())
+        with self.assertRaises(SendMessageError):
+            await self.signal_api.send("+49987654321", "Hello", [attachment])
+        self.assertEqual(self.requests, 1)
+
+    async def test_circuit_breaker_fails_fast(self):
+        self.signal_api.circuit_breaker = CircuitBreaker(failure_threshold=3)
+        self.statuses = [503] * 3
+        with self.assertRaises(ReactionError):
+            await self.signal_api.react("+49987654321", "👍", "+49987654321", 1)
+
+        with self.assertRaises(ReactionError) as cm:
+            await self.signal_api.react("+49987654321", "👍", "+49987654321", 1)
+        self.assertIsInstance(cm.exception.__cause__, CircuitOpenError)
+        self.assertEqual(self.requests, 3)
+
+    async def test_timeout_opens_circuit_breaker(self):
+        breaker = CircuitBreaker(failure_threshold=1)
+        self.signal_api.circuit_breaker = breaker
+        with patch.object(
+            aiohttp.ClientSession, "post", side_effect=asyncio.TimeoutError
+        ):
+            with self.assertRaises(ReactionError):
+                await self.signal_api.react("+49987654321", "👍", "+49987654321", 1)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+    async def test_cancelled_trial_frees_circuit_breaker(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        self.signal_api.circuit_breaker = breaker
+
+        self.delay = 1
+        trial = asyncio.create_task(
+            self.signal_api.react("+49987654321", "👍", "+49987654321", 1)
+        )
+        await asyncio.sleep(0.1)
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        trial.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await trial
+
+        self.delay = 0
+        await self.signal_api.react("+49987654321", "👍", "+49987654321", 1)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+
+class TestRerunPolicy(unittest.IsolatedAsyncioTestCase):
+    async def test_rerun_uses_policy_delays(self):
+        calls = 0
+
+        async def crash():
+            nonlocal calls
+            calls += 1
+            raise RuntimeError
+
+        policy = RetryPolicy(max_attempts=3, backoff=1, jitter=False)
+        with patch("asyncio.sleep", new_callable=AsyncMock) as sleep, patch(
+            "traceback.print_exc"
+        ):
+            await SignalBot._rerun_on_exception(crash, policy=policy)
+        self.assertEqual(calls, 3)
+        self.assertEqual([c.args[0] for c in sleep.call_args_list], [1, 2])
+
+    async def test_retry_config(self):
+        bot = SignalBot(
+            {
+                "signal_service": "127.0.0.1:8080",
+                "phone_number": "+49123456789",
+                "retry": {"send": {"max_attempts": 5}},
+                "circuit_breaker": {"failure_threshold": 2},
+            }
+        )
+        policy = bot._signal.retry_policies["send"]
+        self.assertEqual(policy.max_attempts, 5)
+        self.assertFalse(policy.idempotent)
+        self.assertEqual(bot._signal.circuit_breaker.failure_threshold, 2)
+        self.assertEqual(bot.metrics.snapshot()["signalbot_api_circuit_open"], 0)
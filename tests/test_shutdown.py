@@ -0,0 +1,197 @@
+import asyncio
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from signalbot import Command, Message, SignalBot
+from signalbot.bot import SignalBotError
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+RAW_MESSAGE = {
+    "envelope": {
+        "source": "+49987654321",
+        "timestamp": 1633169000000,
+        "dataMessage": {"message": "Hello", "timestamp": 1633169000000},
+    }
+}
+
+
+class SleepCommand(Command):
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.handled = 0
+
+    async def handle(self, context):
+        await asyncio.sleep(self.seconds)
+        self.handled += 1
+
+
+class BlockingCommand(Command):
+    executor = "thread"
+
+    def run(self, message):
+        time.sleep(0.5)
+
+
+class TestShutdown(unittest.IsolatedAsyncioTestCase):
+    config = {
+        "signal_service": "127.0.0.1:8080",
+        "phone_number": "+49123456789",
+        "workers": {"consumers": 2},
+    }
+
+    def setUp(self):
+        self.signal_bot = SignalBot(TestShutdown.config)
+        self.signal_bot.listenUser("+49987654321")
+
+    async def queue_messages(self, count: int, on_done=None):
+        for i in range(count):
+            timestamp = 1633169000000 + i
+            envelope = dict(RAW_MESSAGE["envelope"], timestamp=timestamp)
+            envelope["dataMessage"] = dict(envelope["dataMessage"], timestamp=timestamp)
+            raw_message = {"envelope": envelope}
+            await self.signal_bot._ask_commands_to_handle(
+                Message.parse(raw_message), on_done=on_done
+            )
+
+    async def test_queue_is_drained(self):
+        command = SleepCommand(0.01)
+        self.signal_bot.register(command)
+        await self.queue_messages(10)
+        self.signal_bot._consumers.start(2)
+
+        await self.signal_bot.shutdown()
+
+        self.assertEqual(command.handled, 10)
+        self.assertEqual(self.signal_bot._consumers.size(), 0)
+
+    async def test_drain_timeout(self):
+        command = SleepCommand(10)
+        self.signal_bot.register(command)
+        on_done = MagicMock()
+        await self.queue_messages(3, on_done=on_done)
+        self.signal_bot._consumers.start(2)
+        await asyncio.sleep(0)
+
+        await asyncio.wait_for(self.signal_bot.shutdown(drain_timeout=0.05), 1)
+
+        self.assertEqual(command.handled, 0)
+        on_done.assert_not_called()  # not acknowledged, handled elsewhere
+
+    async def test_running_thread_does_not_block(self):
+        self.signal_bot.register(BlockingCommand())
+        await self.queue_messages(1)
+        self.signal_bot._consumers.start(1)
+        await asyncio.sleep(0.01)
+
+        start = time.perf_counter()
+        await self.signal_bot.shutdown(drain_timeout=0.05)
+        self.assertLess(time.perf_counter() - start, 0.3)
+
+    async def test_intake_stops_first(self):
+        intake = self.signal_bot._create_task(asyncio.sleep(10), intake=True)
+        self.signal_bot.scheduler.start()
+
+        await self.signal_bot.shutdown()
+
+        self.assertTrue(intake.cancelled())
+        self.assertFalse(self.signal_bot.scheduler.running)
+
+    async def test_running_jobs_finish(self):
+        finished = []
+
+        async def job(seconds):
+            await asyncio.sleep(seconds)
+            finished.append(seconds)
+
+        self.signal_bot.scheduler.start()
+        self.signal_bot.scheduler.add_job(job, args=[0.05])
+        self.signal_bot.scheduler.add_job(job, args=[10])
+        await asyncio.sleep(0.01)
+
+        await asyncio.wait_for(self.signal_bot.shutdown(drain_timeout=0.2), 1)
+
+        self.assertEqual(finished, [0.05])  # the other one was cancelled
+        self.assertFalse(self.signal_bot.scheduler.running)
+
+
+class TestStop(unittest.TestCase):
+    def test_stop_from_other_thread(self):
+        config = dict(TestShutdown.config, signal_service="127.0.0.1:1")
+        signal_bot = SignalBot(config)
+
+        timer = threading.Timer(0.2, signal_bot.stop)
+        timer.start()
+        signal_bot.start()  # returns after the shutdown
+
+        self.assertTrue(signal_bot._stopping)
+        self.assertIsNone(signal_bot._signal.session)
+        self.assertFalse(signal_bot.scheduler.running)
+        signal_bot.stop()  # after .start() returned, nothing happens
+
+
+class TestRun(unittest.IsolatedAsyncioTestCase):
+    config = dict(TestShutdown.config, signal_service="127.0.0.1:1")
+
+    async def test_run_in_running_loop(self):
+        signal_bot = SignalBot(self.config)
+        task = asyncio.create_task(signal_bot.run())
+        await asyncio.sleep(0.1)
+        self.assertTrue(signal_bot.scheduler.running)
+        self.assertIsNotNone(signal_bot._signal.session)
+
+        signal_bot.stop()
+        await asyncio.wait_for(task, 1)
+        self.assertTrue(signal_bot._stopping)
+        self.assertIsNone(signal_bot._signal.session)
+
+    async def test_stop_before_run(self):
+        signal_bot = SignalBot(self.config)
+        signal_bot.stop()
+        await asyncio.wait_for(signal_bot.run(), 1)
+        self.assertTrue(signal_bot._stopping)
+
+    async def test_context_manager(self):
+        async with SignalBot(self.config) as signal_bot:
+            await self.queue_message(signal_bot)
+            self.assertTrue(signal_bot.scheduler.running)
+        self.assertEqual(signal_bot.commands[0].handled, 1)  # drained on exit
+        self.assertIsNone(signal_bot._signal.session)
+
+    async def queue_message(self, signal_bot: SignalBot):
+        signal_bot.register(SleepCommand(0.01))
+        signal_bot.listenUser("+49987654321")
+        await signal_bot._ask_commands_to_handle(Message.parse(RAW_MESSAGE))
+
+
+class TestConstruction(unittest.TestCase):
+    def test_no_event_loop_needed(self):
+        asyncio.set_event_loop(None)
+        signal_bot = SignalBot(TestShutdown.config)
+        self.assertIsNone(signal_bot._event_loop)
+
+    def test_event_loop_config(self):
+        config = dict(TestShutdown.config, event_loop="trio")
+        with self.assertRaises(SignalBotError):
+            SignalBot(config)
+
+    @unittest.skipIf(uvloop is None, "uvloop is not installed")
+    def test_uvloop(self):
+        config = dict(TestShutdown.config, event_loop="uvloop")
+        signal_bot = SignalBot(config)
+        policy = asyncio.get_event_loop_policy()
+        loops = []
+
+        async def record_loop():
+            loops.append(asyncio.get_running_loop())
+            signal_bot.stop()
+
+        signal_bot.scheduler.add_job(record_loop)
+        signal_bot.start()
+        self.assertIsInstance(loops[0], uvloop.Loop)
+        self.assertIs(asyncio.get_event_loop_policy(), policy)
@@ -0,0 +1,215 @@
+import asyncio
+import unittest
+from unittest.mock import patch, AsyncMock
+
+from signalbot import SignalBot
+from signalbot.storage import (
+    AsyncInMemoryStorage,
+    AsyncRedisStorage,
+    CachedStorage,
+    InMemoryStorage,
+    StorageError,
+)
+
+
+class TestInMemoryStorage(unittest.TestCase):
+    def test_save_read(self):
+        storage = InMemoryStorage()
+        storage.save("key", {"count": 1})
+        self.assertTrue(storage.exists("key"))
+        self.assertEqual(storage.read("key"), {"count": 1})
+
+
+class TestAsyncInMemoryStorage(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.storage = AsyncInMemoryStorage()
+
+    async def test_save_read(self):
+        await self.storage.save("key", {"count": 1})
+        self.assertTrue(await self.storage.exists("key"))
+        self.assertEqual(await self.storage.read("key"), {"count": 1})
+
+    async def test_read_missing_key(self):
+        self.assertFalse(await self.storage.exists("key"))
+        with self.assertRaises(StorageError):
+            await self.storage.read("key")
+
+    async def test_ttl(self):
+        await self.storage.save("key", 1, ttl=60)
+        self.assertTrue(await self.storage.exists("key"))
+        await self.storage.save("key", 1, ttl=0)
+        self.assertFalse(await self.storage.exists("key"))
+
+    async def test_many(self):
+        await self.storage.save_many({"a": 1, "b": [2]})
+        result = await self.storage.read_many(["a", "b", "c"])
+        self.assertEqual(result, {"a": 1, "b": [2]})
+
+    async def test_delete(self):
+        await self.storage.save("key", 1)
+        await self.storage.delete("key")
+        self.assertFalse(await self.storage.exists("key"))
+
+
+class TestAsyncRedisStorage(unittest.IsolatedAsyncioTestCase):
+    async def test_read_many_uses_one_round_trip(self):
+        storage = AsyncRedisStorage("localhost", 6379)
+        with patch.object(storage._redis, "mget", new_callable=AsyncMock) as mock:
+            mock.return_value = [b'{"count": 1}', None]
+            result = await storage.read_many(["a", "b"])
+        mock.assert_awaited_once_with(["a", "b"])
+        self.assertEqual(result, {"a": {"count": 1}})
+
+    async def test_save_with_ttl(self):
+        storage = AsyncRedisStorage("localhost", 6379)
+        with patch.object(storage._redis, "set", new_callable=AsyncMock) as mock:
+            await storage.save("key", [1, 2], ttl=1.5)
+        mock.assert_awaited_once_with("key", "[1, 2]", px=1500)
+
+
+class TestCachedStorage(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.backend = AsyncInMemoryStorage()
+        self.storage = CachedStorage(self.backend, max_size=2)
+
+    async def test_write_behind(self):
+        await self.storage.save("key", {"count": 1})
+        self.assertFalse(await self.backend.exists("key"))
+        self.assertEqual(await self.storage.read("key"), {"count": 1})
+
+        await self.storage.flush()
+        self.assertEqual(await self.backend.read("key"), {"count": 1})
+        self.assertEqual(self.storage.stats()["dirty"], 0)
+
+    async def test_hits_and_misses(self):
+        await self.backend.save("key", 1)
+        await self.storage.read("key")
+        await self.storage.read("key")
+        self.assertEqual(self.storage.hits, 1)
+        self.assertEqual(self.storage.misses, 1)
+
+    async def test_lru_eviction_keeps_dirty_values(self):
+        await self.storage.save("a", 1)
+        await self.storage.save("b", 2)
+        await self.storage.read("a")  # b is now least recently used
+        await self.storage.save("c", 3)
+        self.assertEqual(self.storage.evictions, 1)
+        self.assertEqual(self.storage.stats()["size"], 2)
+
+        # b was evicted before it was flushed, it must not get lost
+        self.assertEqual(await self.storage.read("b"), 2)
+        await self.storage.flush()
+        self.assertEqual(
+            await self.backend.read_many(["a", "b", "c"]),
+            {
+                "a": 1,
+                "b": 2,
+                "c": 3,
+            },
+        )
+
+    async def test_cache_ttl(self):
+        storage = CachedStorage(self.backend, cache_ttl=0)
+        await self.backend.save("key", 1)
+        await storage.read("key")
+        await storage.read("key")
+        self.assertEqual(storage.misses, 2)
+
+    async def test_saved_ttl_expires_cached_entry(self):
+        await self.backend.save("key", 1)
+        await self.storage.save("key", 2, ttl=0.05)
+        self.assertEqual(await self.storage.read("key"), 2)
+
+        await asyncio.sleep(0.06)
+        self.assertFalse(await self.storage.exists("key"))
+        with self.assertRaises(StorageError):
+            await self.storage.read("key")
+        self.assertEqual(await self.storage.read_many(["key"]), {})
+
+        await self.storage.flush()  # the expired save replaced the old value
+        self.assertFalse(await self.backend.exists("key"))
+
+    async def test_read_during_flush(self):
+        written = asyncio.Event()
+        save_many = self.backend.save_many
+
+        async def slow_save_many(objects, ttl=None):
+            await written.wait()
+            await save_many(objects, ttl)
+
+        await self.storage.save("a", 1)
+        with patch.object(self.backend, "save_many", side_effect=slow_save_many):
+            flush = asyncio.create_task(self.storage.flush())
+            await asyncio.sleep(0)
+            await self.storage.save("b", 2)
+            await self.storage.save("c", 3)  # evicts a
+            self.assertEqual(await self.storage.read("a"), 1)
+            written.set()
+            await flush
+        self.assertEqual(await self.backend.read("a"), 1)
+
+    async def test_failed_flush_is_retried(self):
+        await self.storage.save("key", 1)
+        with patch.object(self.backend, "save_many", side_effect=StorageError):
+            with self.assertRaises(StorageError):
+                await self.storage.flush()
+        await self.storage.flush()
+        self.assertEqual(await self.backend.read("key"), 1)
+
+    async def test_close_during_flush(self):
+        save_many = self.backend.save_many
+        slow = True
+
+        async def slow_save_many(objects, ttl=None):
+            if slow:
+                await asyncio.sleep(10)
+            await save_many(objects, ttl)
+
+        storage = CachedStorage(self.backend, flush_interval=0)
+        await storage.save("key", 1)
+        with patch.object(self.backend, "save_many", side_effect=slow_save_many):
+            storage.start()
+            await asyncio.sleep(0.01)  # the periodic flush is writing
+            slow = False
+            await storage.close()
+        self.assertEqual(await self.backend.read("key"), 1)
+
+    async def test_close_flushes(self):
+        self.storage.start()
+        await self.storage.save("key", 1)
+        await self.storage.close()
+        self.assertEqual(await self.backend.read("key"), 1)
+
+
+class TestStorageConfig(unittest.IsolatedAsyncioTestCase):
+    config = {
+        "signal_service": "127.0.0.1:8080",
+        "phone_number": "+49123456789",
+    }
+
+    def test_async_in_memory_fallback(self):
+        config = {**TestStorageConfig.config, "storage": {"async": True}}
+        signal_bot = SignalBot(config)
+        self.assertIsInstance(signal_bot.storage, AsyncInMemoryStorage)
+
+    def test_async_redis(self):
+        config = {
+            **TestStorageConfig.config,
+            "storage": {"redis_host": "redis", "redis_port": 6379, "async": True},
+        }
+        signal_bot = SignalBot(config)
+        self.assertIsInstance(signal_bot.storage, AsyncRedisStorage)
+
+    def test_cache(self):
+        config = {
+            **TestStorageConfig.config,
+            "storage": {"async": True, "cache": {"max_size": 10}},
+        }
+        signal_bot = SignalBot(config)
+        self.assertIsInstance(signal_bot.storage, CachedStorage)
+        self.assertIsInstance(signal_bot.storage.storage, AsyncInMemoryStorage)
+        self.assertEqual(signal_bot.storage.max_size, 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
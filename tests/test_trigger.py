@@ -0,0 +1,105 @@
+import unittest
+
+from signalbot import Command, Context, Message, MessageType, Trigger, triggered
+from signalbot.trigger import TriggerIndex, get_trigger
+
+
+def new_message(text, group=None, attachments=None, type=MessageType.DATA_MESSAGE):
+    return Message(
+        "+49123456789",
+        1,
+        type,
+        text,
+        base64_attachments=attachments,
+        group=group,
+    )
+
+
+class TriggerCommand(Command):
+    def __init__(self, trigger: Trigger = None):
+        self.trigger = trigger
+
+
+class DecoratedCommand(Command):
+    @triggered("ping")
+    async def handle(self, c: Context):
+        pass
+
+
+class TestTrigger(unittest.TestCase):
+    def test_words(self):
+        trigger = Trigger(words=["Ping"])
+        self.assertTrue(trigger.matches(new_message("ping")))
+        self.assertFalse(trigger.matches(new_message("ping pong")))
+
+    def test_case_sensitive_words(self):
+        trigger = Trigger(words=["Ping"], case_sensitive=True)
+        self.assertTrue(trigger.matches(new_message("Ping")))
+        self.assertFalse(trigger.matches(new_message("ping")))
+
+    def test_filters(self):
+        trigger = Trigger(has_attachment=True, groups=["group_id1="])
+        self.assertTrue(trigger.matches(new_message(None, "group_id1=", ["x"])))
+        self.assertFalse(trigger.matches(new_message(None, "group_id1=")))
+        self.assertFalse(trigger.matches(new_message(None, "group_id2=", ["x"])))
+
+    def test_type(self):
+        trigger = Trigger(type=MessageType.SYNC_MESSAGE)
+        self.assertFalse(trigger.matches(new_message("hi")))
+        sync_message = new_message("hi", type=MessageType.SYNC_MESSAGE)
+        self.assertTrue(trigger.matches(sync_message))
+
+
+class TestTriggerIndex(unittest.TestCase):
+    def setUp(self):
+        self.plain = TriggerCommand()
+        self.decorated = DecoratedCommand()
+        self.words = TriggerCommand(Trigger(words=["hello", "hi"]))
+        self.prefix = TriggerCommand(Trigger(prefixes=["/weather", "/w"]))
+        self.regex = TriggerCommand(Trigger(regexes=[r"\d{4}-\d{2}-\d{2}"]))
+        self.backref = TriggerCommand(Trigger(regexes=[r"(\w)\1"]))
+        self.users = TriggerCommand(Trigger(prefixes=["/admin"], users=["+4911"]))
+        self.index = TriggerIndex(
+            [
+                self.plain,
+                self.decorated,
+                self.words,
+                self.prefix,
+                self.regex,
+                self.backref,
+                self.users,
+            ]
+        )
+
+    def match(self, text, **kwargs):
+        return self.index.match(new_message(text, **kwargs))
+
+    def test_untriggered_commands_always_match(self):
+        self.assertEqual(self.match("nothing special"), [self.plain])
+        self.assertEqual(self.match(None), [self.plain])
+
+    def test_decorated_command(self):
+        self.assertEqual(self.match("PING"), [self.plain, self.decorated])
+
+    def test_words(self):
+        self.assertEqual(self.match("Hi"), [self.plain, self.words])
+
+    def test_prefixes(self):
+        self.assertEqual(self.match("/weather Berlin"), [self.plain, self.prefix])
+        self.assertEqual(self.match("/admin reset"), [self.plain])
+
+    def test_regexes(self):
+        self.assertEqual(self.match("on 2023-01-01"), [self.plain, self.regex])
+        self.assertEqual(self.match("see you"), [self.plain, self.backref])
+
+    def test_index_agrees_with_trigger(self):
+        commands = self.index.commands[1:]
+        for text in ["ping", "hello", "/w", "2020-12-12", "aa", "/admin", "x", ""]:
+            message = new_message(text)
+            expected = [c for c in commands if get_trigger(c).matches(message)]
+            actual = self.index.match(message)[1:]
+            self.assertEqual(actual, expected, text)
+
+
+if __name__ == "__main__":
+    unittest.main()
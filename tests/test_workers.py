@@ -0,0 +1,96 @@
+import unittest
+import asyncio
+
+from signalbot import SignalBot
+from signalbot.workers import ConsumerPool
+
+
+class TestConsumerPool(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        async def consume(name):
+            await asyncio.Event().wait()
+
+        self.pool = ConsumerPool(consume, min_consumers=1, max_consumers=3)
+        self.pool.scale_down_after = 1
+
+    async def asyncTearDown(self):
+        while self.pool.retire():
+            pass
+
+    async def test_scale_to_min(self):
+        self.assertEqual(self.pool.scale(queue_depth=0), 1)
+        self.assertEqual(self.pool.size(), 1)
+
+    async def test_scale_up_when_all_busy(self):
+        self.pool.start(1)
+        self.pool.mark_busy(1)
+        self.assertEqual(self.pool.scale(queue_depth=5), 1)
+        self.assertEqual(self.pool.size(), 2)
+
+    async def test_no_scale_up_with_idle_consumer(self):
+        self.pool.start(1)
+        self.assertEqual(self.pool.scale(queue_depth=5), 0)
+
+    async def test_no_scale_up_when_wait_is_short(self):
+        self.pool.start(1)
+        self.pool.mark_busy(1)
+        self.pool.mark_idle(1, duration=0.01)
+        self.pool.mark_busy(1)
+        self.assertEqual(self.pool.scale(queue_depth=5), 0)
+
+    async def test_scale_up_is_bounded(self):
+        self.pool.start(3)
+        for name in range(1, 4):
+            self.pool.mark_busy(name)
+        self.assertEqual(self.pool.scale(queue_depth=100), 0)
+        self.assertEqual(self.pool.size(), 3)
+
+    async def test_scale_down_idle_consumers(self):
+        self.pool.start(3)
+        self.assertEqual(self.pool.scale(queue_depth=0), -1)
+        self.assertEqual(self.pool.scale(queue_depth=0), -1)
+        self.assertEqual(self.pool.scale(queue_depth=0), 0)
+        self.assertEqual(self.pool.size(), 1)
+
+    async def test_busy_consumers_are_not_retired(self):
+        self.pool.start(2)
+        self.pool.mark_busy(1)
+        self.pool.mark_busy(2)
+        self.assertFalse(self.pool.retire())
+
+
+class TestWorkerConfig(unittest.IsolatedAsyncioTestCase):
+    config = {
+        "signal_service": "127.0.0.1:8080",
+        "phone_number": "+49123456789",
+    }
+
+    async def test_default_consumers(self):
+        signal_bot = SignalBot(TestWorkerConfig.config)
+        self.assertEqual(signal_bot._consumer_count, 3)
+        self.assertEqual(signal_bot.metrics.get("signalbot_consumers").value, 0)
+
+    async def test_configured_consumers(self):
+        config = {**TestWorkerConfig.config, "workers": {"consumers": 8}}
+        signal_bot = SignalBot(config)
+        self.assertEqual(signal_bot._consumer_count, 8)
+        self.assertEqual(signal_bot._consumers.max_consumers, 8)
+
+    async def test_autoscale_config(self):
+        config = {
+            **TestWorkerConfig.config,
+            "workers": {"autoscale": {"min_consumers": 2, "max_consumers": 10}},
+        }
+        signal_bot = SignalBot(config)
+        self.assertEqual(signal_bot._consumers.min_consumers, 2)
+        self.assertEqual(signal_bot._consumers.max_consumers, 10)
+        self.assertEqual(signal_bot._autoscale_interval, 1.0)
+
+    async def test_queue_depth_metric(self):
+        signal_bot = SignalBot(TestWorkerConfig.config)
+        await signal_bot._q.put("item")
+        self.assertEqual(signal_bot.metrics.snapshot()["signalbot_queue_depth"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()